@@ -1,5 +1,4 @@
 import os
-import requests
 import base64
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
@@ -9,10 +8,16 @@ from flask_restx import Api, Resource, fields, Namespace
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import json
+import time
 from bson import ObjectId
 from PIL import Image
 import io
 
+from ollama_client import OllamaClient
+from audit_log import AuditLogger, install_shutdown_handler
+from result_cache import VisionResultCache, compute_cache_key
+from image_preprocessor import ImagePreprocessor
+
 # Configure custom JSON encoder
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, o):
@@ -48,6 +53,10 @@ app.config['VISION_MODEL'] = os.getenv('VISION_MODEL', 'gemma3:12b')
 app.config['MODEL_TIMEOUT'] = int(os.getenv('MODEL_TIMEOUT', '180'))
 app.config['ALLOWED_EXTENSIONS'] = set(os.getenv('ALLOWED_EXTENSIONS', 'jpg,jpeg,png,gif,bmp,webp').split(','))
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))  # 16MB default
+app.config['VISION_CACHE_ENABLED'] = os.getenv('VISION_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['VISION_CACHE_TTL'] = int(os.getenv('VISION_CACHE_TTL', '86400'))  # 24 hours
+app.config['VISION_CACHE_MAX_ENTRIES'] = int(os.getenv('VISION_CACHE_MAX_ENTRIES', '512'))  # In-process LRU tier
+app.config['VISION_CACHE_MAX_DOCUMENTS'] = int(os.getenv('VISION_CACHE_MAX_DOCUMENTS', '100000'))  # MongoDB tier
 
 # JWT Configuration - Match officer-insight-api exactly
 app.config['JWT_SECRET_KEY'] = 'insight-api-jwt-secret-key-2024'  # Hardcoded for testing
@@ -69,6 +78,16 @@ CONFIGURABLE_FIELDS = os.getenv('EXTRACTION_FIELDS', ','.join(DEFAULT_EXTRACTION
 
 # Initialize extensions
 mongo = PyMongo(app)
+ollama = OllamaClient.from_env(app.config['OLLAMA_URL'])
+image_preprocessor = ImagePreprocessor.from_env(default_max_dimension=1024)
+vision_cache = VisionResultCache(
+    collection=mongo.db.vision_cache,
+    ttl_seconds=app.config['VISION_CACHE_TTL'],
+    max_memory_entries=app.config['VISION_CACHE_MAX_ENTRIES'],
+    max_documents=app.config['VISION_CACHE_MAX_DOCUMENTS']
+)
+# Request log records are written in batches off the request path
+audit_logger = AuditLogger.from_env(lambda: mongo.db.requests)
 CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:8651,http://localhost:3000').split(','), supports_credentials=True)
 
 # API Documentation
@@ -121,8 +140,8 @@ def process_image_with_ollama(image_file):
         image_data = image_file.read()
         image_file.seek(0)  # Reset file pointer
         
-        # Convert image to base64 for Ollama vision model
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
+        # Downscale/re-encode, then convert image to base64 for Ollama vision model
+        image_base64 = base64.b64encode(image_preprocessor.prepare(image_data)).decode('utf-8')
         
         # Create dynamic prompt based on configured fields
         field_descriptions = {
@@ -149,9 +168,8 @@ Only include fields that you can clearly identify from the image. If information
 Focus on identifying the vehicle details based on what is actually visible in the image.
 """
 
-        response = requests.post(
-            f"{app.config['OLLAMA_URL']}/api/generate",
-            json={
+        response = ollama.generate(
+            {
                 "model": app.config['VISION_MODEL'],
                 "prompt": prompt,
                 "images": [image_base64],
@@ -260,6 +278,7 @@ class CarIdentifier(Resource):
     @api_ns.expect(car_image_model)
     def post(self):
         """Identify vehicle information from image using AI vision model"""
+        started = time.monotonic()
         try:
             # Check if image file is provided
             if 'image' not in request.files:
@@ -283,16 +302,35 @@ class CarIdentifier(Resource):
             if not validate_file_extension(image_file.filename):
                 return {'message': f'Invalid file type. Supported formats: {", ".join(app.config["ALLOWED_EXTENSIONS"])}'}, 400
             
-            # Process image with Ollama vision model
-            processed_output, extracted_info = process_image_with_ollama(image_file)
+            # Identical resubmissions (e.g. retries after a network blip) are served from cache
+            cache_key = image_hash = None
+            cache_tier = None
+            processed_output = extracted_info = None
+            if app.config['VISION_CACHE_ENABLED']:
+                image_data = image_file.read()
+                image_file.seek(0)
+                cache_key, image_hash = compute_cache_key(
+                    image_data, app.config['VISION_MODEL'], CONFIGURABLE_FIELDS, image_preprocessor.cache_tag
+                )
+                cached, cache_tier = vision_cache.get(cache_key)
+                if cached:
+                    processed_output, extracted_info = cached
+            
+            if not cache_tier:
+                # Process image with Ollama vision model
+                processed_output, extracted_info = process_image_with_ollama(image_file)
+                if processed_output and cache_key:
+                    vision_cache.set(cache_key, image_hash, app.config['VISION_MODEL'], CONFIGURABLE_FIELDS,
+                                     processed_output, extracted_info)
             
             if not processed_output:
                 # Log the request
-                mongo.db.requests.insert_one({
+                audit_logger.log({
                     'endpoint': '/api/public/car-identifier',
                     'service': 'car-identifier-service',
                     'status': 'error',
                     'error': 'Failed to process image with AI vision model',
+                    'duration_ms': round((time.monotonic() - started) * 1000, 1),
                     'created_at': datetime.utcnow()
                 })
                 return {'message': 'Failed to process image with AI vision model'}, 500
@@ -306,17 +344,20 @@ class CarIdentifier(Resource):
                 'service': 'car-identifier-service',
                 'model': app.config['VISION_MODEL'],
                 'extraction_fields': CONFIGURABLE_FIELDS,
+                'image_hash': image_hash,
+                'cache_hit': cache_tier is not None,
                 'created_at': datetime.utcnow()
             }
             
             result = mongo.db.extractions.insert_one(result_doc)
             
             # Log the request
-            mongo.db.requests.insert_one({
+            audit_logger.log({
                 'endpoint': '/api/public/car-identifier',
                 'service': 'car-identifier-service',
                 'status': 'success',
                 'extraction_id': str(result.inserted_id),
+                'duration_ms': round((time.monotonic() - started) * 1000, 1),
                 'created_at': datetime.utcnow()
             })
             
@@ -328,15 +369,16 @@ class CarIdentifier(Resource):
                 'extraction_fields': CONFIGURABLE_FIELDS,
                 'processed_output': processed_output,
                 'extracted_info': extracted_info
-            }, 200
+            }, 200, {'X-Cache': f'HIT-{cache_tier.upper()}' if cache_tier else 'MISS'}
             
         except Exception as e:
             # Log the error
-            mongo.db.requests.insert_one({
+            audit_logger.log({
                 'endpoint': '/api/public/car-identifier',
                 'service': 'car-identifier-service',
                 'status': 'error',
                 'error': str(e),
+                'duration_ms': round((time.monotonic() - started) * 1000, 1),
                 'created_at': datetime.utcnow()
             })
             return {'message': 'Internal server error'}, 500
@@ -354,10 +396,7 @@ class Health(Resource):
         
         try:
             # Check Ollama service
-            response = requests.get(
-                f"{app.config['OLLAMA_URL']}/api/version",
-                timeout=5
-            )
+            response = ollama.get('/api/version', timeout=5)
             ollama_status = 'healthy' if response.status_code == 200 else 'unhealthy'
         except:
             ollama_status = 'unhealthy'
@@ -373,7 +412,10 @@ class Health(Resource):
             'services': {
                 'database': db_status,
                 'ollama': ollama_status
-            }
+            },
+            'ollama_calls': ollama.get_stats(),
+            'audit_log': audit_logger.get_stats(),
+            'vision_cache': vision_cache.get_stats()
         }, 200
 
 if __name__ == '__main__':
@@ -382,6 +424,14 @@ if __name__ == '__main__':
     print(f"Extraction Fields: {CONFIGURABLE_FIELDS}")
     print(f"Model Timeout: {app.config['MODEL_TIMEOUT']}s")
     print(f"Allowed Extensions: {app.config['ALLOWED_EXTENSIONS']}")
+    print(f"Image Preprocessing: {image_preprocessor.cache_tag}")
+    print(f"Vision Cache: {'enabled' if app.config['VISION_CACHE_ENABLED'] else 'disabled'} (TTL {app.config['VISION_CACHE_TTL']}s)")
+    
+    if app.config['VISION_CACHE_ENABLED']:
+        vision_cache.ensure_indexes()
+    
+    # Flush queued audit records when the container is stopped
+    install_shutdown_handler()
     
     print("=== Flask app routes ===")
     for rule in app.url_map.iter_rules():
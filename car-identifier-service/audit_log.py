@@ -0,0 +1,244 @@
+"""
+Audit Log Module
+Buffers request log records in a bounded in-process queue and writes them in batches from a background thread
+"""
+
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import atexit
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+
+# What log() does when the queue is full
+OVERFLOW_POLICIES = ('block', 'drop', 'sync')
+
+class AuditLogger:
+    """
+    Thread-safe non-blocking writer of request log records
+
+    log() only appends to a queue; a daemon thread writes the queued records
+    with one insert_many per batch_size records or flush_seconds, whichever
+    comes first. Failed batches are retried with backoff, so a slow or
+    unavailable primary fills the queue instead of slowing requests down.
+    Once the queue is full the overflow policy applies:
+
+    - block: wait up to block_seconds for room, then drop the record
+    - drop: drop the record at once
+    - sync: write the record directly, as before batching existed
+
+    Records still queued at exit are flushed by an atexit hook.
+    """
+
+    def __init__(self, get_collection, queue_size=10000, batch_size=500, flush_seconds=1.0,
+                 overflow='block', block_seconds=0.1, max_retries=3, backoff_seconds=0.5):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.overflow = overflow if overflow in OVERFLOW_POLICIES else 'block'
+        self.block_seconds = block_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._thread = None
+        self._closed = False
+        self._stats = {
+            'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'written_sync': 0,
+            'batches': 0, 'retries': 0, 'last_batch_ms': None, 'last_error': None
+        }
+
+    @classmethod
+    def from_env(cls, get_collection):
+        """Create a logger configured from AUDIT_LOG_* environment variables"""
+        def env_number(name, default, cast=int):
+            try:
+                return cast(os.getenv(name, default))
+            except ValueError:
+                return default
+
+        return cls(
+            get_collection,
+            queue_size=max(1, env_number('AUDIT_LOG_QUEUE_SIZE', 10000)),
+            batch_size=max(1, env_number('AUDIT_LOG_BATCH_SIZE', 500)),
+            flush_seconds=max(0.01, env_number('AUDIT_LOG_FLUSH_SECONDS', 1.0, float)),
+            overflow=os.getenv('AUDIT_LOG_OVERFLOW', 'block').lower(),
+            block_seconds=max(0.0, env_number('AUDIT_LOG_BLOCK_SECONDS', 0.1, float)),
+            max_retries=max(0, env_number('AUDIT_LOG_MAX_RETRIES', 3)),
+            backoff_seconds=max(0.0, env_number('AUDIT_LOG_RETRY_BACKOFF', 0.5, float))
+        )
+
+    def log(self, record):
+        """
+        Queue a record for writing
+
+        Never raises: a record that cannot be queued is dropped and counted.
+
+        Returns:
+            bool: Whether the record was queued or written
+        """
+        record.setdefault('created_at', datetime.utcnow())
+        if self._closed:
+            return self._write_sync(record)
+        self._start()
+
+        with self._lock:
+            self._pending += 1
+        try:
+            if self.overflow == 'block' and self.block_seconds > 0:
+                self._queue.put(record, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self._done(1)
+            if self.overflow == 'sync':
+                return self._write_sync(record)
+            with self._lock:
+                self._stats['dropped'] += 1
+                dropped = self._stats['dropped']
+            # The first drop and every thousandth, so a stalled primary doesn't flood the log
+            if dropped % 1000 == 1:
+                print(f"Audit log queue full, {dropped} records dropped so far", flush=True)
+            return False
+        self._count('queued')
+        return True
+
+    def flush(self, timeout=10.0):
+        """
+        Wait until every queued record has been written or given up on
+
+        Returns:
+            bool: False if records were still pending at the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush the queue and write any later records directly"""
+        if self._closed:
+            return
+        flushed = self.flush(timeout)
+        self._closed = True
+        if not flushed:
+            print(f"Audit log closed with {self._pending} records unwritten", flush=True)
+
+    def get_stats(self):
+        """Get queue depth and write counters"""
+        with self._lock:
+            return {
+                **self._stats,
+                'queue_depth': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                'overflow': self.overflow
+            }
+
+    def _start(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            self._done(len(batch))
+
+    def _write_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                # insert_many sets each record's _id on the first attempt, so a retry after
+                # a partial write only meets duplicate key errors for what already landed
+                self.get_collection().insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if attempt and errors and all(error.get('code') == 11000 for error in errors):
+                    self._written(batch, started)
+                    return
+                if not self._retry(attempt, e):
+                    self._failed(len(errors) or len(batch), e)
+                    return
+            except Exception as e:
+                if not self._retry(attempt, e):
+                    self._failed(len(batch), e)
+                    return
+            else:
+                self._written(batch, started)
+                return
+
+    def _retry(self, attempt, error):
+        """Record an error and wait before the next attempt, or return False if none is left"""
+        with self._lock:
+            self._stats['last_error'] = str(error)
+        if attempt >= self.max_retries:
+            return False
+        self._count('retries')
+        time.sleep(self.backoff_seconds * (2 ** attempt))
+        return True
+
+    def _written(self, batch, started):
+        with self._lock:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_batch_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+    def _failed(self, count, error):
+        with self._lock:
+            self._stats['failed'] += count
+        print(f"Audit log lost {count} records: {error}", flush=True)
+
+    def _write_sync(self, record):
+        try:
+            self.get_collection().insert_one(record)
+            self._count('written_sync')
+            return True
+        except Exception as e:
+            print(f"Audit log write failed: {e}", flush=True)
+            self._count('failed')
+            return False
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _done(self, count):
+        with self._idle:
+            self._pending -= count
+            if not self._pending:
+                self._idle.notify_all()
+
+def install_shutdown_handler():
+    """
+    Exit through atexit on SIGTERM, as sent by docker stop
+
+    Python's default SIGTERM handling skips atexit hooks, which would lose
+    queued audit records. Must be called from the main thread.
+    """
+    if signal.getsignal(signal.SIGTERM) in (signal.SIG_DFL, None):
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
@@ -0,0 +1,101 @@
+"""
+Image Preprocessor Module
+Shrinks images to the vision model's effective input resolution before they are base64-encoded
+"""
+
+import io
+import os
+import logging
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+class ImagePreprocessor:
+    """
+    Decode, auto-orient, downscale and re-encode images as JPEG
+
+    Vision models resize their input to a fixed resolution (896px for
+    gemma3), so sending a 12 MP phone photo only inflates the request body
+    and the time spent decoding it on the model host.
+    """
+
+    def __init__(self, enabled=True, max_dimension=1024, jpeg_quality=85):
+        self.enabled = enabled
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+
+    @classmethod
+    def from_env(cls, default_max_dimension=1024, default_quality=85):
+        """Create a preprocessor configured from IMAGE_* environment variables"""
+        def env_int(name, default):
+            try:
+                return int(os.getenv(name, default))
+            except ValueError:
+                return default
+
+        return cls(
+            enabled=os.getenv('IMAGE_PREPROCESS_ENABLED', 'true').lower() == 'true',
+            max_dimension=max(0, env_int('IMAGE_MAX_DIMENSION', default_max_dimension)),
+            jpeg_quality=min(95, max(1, env_int('IMAGE_JPEG_QUALITY', default_quality)))
+        )
+
+    @property
+    def cache_tag(self):
+        """Short description of the settings, for cache keys of results derived from prepared images"""
+        if not self.enabled:
+            return 'original'
+        return f"jpeg:{self.max_dimension}:{self.jpeg_quality}"
+
+    def prepare_image(self, image):
+        """
+        Downscale and JPEG-encode an already decoded PIL image
+
+        Returns:
+            bytes: JPEG data
+        """
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white so it doesn't turn black in JPEG
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        if self.max_dimension and max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=self.jpeg_quality, optimize=True)
+        return output.getvalue()
+
+    def prepare(self, image_data):
+        """
+        Prepare encoded image bytes for the vision model
+
+        Falls back to the original bytes if preprocessing is disabled, the
+        image cannot be decoded, or re-encoding would make it larger.
+
+        Returns:
+            bytes: Image data to base64-encode
+        """
+        if not self.enabled:
+            return image_data
+
+        try:
+            with Image.open(io.BytesIO(image_data)) as image:
+                if self.max_dimension:
+                    # Lets libjpeg decode large JPEGs at a reduced scale
+                    image.draft('RGB', (self.max_dimension, self.max_dimension))
+                # Applies the EXIF Orientation tag, which is dropped on re-encode
+                image = ImageOps.exif_transpose(image)
+                prepared = self.prepare_image(image)
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, sending original: {e}")
+            return image_data
+
+        if len(prepared) >= len(image_data):
+            return image_data
+
+        logger.info(f"Preprocessed image: {len(image_data)} -> {len(prepared)} bytes")
+        return prepared
@@ -0,0 +1,173 @@
+"""
+Ollama Client Module
+Pooled HTTP client for Ollama with keep-alive, retries, per-model concurrency limits and call timings
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: the model host is restarting, overloaded or behind a flaky proxy
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+class OllamaBusyError(Exception):
+    """Raised when no concurrency slot for a model frees up before the call timeout"""
+
+def parse_model_concurrency(value):
+    """Parse 'model=limit,model=limit' into a dictionary"""
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        # Model names contain ':' (gemma3:12b), so split on the last '='
+        model, limit = item.rsplit('=', 1)
+        try:
+            limits[model.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning(f"Ignoring invalid Ollama concurrency limit: {item}")
+    return limits
+
+class OllamaClient:
+    """Thread-safe Ollama client sharing one pooled session per process"""
+
+    def __init__(self, base_url, pool_size=10, max_retries=2, backoff_seconds=0.5,
+                 model_concurrency=None, default_concurrency=2):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.model_concurrency = model_concurrency or {}
+        self.default_concurrency = default_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._semaphores = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, base_url):
+        """Create a client configured from OLLAMA_* environment variables"""
+        def env_number(name, default, cast=int):
+            try:
+                return cast(os.getenv(name, default))
+            except ValueError:
+                return default
+
+        return cls(
+            base_url,
+            pool_size=env_number('OLLAMA_POOL_SIZE', 10),
+            max_retries=env_number('OLLAMA_MAX_RETRIES', 2),
+            backoff_seconds=env_number('OLLAMA_RETRY_BACKOFF', 0.5, float),
+            model_concurrency=parse_model_concurrency(os.getenv('OLLAMA_MODEL_CONCURRENCY', '')),
+            default_concurrency=max(1, env_number('OLLAMA_DEFAULT_CONCURRENCY', 2))
+        )
+
+    def _semaphore(self, model):
+        with self._lock:
+            if model not in self._semaphores:
+                limit = self.model_concurrency.get(model, self.default_concurrency)
+                self._semaphores[model] = threading.BoundedSemaphore(limit)
+            return self._semaphores[model]
+
+    def _record(self, model, seconds, retries, error):
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['calls'] += 1
+            stats['retries'] += retries
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if error:
+                stats['errors'] += 1
+
+    def generate(self, payload, timeout, deadline=None):
+        """
+        POST a payload to /api/generate
+
+        Waits for a concurrency slot of the payload's model, then retries with
+        jittered exponential backoff on connection errors and 5xx responses.
+        Timeouts are not retried, since the model may still be working.
+
+        Args:
+            payload: JSON body for /api/generate (must include 'model')
+            timeout: Seconds allowed for acquiring a slot and for each attempt
+            deadline: Optional time.monotonic() by which the whole call must
+                end; the slot wait, each attempt and each backoff only get the
+                time left, and no retry starts once it has passed
+
+        Returns:
+            requests.Response: The last response received
+
+        Raises:
+            OllamaBusyError: If no slot for the model frees up within timeout
+            requests.RequestException: If every attempt failed without a response
+        """
+        model = payload.get('model', 'unknown')
+        semaphore = self._semaphore(model)
+
+        def remaining():
+            if deadline is None:
+                return timeout
+            return max(0.0, min(timeout, deadline - time.monotonic()))
+
+        if not semaphore.acquire(timeout=remaining()):
+            self._record(model, 0.0, 0, True)
+            raise OllamaBusyError(f"Ollama model {model} is busy, no slot freed within {timeout}s")
+
+        started = time.monotonic()
+        attempt = 0
+        response = None
+        try:
+            if not remaining():
+                raise OllamaBusyError(f"Ollama model {model} slot freed only after the deadline")
+            while True:
+                try:
+                    response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=remaining())
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        return response
+                    logger.warning(f"Ollama {model} returned {response.status_code}, retrying")
+                except requests.ConnectionError as e:
+                    if attempt >= self.max_retries or not remaining():
+                        raise
+                    logger.warning(f"Ollama {model} connection error, retrying: {e}")
+
+                attempt += 1
+                time.sleep(min(random.uniform(0, self.backoff_seconds * (2 ** attempt)), remaining()))
+                if not remaining():
+                    # Out of time: hand back the failed response rather than start an attempt that cannot finish
+                    if response is not None:
+                        return response
+                    raise requests.ConnectionError(f"Ollama {model} unreachable before the deadline")
+        finally:
+            semaphore.release()
+            elapsed = time.monotonic() - started
+            failed = response is None or response.status_code != 200
+            self._record(model, elapsed, attempt, failed)
+            logger.info(f"Ollama {model} call took {elapsed:.2f}s (retries: {attempt}, status: {response.status_code if response is not None else 'error'})")
+
+    def get(self, path, timeout=5):
+        """GET an Ollama endpoint such as /api/tags or /api/version"""
+        return self.session.get(f"{self.base_url}{path}", timeout=timeout)
+
+    def get_stats(self):
+        """Get per-model call counters and timings"""
+        with self._lock:
+            return {
+                model: {
+                    **stats,
+                    'total_seconds': round(stats['total_seconds'], 3),
+                    'max_seconds': round(stats['max_seconds'], 3),
+                    'avg_seconds': round(stats['total_seconds'] / stats['calls'], 3) if stats['calls'] else 0.0
+                }
+                for model, stats in self._stats.items()
+            }
@@ -0,0 +1,128 @@
+"""
+Result Cache Module for Car Identifier Service
+Two-tier (in-process LRU + MongoDB) cache of vision model results keyed by image content
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
+
+def compute_cache_key(image_data, model, extraction_fields, preprocessing=''):
+    """Build the cache key for an image, model, set of extraction fields and preprocessing settings"""
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    fields_key = ','.join(sorted(field.strip() for field in extraction_fields))
+    return hashlib.sha256(f"{image_hash}|{model}|{fields_key}|{preprocessing}".encode('utf-8')).hexdigest(), image_hash
+
+class VisionResultCache:
+    """Cache of (processed_output, extracted_info) tuples for identical vision requests"""
+
+    def __init__(self, collection=None, ttl_seconds=86400, max_memory_entries=512,
+                 max_documents=100000, trim_interval=100):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_documents = max_documents
+        self.trim_interval = trim_interval
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._stats = {'memory_hits': 0, 'mongo_hits': 0, 'misses': 0}
+
+    def ensure_indexes(self):
+        """Create the TTL index that lets MongoDB expire stale entries"""
+        if self.collection is None:
+            return
+        try:
+            self.collection.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+            self.collection.create_index([('created_at', ASCENDING)])
+        except Exception as e:
+            print(f"Error creating vision cache indexes: {e}")
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a cached result
+
+        Returns:
+            tuple: ((processed_output, extracted_info), tier) on a hit, where
+            tier is 'memory' or 'mongo'; (None, None) on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value, 'memory'
+                del self._memory[key]
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({'_id': key, 'expires_at': {'$gt': datetime.utcnow()}})
+                if doc:
+                    value = (doc['processed_output'], doc['extracted_info'])
+                    remaining = (doc['expires_at'] - datetime.utcnow()).total_seconds()
+                    self._remember(key, value, now + remaining)
+                    with self._lock:
+                        self._stats['mongo_hits'] += 1
+                    return value, 'mongo'
+            except Exception as e:
+                print(f"Error reading vision cache: {e}")
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None, None
+
+    def set(self, key, image_hash, model, extraction_fields, processed_output, extracted_info):
+        """Store a result in both tiers"""
+        self._remember(key, (processed_output, extracted_info), time.time() + self.ttl_seconds)
+
+        if self.collection is None:
+            return
+        try:
+            now = datetime.utcnow()
+            self.collection.replace_one({'_id': key}, {
+                '_id': key,
+                'image_hash': image_hash,
+                'model': model,
+                'extraction_fields': extraction_fields,
+                'processed_output': processed_output,
+                'extracted_info': extracted_info,
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=self.ttl_seconds)
+            }, upsert=True)
+
+            with self._lock:
+                self._writes_since_trim += 1
+                should_trim = self._writes_since_trim >= self.trim_interval
+                if should_trim:
+                    self._writes_since_trim = 0
+            if should_trim:
+                self._trim()
+        except Exception as e:
+            print(f"Error writing vision cache: {e}")
+
+    def _trim(self):
+        """Delete the oldest MongoDB entries beyond max_documents"""
+        excess = self.collection.estimated_document_count() - self.max_documents
+        if excess <= 0:
+            return
+        oldest = self.collection.find({}, {'_id': 1}).sort('created_at', ASCENDING).limit(excess)
+        self.collection.delete_many({'_id': {'$in': [doc['_id'] for doc in oldest]}})
+
+    def get_stats(self):
+        """Get hit/miss counters and the in-process tier size"""
+        with self._lock:
+            return {**self._stats, 'memory_entries': len(self._memory)}
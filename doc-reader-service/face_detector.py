@@ -0,0 +1,75 @@
+"""
+Face Detector Module for Document Reader Service
+Process-wide pool of Haar cascade classifiers shared by the extraction threads
+"""
+
+import logging
+import queue
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+class FaceDetectorPool:
+    """
+    Fixed set of pre-loaded CascadeClassifier instances
+
+    A CascadeClassifier must not be used by two threads at once, so each
+    detection checks one out of the pool and returns it afterwards. Size the
+    pool to the number of threads that run detections.
+    """
+
+    def __init__(self, size, max_dimension=1024, cascade_path=CASCADE_PATH):
+        self.size = max(1, size)
+        self.max_dimension = max_dimension
+        self._detectors = queue.Queue()
+        for _ in range(self.size):
+            classifier = cv2.CascadeClassifier(cascade_path)
+            if classifier.empty():
+                raise RuntimeError(f"Failed to load Haar cascade from {cascade_path}")
+            self._detectors.put(classifier)
+
+    @contextmanager
+    def detector(self):
+        """Check a classifier out of the pool for the duration of the block"""
+        classifier = self._detectors.get()
+        try:
+            yield classifier
+        finally:
+            self._detectors.put(classifier)
+
+    def detect_faces(self, gray, scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
+        """
+        Detect faces in a grayscale image
+
+        Images larger than max_dimension on their longest side are downscaled
+        before detection; boxes are mapped back to the original resolution.
+
+        Returns:
+            list: (x, y, w, h) tuples in original image coordinates
+        """
+        scale = 1.0
+        longest_side = max(gray.shape[:2])
+        if self.max_dimension and longest_side > self.max_dimension:
+            scale = self.max_dimension / longest_side
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        with self.detector() as classifier:
+            faces = classifier.detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=min_neighbors, minSize=min_size)
+
+        return [tuple(int(round(value / scale)) for value in face) for face in faces]
+
+    def warm_up(self):
+        """Run one detection on every classifier so the first request pays no setup cost"""
+        blank = np.zeros((128, 128), dtype=np.uint8)
+        classifiers = [self._detectors.get() for _ in range(self.size)]
+        try:
+            for classifier in classifiers:
+                classifier.detectMultiScale(blank)
+        finally:
+            for classifier in classifiers:
+                self._detectors.put(classifier)
+        logger.info(f"Warmed up {self.size} face detectors")
@@ -8,14 +8,28 @@ from flask_jwt_extended import JWTManager, jwt_required, create_access_token, ge
 from flask_cors import CORS
 from flask_restx import Api, Resource, fields, Namespace
 from werkzeug.utils import secure_filename
-import re
+from werkzeug.datastructures import FileStorage
+import io
 import json
+import time
+import uuid
 from bson import ObjectId
 
 # Import new modules
 from images import images_ns
 from person import person_ns
 from vehicle import vehicle_ns
+from jobs import jobs_ns, submit_job, JobQueueFull
+from ollama_client import OllamaClient
+from audit_log import AuditLogger, install_shutdown_handler
+from pagination import paginate, InvalidPagination
+from export import InvalidExport, export_response, parse_date_range
+from indexes import apply_indexes
+from search_index import backfill_search_docs
+from plate_matcher import plate_index
+import request_stats
+from parameter_cache import ParameterCache
+import regex_extractor
 
 # Configure custom JSON encoder
 class CustomJSONEncoder(json.JSONEncoder):
@@ -61,6 +75,11 @@ os.makedirs(UPLOAD_BASE_PATH, exist_ok=True)
 # Initialize extensions
 mongo = PyMongo(app)
 jwt = JWTManager(app)
+ollama = OllamaClient.from_env(app.config['OLLAMA_URL'])
+
+# Request log records are written in batches off the request path
+audit_logger = AuditLogger.from_env(lambda: mongo.db.requests)
+
 CORS(app, origins=['http://localhost:8651', 'http://localhost:3000'], supports_credentials=True)
 
 # API Documentation
@@ -110,6 +129,7 @@ api.add_namespace(api_ns, path='/api')  # This will create /api/parse-message
 api.add_namespace(images_ns, path='/images')
 api.add_namespace(person_ns, path='/persons')
 api.add_namespace(vehicle_ns, path='/vehicles')
+api.add_namespace(jobs_ns, path='/api/jobs')
 
 # Models for Swagger documentation
 login_model = api.model('Login', {
@@ -125,7 +145,8 @@ parameter_model = api.model('Parameter', {
 
 message_model = api.model('Message', {
     'message': fields.String(description='Text message'),
-    'audio_message': fields.Raw(description='Audio file')
+    'audio_message': fields.Raw(description='Audio file'),
+    'stream_id': fields.String(description='ID of a speech2text stream the audio was sent to while it was recorded')
 })
 
 # Default extraction parameters
@@ -140,7 +161,7 @@ DEFAULT_PARAMETERS = [
 ]
 
 def init_database():
-    """Initialize database with default admin user and parameters"""
+    """Initialize database with indexes, default admin user and parameters"""
     try:
         # Create default admin user
         admin_exists = mongo.db.users.find_one({'username': 'admin'})
@@ -158,16 +179,24 @@ def init_database():
         if params_count == 0:
             mongo.db.parameters.insert_many(DEFAULT_PARAMETERS)
 
+        # Create declared indexes (see indexes.py); no-op once the current version is applied
+        result = apply_indexes(mongo.db)
+        if result['created'] or result['failed']:
+            print(f"Indexes created: {result['created']}, failed: {result['failed']}")
+
+        # Build search keys for vehicles and persons written before search_index.py or by an older version
+        backfilled = backfill_search_docs(mongo.db)
+        if backfilled:
+            print(f"Search keys built for {backfilled} records")
+
+        # Load VRNs for /vehicles/fuzzy-search so the first lookup doesn't pay for it
+        plate_index.refresh(mongo.db.vehicles)
+
     except Exception as e:
         pass
 
-def extract_information_with_ollama(text, parameters):
-    """Extract information using Ollama AI"""
-    try:
-        param_names = [p['name'] for p in parameters if p['active']]
-        
-        # Enhanced prompt for better extraction
-        prompt = f"""
+# Prompt of the local extraction fallback; compile_extraction_prompt fills in the parameters
+EXTRACTION_PROMPT = """
 You are an expert at extracting structured information from police reports and incident descriptions.
 
 Parse the following text and extract information in this exact format:
@@ -193,16 +222,38 @@ IMPORTANT: For vehicle information, extract Vehicle Make, Vehicle Color, and Veh
 - Vehicle Color should only contain the color
 - Vehicle Model should only contain the model/series number or name
 
-Available parameters to extract: {', '.join(param_names)}
+Available parameters to extract: {param_names}
 
 Format the response exactly as shown above with each field on a new line.
 If information is not available, omit that field entirely.
 Do not include any additional explanations or text.
 """
 
-        response = requests.post(
-            f"{app.config['OLLAMA_URL']}/api/generate",
-            json={
+def compile_extraction_prompt(parameters):
+    """
+    Fill the active parameter names into EXTRACTION_PROMPT
+    
+    Done once per parameter change by parameter_cache, leaving only the text
+    to add per request.
+    
+    Returns:
+        tuple: (prompt before the text, prompt after it)
+    """
+    param_names = ', '.join(p['name'] for p in parameters if p['active'])
+    head, tail = EXTRACTION_PROMPT.split('{text}', 1)
+    return head, tail.replace('{param_names}', param_names)
+
+# Active parameters and their compiled prompt, reloaded only when they change
+parameter_cache = ParameterCache(lambda: mongo.db, compile_extraction_prompt)
+
+def extract_information_with_ollama(text, parameters, prompt=None):
+    """Extract information using Ollama AI, with a prompt from compile_extraction_prompt if given"""
+    try:
+        head, tail = prompt or compile_extraction_prompt(parameters)
+        prompt = head + text + tail
+
+        response = ollama.generate(
+            {
                 "model": "llama3.2:latest",
                 "prompt": prompt,
                 "stream": False
@@ -235,93 +286,16 @@ Do not include any additional explanations or text.
         return extract_information_with_regex(text, parameters)
 
 def extract_information_with_regex(text, parameters):
-    """Fallback extraction using regex patterns"""
-    extracted = {}
-    text_lower = text.lower()
-    
-    for param in parameters:
-        if not param['active']:
-            continue
-            
-        param_name = param['name']
-        value = None
-        
-        if param_name == 'person_name':
-            # Simple pattern for names
-            name_pattern = r'\b([A-Z][a-z]+ [A-Z][a-z]+)\b'
-            match = re.search(name_pattern, text)
-            value = match.group(1) if match else None
-            
-        elif param_name == 'vehicle_number':
-            # Pattern for license plates
-            plate_pattern = r'\b[A-Z0-9]{2,8}\b'
-            match = re.search(plate_pattern, text.upper())
-            value = match.group(0) if match else None
-            
-        elif param_name == 'vehicle_color':
-            colors = ['red', 'blue', 'green', 'black', 'white', 'silver', 'gray', 'yellow', 'orange']
-            for color in colors:
-                if color in text_lower:
-                    value = color.title()
-                    break
-                    
-        elif param_name == 'vehicle_make':
-            makes = ['toyota', 'honda', 'ford', 'bmw', 'mercedes', 'audi', 'nissan', 'hyundai', 'volkswagen', 'subaru']
-            for make in makes:
-                if make in text_lower:
-                    value = make.upper() if make == 'bmw' else make.title()
-                    break
-                    
-        elif param_name == 'vehicle_model':
-            # Extract model numbers/names after make
-            model_pattern = r'\b(bmw|toyota|honda|ford|mercedes|audi|nissan|hyundai)\s+([a-z0-9]+)\b'
-            match = re.search(model_pattern, text_lower)
-            if match:
-                value = match.group(2).upper() if match.group(2).isdigit() else match.group(2).title()
-                    
-        elif param_name in ['car_color', 'car_model']:  # Legacy parameter names
-            # Handle legacy parameter names for backward compatibility
-            if param_name == 'car_color':
-                colors = ['red', 'blue', 'green', 'black', 'white', 'silver', 'gray', 'yellow', 'orange']
-                for color in colors:
-                    if color in text_lower:
-                        value = color.title()
-                        break
-            elif param_name == 'car_model':
-                makes = ['toyota', 'honda', 'ford', 'bmw', 'mercedes', 'audi', 'nissan', 'hyundai']
-                for make in makes:
-                    if make in text_lower:
-                        value = make.title()
-                        break
-                    
-        elif param_name == 'location':
-            # Simple location extraction
-            location_keywords = ['at', 'on', 'near', 'in front of', 'behind']
-            for keyword in location_keywords:
-                if keyword in text_lower:
-                    parts = text_lower.split(keyword)
-                    if len(parts) > 1:
-                        location_part = parts[1].split('.')[0].split(',')[0].strip()
-                        value = location_part[:50] if location_part else None
-                        break
-                        
-        elif param_name == 'event_crime_violation':
-            events = ['theft', 'robbery', 'assault', 'speeding', 'parking violation', 'accident', 'vandalism']
-            for event in events:
-                if event in text_lower:
-                    value = event
-                    break
-        
-        extracted[param_name] = value
-    
-    return extracted
+    """Fallback extraction using regex patterns, compiled once per set of active parameters (see regex_extractor.py)"""
+    return regex_extractor.extract(text, parameters)
 
-def speechToText(audio_file):
+def speechToText(audio_file, auth_token=None):
     """
     Convert audio file to text using speech2text service
     
     Args:
         audio_file: File object containing audio data
+        auth_token: JWT to forward; read from the current request when omitted
         
     Returns:
         str: Transcribed text from audio, or None if conversion fails
@@ -351,7 +325,7 @@ def speechToText(audio_file):
         # Get the current JWT token from the request context
         try:
             # Get current JWT token from the Authorization header
-            current_token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            current_token = auth_token if auth_token is not None else request.headers.get('Authorization', '').replace('Bearer ', '')
             print(f"Using JWT token for speech2text service", flush=True)
             headers = {'Authorization': f'Bearer {current_token}'}
         except Exception as token_error:
@@ -386,6 +360,38 @@ def speechToText(audio_file):
         traceback.print_exc()
         return None
 
+def finishSpeechStream(stream_id, auth_token=None):
+    """
+    Finish a recording streamed to the speech2text service and get its transcript
+    
+    The officer app sends audio to the speech2text stream endpoints while it
+    is being recorded, so most of it is transcribed by the time it ends and
+    only the last few seconds are left.
+    
+    Args:
+        stream_id: ID returned when the stream was started
+        auth_token: JWT to forward; read from the current request when omitted
+        
+    Returns:
+        str: Transcribed text, or None if the stream could not be finished
+    """
+    try:
+        current_token = auth_token if auth_token is not None else request.headers.get('Authorization', '').replace('Bearer ', '')
+        response = requests.post(
+            f"{app.config['SPEECH2TEXT_API_URL']}/api/stream/{stream_id}/finish",
+            headers={'Authorization': f'Bearer {current_token}'},
+            timeout=120
+        )
+        print(f"Finish stream {stream_id} status code: {response.status_code}", flush=True)
+        
+        if response.status_code == 200:
+            return response.json().get('text', '')
+        print(f"Speech2text API error: {response.status_code} - {response.text}", flush=True)
+        return None
+    except Exception as e:
+        print(f"Exception in finishSpeechStream: {e}", flush=True)
+        return None
+
 def process_text_with_ollama_service(text):
     """Process text using the speech2text service with Ollama"""
     try:
@@ -509,6 +515,7 @@ class ParameterList(Resource):
             }
             
             result = mongo.db.parameters.insert_one(parameter)
+            parameter_cache.bump_version()
             
             # Return serialized response
             serialized_parameter = serialize_mongo_doc({
@@ -545,6 +552,7 @@ class ParameterDetail(Resource):
         )
         
         if result.matched_count:
+            parameter_cache.bump_version()
             return {'message': 'Parameter updated successfully'}, 200
         
         return {'message': 'Parameter not found'}, 404
@@ -555,6 +563,7 @@ class ParameterDetail(Resource):
         result = mongo.db.parameters.delete_one({'_id': ObjectId(parameter_id)})
         
         if result.deleted_count:
+            parameter_cache.bump_version()
             return {'message': 'Parameter deleted successfully'}, 200
         
         return {'message': 'Parameter not found'}, 404
@@ -565,8 +574,6 @@ class RequestList(Resource):
     def get(self):
         """Get all API requests with pagination"""
         try:
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             start_date = request.args.get('start_date')
             end_date = request.args.get('end_date')
             
@@ -577,11 +584,10 @@ class RequestList(Resource):
                     '$lte': datetime.fromisoformat(end_date)
                 }
             
-            total = mongo.db.requests.count_documents(query)
-            requests_data = list(mongo.db.requests.find(query)
-                               .sort('created_at', -1)
-                               .skip((page - 1) * per_page)
-                               .limit(per_page))
+            try:
+                requests_data, pagination = paginate(mongo.db.requests, query, 'created_at', request.args)
+            except InvalidPagination as e:
+                return {'error': str(e)}, 400
             
             # Serialize requests to avoid ObjectId issues
             serialized_requests = []
@@ -593,10 +599,7 @@ class RequestList(Resource):
             
             result = {
                 'data': serialized_requests,
-                'total': total,
-                'page': page,
-                'per_page': per_page,
-                'pages': (total + per_page - 1) // per_page
+                **pagination
             }
             
             return result, 200
@@ -606,20 +609,47 @@ class RequestList(Resource):
             traceback.print_exc()
             return {'error': str(e)}, 500
 
+@admin_ns.route('/requests/export')
+class RequestExport(Resource):
+    @jwt_required()
+    def get(self):
+        """Stream API requests as NDJSON or CSV (?format=, ?gzip=true, ?start_date=, ?end_date=)"""
+        try:
+            query = parse_date_range(request.args)
+            return export_response(mongo.db.requests, query, request.args, 'requests',
+                                   ['id', 'endpoint', 'status', 'error', 'extraction_id', 'created_at'])
+        except InvalidExport as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            print(f"Error in requests export endpoint: {e}")
+            return {'error': str(e)}, 500
+
+@admin_ns.route('/extractions/export')
+class ExtractionExport(Resource):
+    @jwt_required()
+    def get(self):
+        """Stream text extraction results as NDJSON or CSV (?format=, ?gzip=true, ?start_date=, ?end_date=)"""
+        try:
+            query = parse_date_range(request.args)
+            return export_response(mongo.db.extractions, query, request.args, 'extractions',
+                                   ['id', 'original_text', 'processed_output', 'extracted_info', 'has_audio', 'created_at'])
+        except InvalidExport as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            print(f"Error in extractions export endpoint: {e}")
+            return {'error': str(e)}, 500
+
 @admin_ns.route('/users')
 class UserList(Resource):
     @jwt_required()
     def get(self):
         """Get all users"""
         try:
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
-            
-            total = mongo.db.users.count_documents({})
-            users = list(mongo.db.users.find({}, {'password': 0})  # Exclude password field
-                       .sort('created_at', -1)
-                       .skip((page - 1) * per_page)
-                       .limit(per_page))
+            try:
+                users, pagination = paginate(mongo.db.users, {}, 'created_at', request.args,
+                                             projection={'password': 0})  # Exclude password field
+            except InvalidPagination as e:
+                return {'error': str(e)}, 400
             
             # Serialize users to avoid ObjectId issues
             serialized_users = []
@@ -631,10 +661,7 @@ class UserList(Resource):
             
             result = {
                 'data': serialized_users,
-                'total': total,
-                'page': page,
-                'per_page': per_page,
-                'pages': (total + per_page - 1) // per_page
+                **pagination
             }
             
             return result, 200
@@ -725,170 +752,296 @@ class UserDetail(Resource):
 
 @admin_ns.route('/dashboard')
 class Dashboard(Resource):
+    @admin_ns.param('start_date', 'Count requests created at or after this ISO 8601 date')
+    @admin_ns.param('end_date', 'Count requests created at or before this ISO 8601 date')
+    @admin_ns.param('endpoint', 'Only count requests to this endpoint')
+    @admin_ns.param('granularity', 'Also return a time series: minute, hour or day')
     @jwt_required()
     def get(self):
         """Get dashboard statistics"""
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        query = {}
-        if start_date and end_date:
-            query['created_at'] = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
+        try:
+            start = datetime.fromisoformat(request.args['start_date']) if request.args.get('start_date') else None
+            end = datetime.fromisoformat(request.args['end_date']) if request.args.get('end_date') else None
+            # Dates with an offset (...Z, +01:00) are compared with naive UTC times
+            start, end = request_stats.to_utc(start), request_stats.to_utc(end)
+        except ValueError:
+            return {'error': 'start_date and end_date must be ISO 8601 dates'}, 400
+        if end:
+            # end_date is inclusive; the rollups work on half-open ranges
+            end += timedelta(microseconds=1)
         
-        total_requests = mongo.db.requests.count_documents(query)
-        successful_requests = mongo.db.requests.count_documents({**query, 'status': 'success'})
-        error_requests = mongo.db.requests.count_documents({**query, 'status': 'error'})
+        granularity = request.args.get('granularity')
+        if granularity and granularity not in request_stats.GRANULARITIES:
+            return {'error': f"granularity must be one of: {', '.join(request_stats.GRANULARITIES)}"}, 400
+        endpoint = request.args.get('endpoint')
         
-        return {
+        # Whole minutes come from the request_stats rollups, only the edges from requests
+        groups, from_rollups = request_stats.collect_stats(mongo.db, start, end, endpoint)
+        
+        overall = request_stats.empty_stats()
+        by_endpoint = {}
+        for (group_endpoint, status), stats in groups.items():
+            request_stats.merge_stats(overall, stats)
+            entry = by_endpoint.setdefault(group_endpoint, {'stats': request_stats.empty_stats(), 'success': 0, 'error': 0})
+            request_stats.merge_stats(entry['stats'], stats)
+            if status in ('success', 'error'):
+                entry[status] += stats['count']
+        
+        total_requests = overall['count']
+        successful_requests = sum(entry['success'] for entry in by_endpoint.values())
+        error_requests = sum(entry['error'] for entry in by_endpoint.values())
+        
+        response = {
             'total_requests': total_requests,
             'successful_requests': successful_requests,
             'error_requests': error_requests,
-            'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0
+            'success_rate': (successful_requests / total_requests * 100) if total_requests > 0 else 0,
+            'latency': request_stats.latency_summary(overall),
+            'by_endpoint': {
+                name: {
+                    'total_requests': entry['stats']['count'],
+                    'successful_requests': entry['success'],
+                    'error_requests': entry['error'],
+                    'latency': request_stats.latency_summary(entry['stats'])
+                }
+                for name, entry in sorted(by_endpoint.items())
+            },
+            'source': 'rollups' if from_rollups else 'requests'
+        }
+        
+        if granularity:
+            # Without a date range, the last 60 buckets
+            series_end = end or datetime.utcnow()
+            series_start = start or series_end - request_stats.GRANULARITIES[granularity] * 60
+            response['series'] = request_stats.get_series(mongo.db, granularity, series_start, series_end, endpoint)
+        
+        return response, 200
+
+def parse_processed_output(processed_output):
+    """Parse the structured output into a dictionary"""
+    if not processed_output:
+        return {}
+    
+    extracted_info = {}
+    lines = processed_output.split('\n')
+    
+    for line in lines:
+        line = line.strip()
+        if ':' in line:
+            # Handle both "- Field: Value" and "Field: Value" formats
+            if line.startswith('- '):
+                line = line[2:]
+            
+            parts = line.split(':', 1)
+            if len(parts) == 2:
+                key = parts[0].strip()
+                value = parts[1].strip()
+                if value and value.lower() not in ['[not mentioned]', '[not available]', 'n/a', 'none', '']:
+                    extracted_info[key.lower().replace(' ', '_')] = value
+    
+    return extracted_info
+
+def format_extracted_info(extracted_info):
+    """Format extracted info dictionary into structured text"""
+    if not extracted_info:
+        return ""
+    
+    formatted_lines = []
+    for key, value in extracted_info.items():
+        if value:
+            formatted_key = key.replace('_', ' ').title()
+            formatted_lines.append(f"{formatted_key}: {value}")
+    
+    return '\n'.join(formatted_lines)
+
+def run_parse_message_pipeline(text_message, audio_file, auth_token=None, progress=None, stream_id=None):
+    """
+    Run the parse-message pipeline (speech to text, extraction, persistence)
+    
+    Shared by the synchronous endpoint and background jobs, so it must not
+    depend on the Flask request context.
+    
+    Args:
+        text_message: Text message, or None when only audio was provided
+        audio_file: File object containing audio data, or None
+        auth_token: JWT forwarded to the speech2text service
+        progress: Optional callable receiving the name of the current stage
+        stream_id: ID of a speech2text stream holding the audio instead of audio_file
+        
+    Returns:
+        tuple: (response body, HTTP status code)
+    """
+    def report(stage):
+        if progress:
+            progress(stage)
+    
+    started = time.monotonic()
+    
+    def elapsed_ms():
+        return round((time.monotonic() - started) * 1000, 1)
+    
+    try:
+        final_text = text_message
+        
+        # Convert audio to text if audio_message or a stream is provided
+        if audio_file or stream_id:
+            report('transcribing')
+            if stream_id:
+                print(f"Stream {stream_id} provided, finishing its transcription", flush=True)
+                converted_text = finishSpeechStream(stream_id, auth_token=auth_token)
+            else:
+                print(f"Audio file detected, calling speechToText method", flush=True)
+                converted_text = speechToText(audio_file, auth_token=auth_token)
+            print(f"speechToText result: {converted_text[:100] if converted_text else None}...", flush=True)
+            
+            if converted_text:
+                final_text = converted_text
+                print(f"Audio successfully converted to text", flush=True)
+            else:
+                # Audio processing failed - provide helpful error message
+                print("Audio processing failed, logging error to database", flush=True)
+                audit_logger.log({
+                    'endpoint': '/api/parse-message',
+                    'status': 'error',
+                    'error': 'Audio processing failed - please provide text message instead',
+                    'duration_ms': elapsed_ms(),
+                    'created_at': datetime.utcnow()
+                })
+                return {
+                    'message': 'Audio processing is currently unavailable. Please use the "message" parameter to provide your report as text instead.',
+                    'suggestion': 'Try using the text input: message="Your police report text here"',
+                    'example': 'message="Officer Johnson reporting traffic violation. Red Honda Civic plate ABC123 speeding in school zone."'
+                }, 400
+        
+        if not final_text:
+            return {'message': 'No text to process'}, 400
+        
+        print(f"Processing final text with Ollama: {final_text[:100]}...", flush=True)
+        report('extracting')
+        
+        # Use Ollama to extract information from the text (either from audio conversion or direct text input)
+        processed_output = process_text_with_ollama_service(final_text)
+        if not processed_output:
+            # Fallback to local Ollama processing
+            print("Remote Ollama processing failed, using local fallback", flush=True)
+            parameters = parameter_cache.get()
+            extracted_info = extract_information_with_ollama(final_text, parameters.parameters, parameters.compiled)
+            processed_output = format_extracted_info(extracted_info)
+        
+        # Parse the processed output into structured data
+        extracted_info = parse_processed_output(processed_output)
+        
+        # Save to database
+        report('saving')
+        result_doc = {
+            'original_text': final_text,
+            'processed_output': processed_output,
+            'extracted_info': extracted_info,
+            'has_audio': audio_file is not None or stream_id is not None,
+            'created_at': datetime.utcnow()
+        }
+        
+        result = mongo.db.extractions.insert_one(result_doc)
+        
+        # Log the request
+        audit_logger.log({
+            'endpoint': '/api/parse-message',
+            'status': 'success',
+            'extraction_id': str(result.inserted_id),
+            'duration_ms': elapsed_ms(),
+            'created_at': datetime.utcnow()
+        })
+        
+        return {
+            'id': str(result.inserted_id),
+            'text': final_text,
+            'processed_output': processed_output,
+            'extracted_info': extracted_info
         }, 200
+        
+    except Exception as e:
+        print(f"Exception in parse-message: {e}", flush=True)
+        import traceback
+        traceback.print_exc()
+        # Log the error
+        audit_logger.log({
+            'endpoint': '/api/parse-message',
+            'status': 'error',
+            'error': str(e),
+            'duration_ms': elapsed_ms(),
+            'created_at': datetime.utcnow()
+        })
+        return {'message': 'Internal server error'}, 500
 
 # Public API endpoints
 @api_ns.route('/parse-message')
 class ParseMessage(Resource):
     @api_ns.expect(message_model)
+    @api_ns.param('async', 'Run the extraction as a background job and return 202 with a job id (true/false, default: false)')
     @jwt_required()
     def post(self):
         """Parse text message or audio file and extract information"""
+        print(f"=== MAIN API: parse-message endpoint called ===", flush=True)
+        
+        text_message = request.form.get('message')
+        audio_file = request.files.get('audio_message')
+        stream_id = request.form.get('stream_id')
+        run_async = request.args.get('async', 'false').lower() == 'true'
+        
+        print(f"Text message: {text_message}", flush=True)
+        print(f"Audio file: {audio_file}", flush=True)
+        print(f"Request files: {list(request.files.keys())}", flush=True)
+        print(f"Request form: {list(request.form.keys())}", flush=True)
+        
+        if not text_message and not audio_file and not stream_id:
+            print("No text message, audio file or stream provided", flush=True)
+            return {'message': 'Either text message, audio file or stream_id is required'}, 400
+        
+        if stream_id:
+            # It becomes part of a speech2text URL, so it must be exactly a stream ID
+            try:
+                stream_id = str(uuid.UUID(stream_id))
+            except ValueError:
+                return {'message': 'stream_id must be a UUID'}, 400
+        
+        auth_token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        
+        if not run_async:
+            return run_parse_message_pipeline(text_message, audio_file, auth_token=auth_token, stream_id=stream_id)
+        
+        # The upload stream is closed once this request ends, so hand the
+        # background job its own in-memory copy of the audio
+        job_audio = None
+        if audio_file:
+            audio_file.seek(0)
+            job_audio = FileStorage(
+                stream=io.BytesIO(audio_file.read()),
+                filename=audio_file.filename,
+                content_type=audio_file.content_type
+            )
+        
         try:
-            print(f"=== MAIN API: parse-message endpoint called ===", flush=True)
-            
-            text_message = request.form.get('message')
-            audio_file = request.files.get('audio_message')
-            
-            print(f"Text message: {text_message}", flush=True)
-            print(f"Audio file: {audio_file}", flush=True)
-            print(f"Request files: {list(request.files.keys())}", flush=True)
-            print(f"Request form: {list(request.form.keys())}", flush=True)
-            
-            if not text_message and not audio_file:
-                print("No text message or audio file provided", flush=True)
-                return {'message': 'Either text message or audio file is required'}, 400
-            
-            final_text = text_message
-            
-            # Convert audio to text if audio_message is provided
-            if audio_file:
-                print(f"Audio file detected, calling speechToText method", flush=True)
-                converted_text = speechToText(audio_file)
-                print(f"speechToText result: {converted_text[:100] if converted_text else None}...", flush=True)
-                
-                if converted_text:
-                    final_text = converted_text
-                    print(f"Audio successfully converted to text", flush=True)
-                else:
-                    # Audio processing failed - provide helpful error message
-                    print("Audio processing failed, logging error to database", flush=True)
-                    mongo.db.requests.insert_one({
-                        'endpoint': '/api/parse-message',
-                        'status': 'error',
-                        'error': 'Audio processing failed - please provide text message instead',
-                        'created_at': datetime.utcnow()
-                    })
-                    return {
-                        'message': 'Audio processing is currently unavailable. Please use the "message" parameter to provide your report as text instead.',
-                        'suggestion': 'Try using the text input: message="Your police report text here"',
-                        'example': 'message="Officer Johnson reporting traffic violation. Red Honda Civic plate ABC123 speeding in school zone."'
-                    }, 400
-            
-            if not final_text:
-                return {'message': 'No text to process'}, 400
-            
-            print(f"Processing final text with Ollama: {final_text[:100]}...", flush=True)
-            
-            # Use Ollama to extract information from the text (either from audio conversion or direct text input)
-            processed_output = process_text_with_ollama_service(final_text)
-            if not processed_output:
-                # Fallback to local Ollama processing
-                print("Remote Ollama processing failed, using local fallback", flush=True)
-                parameters = list(mongo.db.parameters.find({'active': True}))
-                extracted_info = extract_information_with_ollama(final_text, parameters)
-                processed_output = self._format_extracted_info(extracted_info)
-            
-            # Parse the processed output into structured data
-            extracted_info = self._parse_processed_output(processed_output)
-            
-            # Save to database
-            result_doc = {
-                'original_text': final_text,
-                'processed_output': processed_output,
-                'extracted_info': extracted_info,
-                'has_audio': audio_file is not None,
-                'created_at': datetime.utcnow()
-            }
-            
-            result = mongo.db.extractions.insert_one(result_doc)
-            
-            # Log the request
-            mongo.db.requests.insert_one({
-                'endpoint': '/api/parse-message',
-                'status': 'success',
-                'extraction_id': str(result.inserted_id),
-                'created_at': datetime.utcnow()
-            })
-            
-            return {
-                'id': str(result.inserted_id),
-                'text': final_text,
-                'processed_output': processed_output,
-                'extracted_info': extracted_info
-            }, 200
-            
+            job_id = submit_job(
+                'parse-message',
+                run_parse_message_pipeline,
+                text_message,
+                job_audio,
+                auth_token=auth_token,
+                stream_id=stream_id,
+                created_by=get_jwt_identity()
+            )
+        except JobQueueFull as e:
+            return {'message': str(e)}, 503
         except Exception as e:
-            print(f"Exception in parse-message: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            # Log the error
-            mongo.db.requests.insert_one({
-                'endpoint': '/api/parse-message',
-                'status': 'error',
-                'error': str(e),
-                'created_at': datetime.utcnow()
-            })
+            print(f"Error submitting parse-message job: {e}", flush=True)
             return {'message': 'Internal server error'}, 500
-    
-    def _parse_processed_output(self, processed_output):
-        """Parse the structured output into a dictionary"""
-        if not processed_output:
-            return {}
-        
-        extracted_info = {}
-        lines = processed_output.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if ':' in line:
-                # Handle both "- Field: Value" and "Field: Value" formats
-                if line.startswith('- '):
-                    line = line[2:]
-                
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    key = parts[0].strip()
-                    value = parts[1].strip()
-                    if value and value.lower() not in ['[not mentioned]', '[not available]', 'n/a', 'none', '']:
-                        extracted_info[key.lower().replace(' ', '_')] = value
-        
-        return extracted_info
-    
-    def _format_extracted_info(self, extracted_info):
-        """Format extracted info dictionary into structured text"""
-        if not extracted_info:
-            return ""
-        
-        formatted_lines = []
-        for key, value in extracted_info.items():
-            if value:
-                formatted_key = key.replace('_', ' ').title()
-                formatted_lines.append(f"{formatted_key}: {value}")
         
-        return '\n'.join(formatted_lines)
+        status_url = f"/api/jobs/{job_id}"
+        return {
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url
+        }, 202, {'Location': status_url}
 
 # Car identifier endpoint moved to car-identifier-service
 # This endpoint is now available at car-identifier-service:8653/api/public/car-identifier
@@ -922,7 +1075,10 @@ class Health(Resource):
             'services': {
                 'database': db_status,
                 'speech2text': speech_status
-            }
+            },
+            'ollama_calls': ollama.get_stats(),
+            'audit_log': audit_logger.get_stats(),
+            'parameter_cache': parameter_cache.get_stats()
         }, 200
 
 if __name__ == '__main__':
@@ -930,6 +1086,14 @@ if __name__ == '__main__':
     with app.app_context():
         init_database()
     
+    parameter_cache.start_watch()
+    
+    if request_stats.STATS_ENABLED:
+        request_stats.start_rollup_worker(lambda: mongo.db)
+    
+    # Flush queued audit records when the container is stopped
+    install_shutdown_handler()
+    
     print("=== Flask app routes ===")
     for rule in app.url_map.iter_rules():
         print(f"Route: {rule.rule} -> {rule.endpoint}")
@@ -0,0 +1,148 @@
+"""
+Bulk Write Module for Officer Insight API
+Reads JSON array or NDJSON request bodies in batches and applies them with unordered bulk writes
+"""
+
+import os
+import json
+from pymongo.errors import BulkWriteError
+
+# Content types read line by line as NDJSON; anything else must be a JSON array
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'}
+
+# Configurable parameters with environment variable overrides
+def get_batch_size():
+    """Get the number of rows validated and written together from environment or default"""
+    try:
+        return max(1, int(os.getenv('BULK_BATCH_SIZE', 1000)))
+    except ValueError:
+        return 1000
+
+# Configuration
+BATCH_SIZE = get_batch_size()
+
+class InvalidBulkBody(ValueError):
+    """Raised when a bulk request body is neither a JSON array nor NDJSON"""
+
+def iter_rows(req):
+    """
+    Yield (index, row) for every row of a bulk request
+
+    NDJSON bodies are read line by line, so they are never held in memory
+    whole; index is the zero-based line number and blank lines are skipped.
+    A line that isn't valid JSON yields an error string in place of the row.
+
+    Raises:
+        InvalidBulkBody: If a JSON body is not an array
+    """
+    if req.mimetype in NDJSON_TYPES:
+        for index, line in enumerate(req.stream):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, f'invalid JSON: {e}'
+        return
+
+    rows = req.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise InvalidBulkBody('Request body must be a JSON array or NDJSON (Content-Type: application/x-ndjson)')
+    yield from enumerate(rows)
+
+def iter_batches(rows, size=BATCH_SIZE):
+    """Group an iterable of rows into lists of at most size"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def row_error(index, errors):
+    """Per-row result of a rejected row"""
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+def execute(collection, planned):
+    """
+    Apply planned writes with a single unordered bulk_write
+
+    Args:
+        planned: list of dicts with 'index' (row), 'operation' (pymongo write),
+            'id' (record id, or None if an upsert decides it) and 'result'
+            (extra fields for the row's result)
+
+    Returns:
+        list: per-row results with status 'created', 'updated' or 'error'
+    """
+    if not planned:
+        return []
+
+    write_errors = {}
+    upserted = {}
+    try:
+        upserted = collection.bulk_write([plan['operation'] for plan in planned], ordered=False).upserted_ids
+    except BulkWriteError as e:
+        # Unordered: every operation without an error below was still applied
+        write_errors = {error['index']: error.get('errmsg', 'write failed') for error in e.details.get('writeErrors', [])}
+        upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+
+    results = []
+    for position, plan in enumerate(planned):
+        if position in write_errors:
+            results.append(row_error(plan['index'], [write_errors[position]]))
+            continue
+        if position in upserted:
+            status, record_id = 'created', upserted[position]
+        else:
+            status, record_id = plan.get('status', 'updated'), plan['id']
+        result = {'index': plan['index'], 'status': status, 'id': str(record_id) if record_id else None}
+        result.update(plan.get('result', {}))
+        results.append(result)
+    return results
+
+def run_bulk(req, write_batch):
+    """
+    Read a bulk request and write it batch by batch
+
+    Args:
+        req: Flask request
+        write_batch: Callable taking a list of (index, row) and returning per-row results
+
+    Returns:
+        dict: 'summary' counts by status and 'results' ordered by row index
+
+    Raises:
+        InvalidBulkBody: If the body cannot be read as rows
+    """
+    results = []
+    for batch in iter_batches(iter_rows(req)):
+        rows = []
+        for index, row in batch:
+            if isinstance(row, str):
+                results.append(row_error(index, [row]))
+            elif not isinstance(row, dict):
+                results.append(row_error(index, ['row must be a JSON object']))
+            else:
+                rows.append((index, row))
+        results.extend(write_batch(rows))
+
+    results.sort(key=lambda result: result['index'])
+    summary = {'total': len(results), 'created': 0, 'updated': 0, 'failed': 0}
+    for result in results:
+        summary['failed' if result['status'] == 'error' else result['status']] += 1
+    return {'summary': summary, 'results': results}
+
+def resolve_photos(photo_ids, images):
+    """
+    Look up a row's photo ids in images fetched for its batch
+
+    Returns:
+        tuple: (image objects found, ids that were not)
+    """
+    found = [images[str(photo_id)] for photo_id in photo_ids if str(photo_id) in images]
+    missing = [photo_id for photo_id in photo_ids if str(photo_id) not in images]
+    return found, missing
@@ -0,0 +1,190 @@
+"""
+Export Module for Officer Insight API
+Streams query results as NDJSON or CSV, optionally gzip-compressed, in constant memory
+"""
+
+import os
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from bson import ObjectId
+from flask import Response
+from pymongo import DESCENDING
+
+# Formats accepted by the 'format' query parameter
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# Configurable parameters with environment variable overrides
+def get_batch_size():
+    """Get the number of documents fetched per cursor round trip from environment or default"""
+    try:
+        return max(1, int(os.getenv('EXPORT_BATCH_SIZE', 1000)))
+    except ValueError:
+        return 1000
+
+def get_chunk_size():
+    """Get the number of bytes buffered before a chunk is written to the response from environment or default"""
+    try:
+        return max(1024, int(os.getenv('EXPORT_CHUNK_SIZE', 64 * 1024)))
+    except ValueError:
+        return 64 * 1024
+
+# Configuration
+BATCH_SIZE = get_batch_size()
+CHUNK_SIZE = get_chunk_size()
+
+class InvalidExport(ValueError):
+    """Raised when export query parameters are malformed"""
+
+def json_default(value):
+    """Serialize the BSON types json doesn't know"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def export_record(doc):
+    """Rename _id to id, as the list endpoints do"""
+    record = {'id': doc.get('_id')}
+    record.update((key, value) for key, value in doc.items() if key != '_id')
+    return record
+
+def csv_value(value):
+    """Flatten a value for a CSV cell; nested values become JSON"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=json_default, ensure_ascii=False)
+    if isinstance(value, (ObjectId, datetime)):
+        return json_default(value)
+    return value
+
+def iter_lines(cursor, export_format, columns):
+    """Yield the encoded lines of an export, header first for CSV"""
+    if export_format == 'ndjson':
+        for doc in cursor:
+            yield (json.dumps(export_record(doc), default=json_default, ensure_ascii=False) + '\n').encode('utf-8')
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for doc in cursor:
+        record = export_record(doc)
+        writer.writerow([csv_value(record.get(column)) for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def iter_chunks(lines, compress=False, chunk_size=CHUNK_SIZE):
+    """Group lines into chunks of about chunk_size bytes, gzip-compressing them if asked"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    pending_size = 0
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= chunk_size:
+            chunk = b''.join(pending)
+            pending, pending_size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b''.join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+def parse_export_args(args):
+    """
+    Read the format and gzip query parameters
+
+    Returns:
+        tuple: (format, gzip flag)
+
+    Raises:
+        InvalidExport: If the format is unknown
+    """
+    export_format = args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidExport(f"format must be one of: {', '.join(sorted(EXPORT_FORMATS))}")
+    return export_format, args.get('gzip', 'false').lower() == 'true'
+
+def parse_date_range(args):
+    """
+    Build a created_at filter from start_date and end_date (ISO 8601), as the admin lists accept
+
+    Raises:
+        InvalidExport: If a date is malformed
+    """
+    date_range = {}
+    try:
+        if args.get('start_date'):
+            date_range['$gte'] = datetime.fromisoformat(args['start_date'])
+        if args.get('end_date'):
+            date_range['$lte'] = datetime.fromisoformat(args['end_date'])
+    except ValueError:
+        raise InvalidExport('start_date and end_date must be ISO 8601 dates')
+    return {'created_at': date_range} if date_range else {}
+
+def export_response(collection, query, args, name, columns, sort_field='created_at', projection=None):
+    """
+    Stream every document matching a query as a file download
+
+    Documents are read from a server-side cursor BATCH_SIZE at a time, newest
+    first, and written out in CHUNK_SIZE pieces as they arrive, so memory use
+    doesn't grow with the result. ?format=ndjson|csv picks the format (NDJSON
+    by default) and ?gzip=true compresses the stream.
+
+    Args:
+        collection: MongoDB collection to export
+        query: Filter of the documents to export
+        args: Request query parameters
+        name: Base name of the downloaded file
+        columns: CSV columns, in order; NDJSON rows hold every field
+        sort_field: Field exported newest first, with _id as tie-break
+        projection: Fields to leave out or keep
+
+    Raises:
+        InvalidExport: If a query parameter is malformed
+    """
+    export_format, compress = parse_export_args(args)
+    try:
+        batch_size = max(1, int(args.get('batch_size', BATCH_SIZE)))
+    except ValueError:
+        raise InvalidExport('batch_size must be an integer')
+
+    cursor = collection.find(query, projection).sort([(sort_field, DESCENDING), ('_id', DESCENDING)]).batch_size(batch_size)
+
+    def generate():
+        try:
+            yield from iter_chunks(iter_lines(cursor, export_format, columns), compress)
+        except Exception as e:
+            # Headers are already sent, so the client only sees a truncated file
+            print(f"Error streaming {name} export: {e}", flush=True)
+            raise
+        finally:
+            # Also runs when the client disconnects mid-export
+            cursor.close()
+
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    if compress:
+        filename += '.gz'
+    return Response(
+        generate(),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
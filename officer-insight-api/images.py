@@ -11,6 +11,7 @@ from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from bson import ObjectId
+from pagination import paginate, InvalidPagination
 import shutil
 
 # Create namespace
@@ -104,6 +105,47 @@ def serialize_mongo_doc(doc):
     else:
         return doc
 
+# Image fields embedded in vehicle and person records: those of image_response_model
+IMAGE_METADATA_PROJECTION = {field: 1 for field in image_response_model if field != 'id'}
+
+def image_ref_id(ref):
+    """Get the image id of a reference stored as an id string, ObjectId or embedded image object"""
+    if isinstance(ref, dict):
+        ref = ref.get('id') or ref.get('_id')
+    return str(ref) if ref else None
+
+def find_image_objects(db, image_ids, projection=None):
+    """
+    Get many images with a single query
+
+    Returns:
+        dict: {image id: serialized image}; ids that are malformed or missing are left out
+    """
+    object_ids = [ObjectId(image_id) for image_id in set(image_ids) if image_id and ObjectId.is_valid(image_id)]
+    if not object_ids:
+        return {}
+    return {
+        str(image['_id']): serialize_mongo_doc(image)
+        for image in db.images.find({'_id': {'$in': object_ids}}, projection)
+    }
+
+def embed_image_objects(db, records, field):
+    """
+    Replace the image references in each record's field with current image metadata
+
+    The images of all records are fetched with a single query rather than one
+    per record. References to images that no longer exist are dropped.
+    """
+    image_ids = [image_ref_id(ref) for record in records for ref in record.get(field) or []]
+    images = find_image_objects(db, image_ids, IMAGE_METADATA_PROJECTION)
+    for image in images.values():
+        image['id'] = image.pop('_id')
+
+    for record in records:
+        if field in record:
+            refs = [image_ref_id(ref) for ref in record.get(field) or []]
+            record[field] = [images[image_id] for image_id in refs if image_id in images]
+
 @images_ns.route('/upload')
 class ImageUpload(Resource):
     @jwt_required()
@@ -193,8 +235,6 @@ class ImageList(Resource):
         """Get list of images with pagination"""
         try:
             # Get query parameters
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             user_id = request.args.get('user_id')
             username = request.args.get('username')
             
@@ -207,14 +247,11 @@ class ImageList(Resource):
             
             db = get_mongo_db()
             
-            # Get total count
-            total = db.images.count_documents(query)
-            
-            # Get paginated results
-            images = list(db.images.find(query)
-                         .sort('upload_date', -1)
-                         .skip((page - 1) * per_page)
-                         .limit(per_page))
+            # Get paginated results (offset or keyset, see pagination.py)
+            try:
+                images, pagination = paginate(db.images, query, 'upload_date', request.args)
+            except InvalidPagination as e:
+                return {'message': str(e)}, 400
             
             # Serialize results
             serialized_images = []
@@ -225,12 +262,7 @@ class ImageList(Resource):
             
             return {
                 'images': serialized_images,
-                'pagination': {
-                    'total': total,
-                    'page': page,
-                    'per_page': per_page,
-                    'pages': (total + per_page - 1) // per_page
-                }
+                'pagination': pagination
             }, 200
             
         except Exception as e:
@@ -0,0 +1,234 @@
+"""
+Jobs API Module for Officer Insight API
+Runs long-running pipelines on a bounded background executor and exposes their progress
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import request
+from flask_restx import Namespace, Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Create namespace
+jobs_ns = Namespace('jobs', description='Background job operations')
+
+# Job lifecycle states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+TERMINAL_STATES = {JOB_SUCCEEDED, JOB_FAILED}
+
+# Configurable parameters with environment variable overrides
+def get_job_workers():
+    """Get number of background job workers from environment or default"""
+    try:
+        return max(1, int(os.getenv('PARSE_JOB_WORKERS', 4)))
+    except ValueError:
+        return 4
+
+def get_job_queue_size():
+    """Get number of jobs allowed to wait for a worker from environment or default"""
+    try:
+        return max(0, int(os.getenv('PARSE_JOB_QUEUE_SIZE', 32)))
+    except ValueError:
+        return 32
+
+def get_max_wait_seconds():
+    """Get the longest long-poll wait a client may request from environment or default"""
+    try:
+        return max(0.0, float(os.getenv('JOB_MAX_WAIT_SECONDS', 30)))
+    except ValueError:
+        return 30.0
+
+def get_retention_hours():
+    """Get how long finished jobs are kept for polling from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('JOB_RETENTION_HOURS', 24)))
+    except ValueError:
+        return 24.0
+
+# Configuration
+JOB_WORKERS = get_job_workers()
+JOB_QUEUE_SIZE = get_job_queue_size()
+MAX_WAIT_SECONDS = get_max_wait_seconds()
+JOB_RETENTION = timedelta(hours=get_retention_hours())
+
+# ThreadPoolExecutor has an unbounded queue, so admission is limited by a
+# semaphore covering running plus waiting jobs
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='insight-job')
+_slots = threading.BoundedSemaphore(JOB_WORKERS + JOB_QUEUE_SIZE)
+
+# Completion events for jobs running in this process, used to wake long-polls early
+_job_events = {}
+_job_events_lock = threading.Lock()
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+def get_mongo_db():
+    """Get MongoDB database instance"""
+    from app import mongo
+    return mongo.db
+
+def serialize_mongo_doc(doc):
+    """Convert MongoDB document to JSON serializable format"""
+    if isinstance(doc, list):
+        return [serialize_mongo_doc(item) for item in doc]
+    elif isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = serialize_mongo_doc(value)
+            else:
+                result[key] = value
+        return result
+    else:
+        return doc
+
+def update_job(job_id, **changes):
+    """Update fields of a job document"""
+    changes['updated_at'] = datetime.utcnow()
+    get_mongo_db().jobs.update_one({'_id': ObjectId(job_id)}, {'$set': changes})
+
+def submit_job(job_type, func, *args, created_by=None, **kwargs):
+    """
+    Record a job and schedule it on the background executor
+
+    Args:
+        job_type: Short name of the job, stored on the job document
+        func: Callable returning (response body, HTTP status code); it is
+            called with an extra ``progress`` keyword receiving stage names
+        created_by: User ID allowed to read the job
+
+    Returns:
+        str: ID of the created job
+
+    Raises:
+        JobQueueFull: If no worker or queue slot is free
+    """
+    if not _slots.acquire(blocking=False):
+        raise JobQueueFull('Too many background jobs in progress, please retry shortly')
+
+    try:
+        now = datetime.utcnow()
+        result = get_mongo_db().jobs.insert_one({
+            'type': job_type,
+            'status': JOB_QUEUED,
+            'stage': JOB_QUEUED,
+            'created_by': created_by,
+            'result': None,
+            'status_code': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+            # Removed by the TTL index on jobs; moved on when the job finishes
+            'expires_at': now + JOB_RETENTION
+        })
+        job_id = str(result.inserted_id)
+
+        with _job_events_lock:
+            _job_events[job_id] = threading.Event()
+
+        _executor.submit(_run_job, job_id, func, args, kwargs)
+        return job_id
+    except Exception:
+        _slots.release()
+        raise
+
+def _run_job(job_id, func, args, kwargs):
+    """Execute a job and store its outcome"""
+    try:
+        update_job(job_id, status=JOB_RUNNING, stage='started', started_at=datetime.utcnow())
+
+        body, status_code = func(*args, progress=lambda stage: update_job(job_id, stage=stage), **kwargs)
+
+        update_job(
+            job_id,
+            status=JOB_SUCCEEDED if status_code < 400 else JOB_FAILED,
+            stage='completed',
+            result=body,
+            status_code=status_code,
+            completed_at=datetime.utcnow(),
+            expires_at=datetime.utcnow() + JOB_RETENTION
+        )
+    except Exception as e:
+        print(f"Error running job {job_id}: {e}", flush=True)
+        try:
+            update_job(
+                job_id,
+                status=JOB_FAILED,
+                stage='completed',
+                error=str(e),
+                status_code=500,
+                completed_at=datetime.utcnow(),
+                expires_at=datetime.utcnow() + JOB_RETENTION
+            )
+        except Exception as update_error:
+            print(f"Error recording failure of job {job_id}: {update_error}", flush=True)
+    finally:
+        _slots.release()
+        with _job_events_lock:
+            event = _job_events.pop(job_id, None)
+        if event:
+            event.set()
+
+def can_view_job(job):
+    """Check whether the current user may read a job"""
+    return job.get('created_by') == get_jwt_identity() or get_jwt().get('role') == 'admin'
+
+@jobs_ns.route('/<job_id>')
+class JobDetail(Resource):
+    @jwt_required()
+    @jobs_ns.param('wait', 'Seconds to wait for the job to finish before responding (long-poll, default: 0)')
+    def get(self, job_id):
+        """Get background job status and result"""
+        try:
+            try:
+                object_id = ObjectId(job_id)
+            except InvalidId:
+                return {'message': 'Invalid job ID'}, 400
+
+            try:
+                wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_WAIT_SECONDS)
+            except ValueError:
+                return {'message': 'wait must be a number of seconds'}, 400
+
+            db = get_mongo_db()
+            deadline = time.monotonic() + wait
+
+            while True:
+                job = db.jobs.find_one({'_id': object_id})
+                if not job or not can_view_job(job):
+                    return {'message': 'Job not found'}, 404
+
+                remaining = deadline - time.monotonic()
+                if job['status'] in TERMINAL_STATES or remaining <= 0:
+                    break
+
+                # Jobs owned by this process wake the poll directly; jobs running
+                # in another worker process are picked up by re-reading the document
+                with _job_events_lock:
+                    event = _job_events.get(job_id)
+                if event:
+                    event.wait(min(remaining, 1.0))
+                else:
+                    time.sleep(min(remaining, 0.5))
+
+            serialized_job = serialize_mongo_doc(job)
+            serialized_job['id'] = serialized_job['_id']
+
+            return {'job': serialized_job}, 200
+
+        except Exception as e:
+            print(f"Error getting job: {e}")
+            return {'message': 'Internal server error'}, 500
@@ -0,0 +1,159 @@
+"""
+Pagination Module
+Offset and keyset (cursor) pagination shared by the list endpoints
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+# Count modes accepted by the 'count' query parameter
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+COUNT_MODES = {COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE}
+
+# Configurable parameters with environment variable overrides
+def get_count_limit():
+    """Get the number of matches an estimated count stops at from environment or default"""
+    try:
+        return max(1, int(os.getenv('PAGINATION_COUNT_LIMIT', 10000)))
+    except ValueError:
+        return 10000
+
+# Configuration
+COUNT_LIMIT = get_count_limit()
+
+class InvalidPagination(ValueError):
+    """Raised when pagination query parameters are malformed"""
+
+def encode_cursor(sort_value, doc_id):
+    """Encode the position after a document as an opaque cursor"""
+    if isinstance(sort_value, datetime):
+        value = {'$date': sort_value.isoformat()}
+    else:
+        value = sort_value
+    payload = json.dumps({'v': value, 'id': str(doc_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        tuple: (sort_value, ObjectId)
+
+    Raises:
+        InvalidPagination: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value = payload['v']
+        if isinstance(value, dict) and '$date' in value:
+            value = datetime.fromisoformat(value['$date'])
+        return value, ObjectId(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidPagination('Invalid cursor')
+
+def keyset_filter(sort_field, sort_value, doc_id):
+    """Match documents that come after (sort_value, doc_id) in descending order"""
+    if sort_value is None:
+        # Missing values sort last, so only the _id tie-break remains
+        return {sort_field: None, '_id': {'$lt': doc_id}}
+    return {'$or': [
+        {sort_field: {'$lt': sort_value}},
+        {sort_field: sort_value, '_id': {'$lt': doc_id}},
+        {sort_field: None}
+    ]}
+
+def count_matches(collection, query, count_mode):
+    """
+    Count documents matching a query
+
+    Returns:
+        tuple: (total or None, whether the total is exact)
+    """
+    if count_mode == COUNT_NONE:
+        return None, False
+    if count_mode == COUNT_ESTIMATE:
+        if not query:
+            # Reads collection metadata instead of scanning
+            return collection.estimated_document_count(), False
+        total = collection.count_documents(query, limit=COUNT_LIMIT)
+        return total, total < COUNT_LIMIT
+    return collection.count_documents(query), True
+
+def paginate(collection, query, sort_field, args, projection=None):
+    """
+    Fetch one page of a collection, newest first
+
+    Offset mode (default) uses ?page=&per_page=. Sending ?after= switches to
+    keyset mode: an empty value starts at the first page and the next_cursor
+    of a response continues after its last document, so deep pages cost the
+    same as the first. ?count=exact|estimate|none controls the total; it
+    defaults to exact in offset mode and none in keyset mode.
+
+    Returns:
+        tuple: (documents, pagination dict)
+
+    Raises:
+        InvalidPagination: If a query parameter is malformed
+    """
+    try:
+        per_page = int(args.get('per_page', 10))
+        page = int(args.get('page', 1))
+    except ValueError:
+        raise InvalidPagination('page and per_page must be integers')
+    if per_page < 1 or page < 1:
+        raise InvalidPagination('page and per_page must be positive')
+
+    keyset = 'after' in args
+    count_mode = args.get('count', COUNT_NONE if keyset else COUNT_EXACT).lower()
+    if count_mode not in COUNT_MODES:
+        raise InvalidPagination(f"count must be one of: {', '.join(sorted(COUNT_MODES))}")
+
+    page_query = query
+    if keyset and args.get('after'):
+        sort_value, doc_id = decode_cursor(args.get('after'))
+        after_filter = keyset_filter(sort_field, sort_value, doc_id)
+        page_query = {'$and': [query, after_filter]} if query else after_filter
+
+    cursor = collection.find(page_query, projection).sort([(sort_field, DESCENDING), ('_id', DESCENDING)])
+    if not keyset:
+        cursor = cursor.skip((page - 1) * per_page)
+
+    # One extra document tells whether another page exists without counting
+    documents = list(cursor.limit(per_page + 1))
+    has_more = len(documents) > per_page
+    documents = documents[:per_page]
+
+    total, total_exact = count_matches(collection, query, count_mode)
+
+    pagination = {
+        'total': total,
+        'total_exact': total_exact,
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(documents[-1].get(sort_field), documents[-1]['_id']) if has_more else None
+    }
+    if not keyset:
+        pagination['page'] = page
+        pagination['pages'] = (total + per_page - 1) // per_page if total is not None else None
+
+    return documents, pagination
+
+def ensure_pagination_indexes(db, paginated_collections):
+    """
+    Create the (sort field, _id) indexes keyset pagination relies on
+
+    Args:
+        db: MongoDB database
+        paginated_collections: Mapping of collection name to sort field
+    """
+    for collection_name, sort_field in paginated_collections.items():
+        db[collection_name].create_index([(sort_field, DESCENDING), ('_id', DESCENDING)])
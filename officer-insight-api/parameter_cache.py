@@ -0,0 +1,157 @@
+"""
+Parameter Cache Module for Officer Insight API
+Keeps the active extraction parameters and the prompt built from them in memory until an admin changes them
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
+
+# Document in cache_versions whose counter every parameter write increments
+VERSION_ID = 'parameters'
+
+# Configurable parameters with environment variable overrides
+def get_poll_seconds():
+    """Get how often the version counter is checked when no change stream is running from environment or default"""
+    try:
+        return max(0.0, float(os.getenv('PARAMETER_CACHE_POLL_SECONDS', 5)))
+    except ValueError:
+        return 5.0
+
+def get_max_age_seconds():
+    """Get how long cached parameters are used without reloading from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('PARAMETER_CACHE_MAX_AGE_SECONDS', 300)))
+    except ValueError:
+        return 300.0
+
+def get_watch_enabled():
+    """Get whether a change stream on parameters is opened from environment or default"""
+    return os.getenv('PARAMETER_CACHE_WATCH', 'true').lower() == 'true'
+
+# Configuration
+POLL_SECONDS = get_poll_seconds()
+MAX_AGE_SECONDS = get_max_age_seconds()
+WATCH_ENABLED = get_watch_enabled()
+
+class ParameterSet:
+    """Immutable snapshot of the active parameters and what was compiled from them"""
+
+    def __init__(self, parameters, compiled, version):
+        self.parameters = parameters
+        self.names = [parameter['name'] for parameter in parameters]
+        self.compiled = compiled
+        self.version = version
+
+class ParameterCache:
+    """
+    Process-wide cache of the active extraction parameters
+
+    The parameters are loaded on first use and handed to compile (e.g. to
+    build the extraction prompt) once per load. Writes through this process
+    call invalidate(). Writes through other processes are noticed through a
+    change stream where MongoDB supports one (replica sets), and otherwise by
+    checking the version counter that bump_version() increments at most
+    every POLL_SECONDS. Either way the cache is reloaded after
+    MAX_AGE_SECONDS, which covers edits made directly in the database
+    without a change stream.
+    """
+
+    def __init__(self, get_db, compile=None):
+        self.get_db = get_db
+        self.compile = compile
+        self.lock = threading.Lock()
+        self.current = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self.stale = True
+        self.watching = False
+        self.loads = 0
+
+    def get(self):
+        """Get the current ParameterSet, reloading it first if it may be out of date"""
+        now = time.monotonic()
+        current = self.current
+        if current is not None and not self.stale and now - self.loaded_at < MAX_AGE_SECONDS:
+            if self.watching or now - self.checked_at < POLL_SECONDS:
+                return current
+            self.checked_at = now
+            if self._read_version() == current.version:
+                return current
+
+        with self.lock:
+            # Another thread may have reloaded while this one waited
+            if self.current is not current and not self.stale:
+                return self.current
+            return self._load()
+
+    def invalidate(self):
+        """Make the next get() reload, e.g. after a write in this process"""
+        self.stale = True
+
+    def bump_version(self):
+        """Invalidate and tell other processes the parameters changed"""
+        self.invalidate()
+        try:
+            self.get_db().cache_versions.update_one(
+                {'_id': VERSION_ID},
+                {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"Error bumping parameter cache version: {e}", flush=True)
+
+    def _read_version(self):
+        doc = self.get_db().cache_versions.find_one({'_id': VERSION_ID}, {'version': 1})
+        return doc['version'] if doc else 0
+
+    def _load(self):
+        # Clear the flag first, so an invalidate() during the load triggers another one
+        self.stale = False
+        version = self._read_version()
+        parameters = list(self.get_db().parameters.find({'active': True}).sort('name', 1))
+        compiled = self.compile(parameters) if self.compile else None
+        self.current = ParameterSet(parameters, compiled, version)
+        self.loaded_at = self.checked_at = time.monotonic()
+        self.loads += 1
+        return self.current
+
+    def start_watch(self):
+        """
+        Invalidate on every change to the parameters collection, in a daemon thread
+
+        Stops at the first error: a standalone server has no change streams,
+        and polling the version counter takes over.
+        """
+        if not WATCH_ENABLED:
+            return None
+
+        def watch():
+            try:
+                with self.get_db().parameters.watch() as stream:
+                    self.watching = True
+                    # Changes made before the stream opened were not seen
+                    self.invalidate()
+                    print("Parameter cache following the parameters change stream", flush=True)
+                    for _ in stream:
+                        self.invalidate()
+            except Exception as e:
+                print(f"Parameter change stream unavailable, polling every {POLL_SECONDS}s instead: {e}", flush=True)
+            finally:
+                self.watching = False
+
+        thread = threading.Thread(target=watch, name='parameter-cache-watch', daemon=True)
+        thread.start()
+        return thread
+
+    def get_stats(self):
+        """Get the cache state"""
+        current = self.current
+        return {
+            'parameters': len(current.parameters) if current else None,
+            'version': current.version if current else None,
+            'loads': self.loads,
+            'invalidation': 'change_stream' if self.watching else 'polling'
+        }
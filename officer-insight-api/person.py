@@ -8,6 +8,12 @@ from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
+from pagination import paginate, InvalidPagination
+from pymongo import InsertOne, UpdateOne
+from images import embed_image_objects, find_image_objects
+from bulk import InvalidBulkBody, execute, resolve_photos, row_error, run_bulk
+from export import InvalidExport, export_response
+from search_index import SEARCH_FIELDS, build_search_doc, match_query, normalize_terms, search
 
 # Create namespace
 person_ns = Namespace('persons', description='Person management operations')
@@ -53,6 +59,12 @@ person_response_model = person_ns.model('PersonResponse', {
     'updated_at': fields.DateTime(description='Updated timestamp')
 })
 
+# Fields a client may set, besides person_photos
+PERSON_FIELDS = [field for field in person_model if field != 'person_photos']
+
+# Columns of a CSV export
+EXPORT_COLUMNS = list(person_response_model) + ['created_by', 'external_id']
+
 def get_mongo_db():
     """Get MongoDB database instance"""
     from app import mongo
@@ -116,6 +128,96 @@ def validate_person_data(data):
     
     return errors
 
+def write_person_batch(db, rows, user_id):
+    """
+    Validate a batch of bulk person rows and write them
+
+    A row with an 'id' updates that person, one with an 'external_id' is
+    upserted by it, and any other row creates a new person. Existing persons
+    and photos are fetched with one query each for the whole batch, and only
+    the fields present in a row are updated.
+
+    Returns:
+        list: Per-row results
+    """
+    results = []
+    accepted = []
+    seen = {}
+    for index, row in rows:
+        try:
+            errors = validate_person_data(row)
+        except TypeError:
+            errors = ['date fields must be strings in YYYY-MM-DD format']
+        if not errors and not isinstance(row.get('person_photos', []), list):
+            errors = ['person_photos must be a list of image IDs']
+        if not errors and row.get('id') and not ObjectId.is_valid(str(row['id'])):
+            errors = ['id is not a valid person ID']
+        if not errors and isinstance(row.get('external_id'), (dict, list)):
+            errors = ['external_id must be a string or number']
+        key = ('id', str(row['id'])) if row.get('id') else ('external_id', row['external_id']) if row.get('external_id') else None
+        if not errors and key in seen:
+            errors = [f'duplicate {key[0]} (row {seen[key]})']
+        if errors:
+            results.append(row_error(index, errors))
+            continue
+        if key:
+            seen[key] = index
+        accepted.append((index, row))
+    
+    if not accepted:
+        return results
+    
+    projection = {field: 1 for field in SEARCH_FIELDS['persons'].values()}
+    projection['external_id'] = 1
+    ids = [ObjectId(str(row['id'])) for _, row in accepted if row.get('id')]
+    external_ids = [row['external_id'] for _, row in accepted if not row.get('id') and row.get('external_id')]
+    by_id = {str(person['_id']): person for person in db.persons.find({'_id': {'$in': ids}}, projection)} if ids else {}
+    by_external_id = {
+        person['external_id']: person for person in db.persons.find({'external_id': {'$in': external_ids}}, projection)
+    } if external_ids else {}
+    images = find_image_objects(db, [photo for _, row in accepted for photo in row.get('person_photos') or []])
+    
+    now = datetime.utcnow()
+    planned = []
+    for index, row in accepted:
+        values = {field: row[field] for field in PERSON_FIELDS if field in row}
+        if not values.get('name'):
+            values['name'] = f"{row['first_name']} {row['last_name']}"
+        if 'external_id' in row:
+            values['external_id'] = row['external_id']
+        result = {}
+        if 'person_photos' in row:
+            values['person_photos'], missing = resolve_photos(row['person_photos'] or [], images)
+            if missing:
+                result['missing_photos'] = missing
+        
+        defaults = {field: '' for field in PERSON_FIELDS if field not in values}
+        if 'person_photos' not in values:
+            defaults['person_photos'] = []
+        on_insert = {**defaults, 'created_by': user_id, 'is_deleted': False, 'created_at': now}
+        
+        if row.get('id'):
+            current = by_id.get(str(row['id']))
+            if not current:
+                results.append(row_error(index, ['Person not found']))
+                continue
+            values['search'] = build_search_doc('persons', {**current, **values})
+            values['updated_at'] = now
+            operation = UpdateOne({'_id': current['_id']}, {'$set': values})
+            planned.append({'index': index, 'id': current['_id'], 'status': 'updated', 'result': result, 'operation': operation})
+        elif row.get('external_id'):
+            current = by_external_id.get(row['external_id'])
+            values['search'] = build_search_doc('persons', {**(current or defaults), **values})
+            values['updated_at'] = now
+            operation = UpdateOne({'external_id': row['external_id']}, {'$set': values, '$setOnInsert': on_insert}, upsert=True)
+            planned.append({'index': index, 'id': current['_id'] if current else None, 'result': result, 'operation': operation})
+        else:
+            person_doc = {**on_insert, **values, '_id': ObjectId(), 'updated_at': now}
+            person_doc['search'] = build_search_doc('persons', person_doc)
+            planned.append({'index': index, 'id': person_doc['_id'], 'status': 'created', 'result': result, 'operation': InsertOne(person_doc)})
+    
+    return results + execute(db.persons, planned)
+
 @person_ns.route('/create')
 class PersonCreate(Resource):
     @jwt_required()
@@ -165,9 +267,11 @@ class PersonCreate(Resource):
             }
             
             db = get_mongo_db()
+            person_doc['search'] = build_search_doc('persons', person_doc)
             result = db.persons.insert_one(person_doc)
             
             # Return created person
+            del person_doc['search']
             person_doc['_id'] = result.inserted_id
             person_doc['id'] = str(result.inserted_id)
             
@@ -180,6 +284,31 @@ class PersonCreate(Resource):
             print(f"Error creating person: {e}")
             return {'message': 'Internal server error'}, 500
 
+@person_ns.route('/bulk')
+class PersonBulk(Resource):
+    @jwt_required()
+    def post(self):
+        """Create or update persons, matched by id or external_id, from a JSON array or NDJSON body"""
+        try:
+            db = get_mongo_db()
+            current_user_id = get_jwt_identity()
+            
+            try:
+                bulk = run_bulk(request, lambda rows: write_person_batch(db, rows, current_user_id))
+            except InvalidBulkBody as e:
+                return {'message': str(e)}, 400
+            
+            summary = bulk['summary']
+            return {
+                'message': f"Processed {summary['total']} persons: {summary['created']} created, "
+                           f"{summary['updated']} updated, {summary['failed']} failed",
+                **bulk
+            }, 200
+            
+        except Exception as e:
+            print(f"Error bulk writing persons: {e}")
+            return {'message': 'Internal server error'}, 500
+
 @person_ns.route('/list')
 class PersonList(Resource):
     @jwt_required()
@@ -187,8 +316,6 @@ class PersonList(Resource):
         """Get list of persons with pagination"""
         try:
             # Get query parameters
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
             
             # Build query
@@ -198,14 +325,11 @@ class PersonList(Resource):
             
             db = get_mongo_db()
             
-            # Get total count
-            total = db.persons.count_documents(query)
-            
-            # Get paginated results
-            persons = list(db.persons.find(query)
-                          .sort('created_at', -1)
-                          .skip((page - 1) * per_page)
-                          .limit(per_page))
+            # Get paginated results (offset or keyset, see pagination.py)
+            try:
+                persons, pagination = paginate(db.persons, query, 'created_at', request.args, projection={'search': 0})
+            except InvalidPagination as e:
+                return {'message': str(e)}, 400
             
             # Serialize results
             serialized_persons = []
@@ -216,18 +340,39 @@ class PersonList(Resource):
             
             return {
                 'persons': serialized_persons,
-                'pagination': {
-                    'total': total,
-                    'page': page,
-                    'per_page': per_page,
-                    'pages': (total + per_page - 1) // per_page
-                }
+                'pagination': pagination
             }, 200
             
         except Exception as e:
             print(f"Error getting person list: {e}")
             return {'message': 'Internal server error'}, 500
 
+@person_ns.route('/export')
+class PersonExport(Resource):
+    @jwt_required()
+    def get(self):
+        """Stream all persons as NDJSON or CSV (?format=, ?gzip=true), filtered like /list and /search"""
+        try:
+            include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
+            
+            query = {}
+            if not include_deleted:
+                query['is_deleted'] = {'$ne': True}
+            
+            # Same search parameters and matching as /search, without the ranking
+            terms = normalize_terms('persons', request.args)
+            if terms:
+                query = match_query(terms, query)
+            
+            db = get_mongo_db()
+            return export_response(db.persons, query, request.args, 'persons', EXPORT_COLUMNS, projection={'search': 0})
+            
+        except InvalidExport as e:
+            return {'message': str(e)}, 400
+        except Exception as e:
+            print(f"Error exporting persons: {e}")
+            return {'message': 'Internal server error'}, 500
+
 @person_ns.route('/search')
 class PersonSearch(Resource):
     @jwt_required()
@@ -242,44 +387,19 @@ class PersonSearch(Resource):
             per_page = int(request.args.get('per_page', 10))
             include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
             
-            if not first_name and not last_name and not name:
+            terms = normalize_terms('persons', request.args)
+            if not terms:
                 return {'message': 'At least one of first_name, last_name, or name is required'}, 400
             
-            # Build search query
-            search_conditions = []
-            
-            if first_name:
-                search_conditions.append({
-                    'first_name': {'$regex': first_name, '$options': 'i'}
-                })
-            
-            if last_name:
-                search_conditions.append({
-                    'last_name': {'$regex': last_name, '$options': 'i'}
-                })
-            
-            if name:
-                search_conditions.append({
-                    'name': {'$regex': name, '$options': 'i'}
-                })
-            
             query = {}
-            if search_conditions:
-                query['$or'] = search_conditions
-            
             if not include_deleted:
                 query['is_deleted'] = {'$ne': True}
             
             db = get_mongo_db()
             
-            # Get total count
-            total = db.persons.count_documents(query)
-            
-            # Get paginated results
-            persons = list(db.persons.find(query)
-                          .sort('created_at', -1)
-                          .skip((page - 1) * per_page)
-                          .limit(per_page))
+            # Indexed lookup on the normalized keys and n-grams kept by search_index.py,
+            # ranked exact > prefix > substring
+            persons, total = search(db.persons, 'persons', terms, query, page, per_page)
             
             # Serialize results
             serialized_persons = []
@@ -314,7 +434,7 @@ class PersonDetail(Resource):
         """Get single person details"""
         try:
             db = get_mongo_db()
-            person = db.persons.find_one({'_id': ObjectId(person_id)})
+            person = db.persons.find_one({'_id': ObjectId(person_id)}, {'search': 0})
             
             if not person:
                 return {'message': 'Person not found'}, 404
@@ -367,6 +487,10 @@ class PersonDetail(Resource):
             update_data = {k: v for k, v in data.items() if v is not None}
             update_data['updated_at'] = datetime.utcnow()
             
+            # Keep the search keys in step with the searchable fields
+            if any(field in update_data for field in SEARCH_FIELDS['persons'].values()):
+                update_data['search'] = build_search_doc('persons', {**existing_person, **update_data})
+            
             result = db.persons.update_one(
                 {'_id': ObjectId(person_id)},
                 {'$set': update_data}
@@ -374,7 +498,7 @@ class PersonDetail(Resource):
             
             if result.matched_count:
                 # Return updated person
-                updated_person = db.persons.find_one({'_id': ObjectId(person_id)})
+                updated_person = db.persons.find_one({'_id': ObjectId(person_id)}, {'search': 0})
                 serialized_person = serialize_mongo_doc(updated_person)
                 serialized_person['id'] = serialized_person['_id']
                 
@@ -490,7 +614,7 @@ class PersonHealth(Resource):
 class MyPersons(Resource):
     @jwt_required()
     def get(self):
-        """Get all persons created by the current user"""
+        """Get persons created by the current user with their photos, newest first"""
         try:
             current_user_id = get_jwt_identity()
             
@@ -500,32 +624,37 @@ class MyPersons(Resource):
                 'is_deleted': {'$ne': True}
             }
             
+            # Optional ?fields=a,b limits the person fields returned
+            requested = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+            if requested:
+                projection = {field: 1 for field in requested if field in person_response_model and field != 'id'}
+                # created_at carries the keyset cursor
+                projection['created_at'] = 1
+            else:
+                projection = {'search': 0}
+            
             db = get_mongo_db()
-            persons = list(db.persons.find(query))
             
-            # Convert ObjectId to string and format response
+            # Get paginated results (offset or keyset, see pagination.py)
+            try:
+                persons, pagination = paginate(db.persons, query, 'created_at', request.args, projection)
+            except InvalidPagination as e:
+                return {'message': str(e)}, 400
+            
+            # One images query for the whole page
+            embed_image_objects(db, persons, 'person_photos')
+            
+            serialized_persons = []
             for person in persons:
-                person['id'] = str(person['_id'])
-                del person['_id']
-                
-                # Get image objects for person_photos
-                if person.get('person_photos'):
-                    image_ids = [ObjectId(img_id) if isinstance(img_id, str) else img_id 
-                               for img_id in person['person_photos'] if img_id]
-                    images = list(db.images.find({'_id': {'$in': image_ids}}))
-                    
-                    # Format images
-                    formatted_images = []
-                    for img in images:
-                        img['id'] = str(img['_id'])
-                        del img['_id']
-                        formatted_images.append(img)
-                    
-                    person['person_photos'] = formatted_images
+                serialized_person = serialize_mongo_doc(person)
+                serialized_person['id'] = serialized_person.pop('_id')
+                serialized_persons.append(serialized_person)
             
+            total = pagination['total'] if pagination['total'] is not None else len(persons)
             return {
-                'message': f'Found {len(persons)} persons',
-                'persons': persons
+                'message': f'Found {total} persons',
+                'persons': serialized_persons,
+                'pagination': pagination
             }, 200
             
         except Exception as e:
@@ -0,0 +1,273 @@
+"""
+Plate Matcher Module for Officer Insight API
+In-memory confusion-aware index of vehicle registration numbers for fuzzy lookups
+"""
+
+import math
+import os
+import threading
+import time
+from search_index import normalize_key
+
+# Characters OCR and speech transcripts mix up; substituting within a group is cheap
+CONFUSION_GROUPS = ('O0DQ', 'I1L', 'B8', 'S5', 'Z2', 'G6')
+
+# Cost of each edit. Missing or extra spaces cost nothing (normalize_key drops them).
+EDIT_COST = 1.0
+CONFUSION_COST = 0.2
+
+# Character -> representative of its confusion group
+CANONICAL = {char: group[0] for group in CONFUSION_GROUPS for char in group}
+
+# Configurable parameters with environment variable overrides
+def get_max_cost():
+    """
+    Get the maximum edit cost of a match from environment or default
+
+    The whole part is the number of ordinary edits the index is built for;
+    every extra one multiplies its size several times over.
+    """
+    try:
+        return max(0.0, float(os.getenv('PLATE_FUZZY_MAX_COST', 1.5)))
+    except ValueError:
+        return 1.5
+
+def get_refresh_seconds():
+    """Get how often queries pick up changed vehicles from environment or default"""
+    try:
+        return max(0.0, float(os.getenv('PLATE_INDEX_REFRESH_SECONDS', 5)))
+    except ValueError:
+        return 5.0
+
+def get_rebuild_seconds():
+    """Get how often the index is rebuilt from scratch from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('PLATE_INDEX_REBUILD_SECONDS', 600)))
+    except ValueError:
+        return 600.0
+
+# Configuration
+MAX_COST = get_max_cost()
+REFRESH_SECONDS = get_refresh_seconds()
+REBUILD_SECONDS = get_rebuild_seconds()
+
+def canonicalize(key):
+    """Map every character of a normalized key to its confusion group representative"""
+    return ''.join(CANONICAL.get(char, char) for char in key)
+
+def deletion_variants(key, max_deletes):
+    """Get every string obtained by deleting up to max_deletes characters from key"""
+    variants = {key}
+    level = {key}
+    for _ in range(max_deletes):
+        level = {word[:i] + word[i + 1:] for word in level for i in range(len(word))}
+        variants |= level
+    return variants
+
+def substitution_cost(a, b):
+    """Cost of replacing character a with b"""
+    if a == b:
+        return 0.0
+    if CANONICAL.get(a, a) == CANONICAL.get(b, b):
+        return CONFUSION_COST
+    return EDIT_COST
+
+def plate_distance(a, b):
+    """
+    Weighted edit distance between two normalized plates
+
+    Optimal string alignment distance where substitutions within a confusion
+    group cost CONFUSION_COST and every other insertion, deletion,
+    substitution or adjacent transposition costs EDIT_COST.
+    """
+    previous2 = None
+    previous = [i * EDIT_COST for i in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [i * EDIT_COST] + [0.0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + EDIT_COST,
+                current[j - 1] + EDIT_COST,
+                previous[j - 1] + substitution_cost(a[i - 1], b[j - 1])
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + EDIT_COST)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+class PlateIndex:
+    """
+    Symmetric-deletion index over canonicalized VRNs
+
+    Plates are stored under their canonical form, in which confusable
+    characters are already equal, together with every variant of that form
+    with up to max_edits characters deleted. Two plates within max_edits
+    ordinary edits of each other share at least one variant, so a lookup
+    only scores the few plates found under the query's own variants.
+    """
+
+    PROJECTION = {'vehicle_registration_number': 1, 'is_deleted': 1, 'updated_at': 1}
+
+    def __init__(self, max_edits=int(MAX_COST / EDIT_COST)):
+        self.max_edits = max_edits
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self._clear()
+        self.synced_until = None
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+        self.stale = True
+
+    def _clear(self):
+        self.plates = {}        # vehicle id -> (VRN as stored, normalized, canonical)
+        self.by_canonical = {}  # canonical -> set of vehicle ids
+        self.variants = {}      # deletion variant -> list of canonical forms
+
+    def __len__(self):
+        return len(self.plates)
+
+    def add(self, vehicle_id, vrn):
+        """Index a vehicle's VRN, replacing any earlier entry for the vehicle"""
+        with self.lock:
+            self._remove(vehicle_id)
+            normalized = normalize_key(vrn)
+            if not normalized:
+                return
+            canonical = canonicalize(normalized)
+            self.plates[vehicle_id] = (vrn, normalized, canonical)
+            if canonical not in self.by_canonical:
+                self.by_canonical[canonical] = set()
+                # Lists rather than sets: most variants belong to a single plate, and a
+                # set per variant would dominate the index's memory
+                for variant in deletion_variants(canonical, self.max_edits):
+                    canonicals = self.variants.get(variant)
+                    if canonicals is None:
+                        self.variants[variant] = [canonical]
+                    else:
+                        canonicals.append(canonical)
+            self.by_canonical[canonical].add(vehicle_id)
+
+    def remove(self, vehicle_id):
+        """Drop a vehicle from the index"""
+        with self.lock:
+            self._remove(vehicle_id)
+
+    def _remove(self, vehicle_id):
+        entry = self.plates.pop(vehicle_id, None)
+        if not entry:
+            return
+        canonical = entry[2]
+        ids = self.by_canonical[canonical]
+        ids.discard(vehicle_id)
+        if ids:
+            return
+        del self.by_canonical[canonical]
+        for variant in deletion_variants(canonical, self.max_edits):
+            canonicals = self.variants.get(variant)
+            if canonicals and canonical in canonicals:
+                canonicals.remove(canonical)
+                if not canonicals:
+                    del self.variants[variant]
+
+    def lookup(self, vrn, max_cost=MAX_COST, limit=10):
+        """
+        Find indexed plates within max_cost of a VRN
+
+        Candidates come from at most the index's max_edits ordinary edits, so
+        a max_cost above MAX_COST only admits extra confusions.
+
+        Returns:
+            list: {'id', 'vehicle_registration_number', 'cost'} dicts, cheapest first
+
+        Raises:
+            ValueError: If max_cost is negative, infinite or NaN
+        """
+        if not math.isfinite(max_cost) or max_cost < 0:
+            raise ValueError('max_cost must be a finite number of at least 0')
+        query = normalize_key(vrn)
+        if not query:
+            return []
+        max_edits = min(self.max_edits, int(max_cost / EDIT_COST))
+        canonical_query = canonicalize(query)
+
+        with self.lock:
+            candidates = set()
+            for variant in deletion_variants(canonical_query, max_edits):
+                candidates.update(self.variants.get(variant, ()))
+
+            matches = []
+            for canonical in candidates:
+                if abs(len(canonical) - len(canonical_query)) > max_edits:
+                    continue
+                for vehicle_id in self.by_canonical[canonical]:
+                    stored, normalized, _ = self.plates[vehicle_id]
+                    cost = plate_distance(query, normalized)
+                    if cost <= max_cost + 1e-9:
+                        matches.append({
+                            'id': vehicle_id,
+                            'vehicle_registration_number': stored,
+                            'cost': round(cost, 2)
+                        })
+
+        matches.sort(key=lambda match: (match['cost'], match['vehicle_registration_number']))
+        return matches[:limit]
+
+    def mark_stale(self):
+        """Make the next refresh pick up changes immediately, e.g. after a write"""
+        self.stale = True
+
+    def refresh(self, collection):
+        """
+        Bring the index up to date with the vehicles collection
+
+        Changed vehicles (by updated_at) are applied incrementally at most
+        every REFRESH_SECONDS, or right away after mark_stale. Hard deletes
+        leave nothing to find, so the index is also rebuilt from scratch every
+        REBUILD_SECONDS. A thread that finds another one refreshing carries on
+        with the current contents.
+        """
+        now = time.monotonic()
+        if not self.stale and now - self.refreshed_at < REFRESH_SECONDS:
+            return
+        if not self.refresh_lock.acquire(blocking=not self.rebuilt_at):
+            return
+        try:
+            if not self.rebuilt_at or now - self.rebuilt_at >= REBUILD_SECONDS:
+                self.rebuild(collection)
+                return
+
+            self.stale = False
+            self.refreshed_at = now
+            query = {'updated_at': {'$gte': self.synced_until}} if self.synced_until else {}
+            for vehicle in collection.find(query, self.PROJECTION):
+                self._apply(self, vehicle)
+        finally:
+            self.refresh_lock.release()
+
+    def rebuild(self, collection):
+        """Reload every active vehicle into a fresh index and swap it in"""
+        self.stale = False
+        self.rebuilt_at = self.refreshed_at = time.monotonic()
+        fresh = PlateIndex(self.max_edits)
+        for vehicle in collection.find({'is_deleted': {'$ne': True}}, self.PROJECTION):
+            self._apply(fresh, vehicle)
+        with self.lock:
+            self.plates, self.by_canonical, self.variants = fresh.plates, fresh.by_canonical, fresh.variants
+            self.synced_until = fresh.synced_until
+        print(f"Plate index rebuilt with {len(fresh)} vehicles", flush=True)
+
+    @staticmethod
+    def _apply(index, vehicle):
+        vehicle_id = str(vehicle['_id'])
+        if vehicle.get('is_deleted'):
+            index.remove(vehicle_id)
+        else:
+            index.add(vehicle_id, vehicle.get('vehicle_registration_number', ''))
+        updated_at = vehicle.get('updated_at')
+        # $gte on the newest timestamp seen re-reads a few rows rather than missing
+        # vehicles written in the same millisecond
+        if updated_at and (index.synced_until is None or updated_at > index.synced_until):
+            index.synced_until = updated_at
+
+# Shared index of the vehicles collection
+plate_index = PlateIndex()
@@ -0,0 +1,394 @@
+"""
+Request Statistics Module for Officer Insight API
+Rolls the requests log up into per-minute, hour and day counters with latency percentiles
+"""
+
+import os
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, UpdateOne
+
+# Rollup granularities and the length of one bucket
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+# Latencies are counted in log-scale histogram slots: slot i holds durations in
+# [HISTOGRAM_BASE^i, HISTOGRAM_BASE^(i+1)) ms. Histograms add up exactly, so hour
+# and day percentiles come from merged minute histograms, within about 10%.
+HISTOGRAM_BASE = 1.2
+PERCENTILES = (50, 90, 99)
+
+# Id of the document recording how far requests have been rolled up
+STATE_ID = 'rollup'
+
+# Configurable parameters with environment variable overrides
+def get_stats_enabled():
+    """Get whether the background rollup runs from environment or default"""
+    return os.getenv('REQUEST_STATS_ENABLED', 'true').lower() == 'true'
+
+def get_interval_seconds():
+    """Get how often new requests are rolled up from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('REQUEST_STATS_INTERVAL_SECONDS', 60)))
+    except ValueError:
+        return 60.0
+
+def get_late_seconds():
+    """Get how late a request may be logged and still be counted from environment or default"""
+    try:
+        return max(0.0, float(os.getenv('REQUEST_STATS_LATE_SECONDS', 120)))
+    except ValueError:
+        return 120.0
+
+def get_minute_retention_days():
+    """
+    Get how long minute rollups are kept from environment or default
+
+    Hour rollups are rebuilt from minutes, so at least two days are kept.
+    """
+    try:
+        return max(2.0, float(os.getenv('REQUEST_STATS_MINUTE_RETENTION_DAYS', 7)))
+    except ValueError:
+        return 7.0
+
+def get_hour_retention_days():
+    """Get how long hour rollups are kept from environment or default; day rollups are kept forever"""
+    try:
+        return max(2.0, float(os.getenv('REQUEST_STATS_HOUR_RETENTION_DAYS', 400)))
+    except ValueError:
+        return 400.0
+
+# Configuration
+STATS_ENABLED = get_stats_enabled()
+ROLLUP_INTERVAL_SECONDS = get_interval_seconds()
+LATE_SECONDS = get_late_seconds()
+MINUTE_RETENTION_DAYS = get_minute_retention_days()
+HOUR_RETENTION_DAYS = get_hour_retention_days()
+
+RETENTION = {
+    'minute': timedelta(days=MINUTE_RETENTION_DAYS),
+    'hour': timedelta(days=HOUR_RETENTION_DAYS),
+    'day': None
+}
+
+def to_utc(value):
+    """Naive UTC form of a datetime, as stored by MongoDB; naive values are taken to be UTC already"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def floor_time(value, granularity):
+    """Start of the bucket containing value"""
+    if granularity == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def ceil_time(value, granularity):
+    """Start of the first bucket at or after value"""
+    floored = floor_time(value, granularity)
+    return floored if floored == value else floored + GRANULARITIES[granularity]
+
+def latency_slot(duration_ms):
+    """Histogram slot of a duration"""
+    return int(math.floor(math.log(max(duration_ms, 1.0), HISTOGRAM_BASE)))
+
+def empty_stats():
+    """Counters of one (bucket, endpoint, status) group"""
+    return {'count': 0, 'timed': 0, 'sum_ms': 0.0, 'min_ms': None, 'max_ms': None, 'histogram': {}}
+
+def merge_stats(target, source):
+    """Add the counters of source to target"""
+    target['count'] += source.get('count', 0)
+    target['timed'] += source.get('timed', 0)
+    target['sum_ms'] += source.get('sum_ms') or 0.0
+    for key, pick in (('min_ms', min), ('max_ms', max)):
+        if source.get(key) is not None:
+            target[key] = source[key] if target[key] is None else pick(target[key], source[key])
+    for slot, count in (source.get('histogram') or {}).items():
+        target['histogram'][slot] = target['histogram'].get(slot, 0) + count
+    return target
+
+def percentile(stats, q):
+    """Estimate the q-th latency percentile from a histogram, or None without timed requests"""
+    if not stats['timed']:
+        return None
+    rank = stats['timed'] * q / 100.0
+    seen = 0
+    for slot in sorted(stats['histogram'], key=int):
+        seen += stats['histogram'][slot]
+        if seen >= rank:
+            # Geometric middle of the slot, kept within the observed range
+            estimate = HISTOGRAM_BASE ** (int(slot) + 0.5)
+            return round(min(max(estimate, stats['min_ms']), stats['max_ms']), 1)
+    return stats['max_ms']
+
+def latency_summary(stats):
+    """Latency figures of merged counters"""
+    summary = {f'p{q}_ms': percentile(stats, q) for q in PERCENTILES}
+    summary['avg_ms'] = round(stats['sum_ms'] / stats['timed'], 1) if stats['timed'] else None
+    summary['min_ms'] = round(stats['min_ms'], 1) if stats['min_ms'] is not None else None
+    summary['max_ms'] = round(stats['max_ms'], 1) if stats['max_ms'] is not None else None
+    return summary
+
+def aggregate_requests(db, ranges, extra_filter=None, by_minute=False):
+    """
+    Count raw requests in one aggregation
+
+    Groups by endpoint, status and latency slot (and minute if by_minute),
+    so the result folds into the same counters as the rollups.
+
+    Args:
+        ranges: list of (start, end) created_at ranges, end exclusive
+
+    Returns:
+        dict: {(minute or None, endpoint, status): counters}
+    """
+    if not ranges:
+        return {}
+    match = {'$or': [{'created_at': {'$gte': start, '$lt': end}} for start, end in ranges]}
+    if extra_filter:
+        match = {'$and': [match, extra_filter]}
+
+    group_id = {
+        'endpoint': {'$ifNull': ['$endpoint', 'unknown']},
+        'status': {'$ifNull': ['$status', 'unknown']},
+        'slot': {'$cond': [
+            {'$gt': ['$duration_ms', 0]},
+            {'$floor': {'$divide': [{'$ln': {'$max': ['$duration_ms', 1]}}, math.log(HISTOGRAM_BASE)]}},
+            None
+        ]}
+    }
+    if by_minute:
+        # $dateToString rather than $dateTrunc keeps this working on MongoDB before 5.0
+        group_id['minute'] = {'$dateToString': {'format': '%Y-%m-%dT%H:%M', 'date': '$created_at'}}
+
+    groups = {}
+    for row in db.requests.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': group_id,
+            'count': {'$sum': 1},
+            'sum_ms': {'$sum': '$duration_ms'},
+            'min_ms': {'$min': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'}
+        }}
+    ], allowDiskUse=True):
+        key = row['_id']
+        minute = datetime.strptime(key['minute'], '%Y-%m-%dT%H:%M') if by_minute else None
+        stats = groups.setdefault((minute, key['endpoint'], key['status']), empty_stats())
+        slot = key.get('slot')
+        timed = row['count'] if slot is not None else 0
+        merge_stats(stats, {
+            'count': row['count'],
+            'timed': timed,
+            'sum_ms': row['sum_ms'] if timed else 0.0,
+            'min_ms': row['min_ms'] if timed else None,
+            'max_ms': row['max_ms'] if timed else None,
+            'histogram': {str(int(slot)): timed} if timed else {}
+        })
+    return groups
+
+def write_rollups(db, granularity, groups, now):
+    """Replace the rollup documents of the given groups"""
+    operations = []
+    for (bucket, endpoint, status), stats in groups.items():
+        doc = {**stats, 'updated_at': now}
+        if RETENTION[granularity]:
+            doc['expires_at'] = bucket + RETENTION[granularity]
+        operations.append(UpdateOne(
+            {'granularity': granularity, 'bucket': bucket, 'endpoint': endpoint, 'status': status},
+            {'$set': doc},
+            upsert=True
+        ))
+    if operations:
+        db.request_stats.bulk_write(operations, ordered=False)
+
+def merge_rollups(db, source, target, start, end, now):
+    """Rebuild the target rollups overlapping [start, end) from the source rollups"""
+    start, end = floor_time(start, target), ceil_time(end, target)
+    groups = {}
+    for doc in db.request_stats.find({'granularity': source, 'bucket': {'$gte': start, '$lt': end}}):
+        key = (floor_time(doc['bucket'], target), doc['endpoint'], doc['status'])
+        merge_stats(groups.setdefault(key, empty_stats()), doc)
+    write_rollups(db, target, groups, now)
+
+def run_rollup(db, now=None):
+    """
+    Roll up requests logged since the last run
+
+    The minutes of the last LATE_SECONDS are recomputed from scratch each
+    run, so requests logged late are counted and reruns are harmless. A
+    first run over a long history works through it one day at a time.
+
+    Returns:
+        datetime: End of the rolled-up period
+    """
+    now = now or datetime.utcnow()
+    end = floor_time(now, 'minute')
+    state = db.request_stats.find_one({'_id': STATE_ID})
+    if state:
+        start = floor_time(state['covered_until'] - timedelta(seconds=LATE_SECONDS), 'minute')
+    else:
+        oldest = db.requests.find_one({'created_at': {'$ne': None}}, {'created_at': 1}, sort=[('created_at', ASCENDING)])
+        start = floor_time(oldest['created_at'], 'minute') if oldest else end
+
+    while start < end:
+        slice_end = min(end, start + GRANULARITIES['day'])
+        groups = aggregate_requests(db, [(start, slice_end)], by_minute=True)
+        write_rollups(db, 'minute', groups, now)
+        merge_rollups(db, 'minute', 'hour', start, slice_end, now)
+        merge_rollups(db, 'hour', 'day', start, slice_end, now)
+        start = slice_end
+
+    db.request_stats.update_one({'_id': STATE_ID}, {'$set': {'covered_until': end, 'updated_at': now}}, upsert=True)
+    return end
+
+def get_covered_until(db):
+    """End of the period the rollups cover, or None before the first run"""
+    state = db.request_stats.find_one({'_id': STATE_ID})
+    return state['covered_until'] if state else None
+
+def split_range(start, end):
+    """
+    Cover [start, end) with as few whole rollup buckets as possible
+
+    Both ends must be minute-aligned. Climbs from minutes to hours to days
+    and back down, so a months-long range needs only a few dozen buckets.
+
+    Returns:
+        list: (granularity, start, end) segments
+    """
+    segments = []
+    for granularity, unit in (('minute', 'hour'), ('hour', 'day')):
+        boundary = min(ceil_time(start, unit), end)
+        if start < boundary:
+            segments.append((granularity, start, boundary))
+            start = boundary
+    for granularity in ('day', 'hour', 'minute'):
+        boundary = floor_time(end, granularity)
+        if start < boundary:
+            segments.append((granularity, start, boundary))
+            start = boundary
+    return segments
+
+def join_ranges(ranges):
+    """Sort (start, end) ranges and merge the ones that touch, dropping empty ones"""
+    joined = []
+    for start, end in sorted(r for r in ranges if r[0] < r[1]):
+        if joined and start <= joined[-1][1]:
+            joined[-1] = (joined[-1][0], max(joined[-1][1], end))
+        else:
+            joined.append((start, end))
+    return joined
+
+def collect_stats(db, start=None, end=None, endpoint=None, use_rollups=True, now=None):
+    """
+    Counters per (endpoint, status) for requests created in [start, end)
+
+    Whole minutes up to the last rollup are read from request_stats; the
+    partial minutes at either end and anything newer come from the requests
+    log in a single aggregation. So do minute and hour segments old enough
+    for their rollups to have expired (see RETENTION), which split_range
+    produces for an old start that is not on a day boundary.
+
+    Returns:
+        tuple: ({(endpoint, status): counters}, whether rollups were used)
+    """
+    now = now or datetime.utcnow()
+    start, end = to_utc(start), to_utc(end)
+    end = min(end or now, now)
+    covered = get_covered_until(db) if use_rollups else None
+    if start is None:
+        oldest = db.requests.find_one({'created_at': {'$ne': None}}, {'created_at': 1}, sort=[('created_at', ASCENDING)])
+        start = oldest['created_at'] if oldest else end
+    if start >= end:
+        return {}, False
+
+    raw_ranges = [(start, end)]
+    segments = []
+    if covered:
+        rolled_start = ceil_time(start, 'minute')
+        rolled_end = min(floor_time(end, 'minute'), covered)
+        if rolled_start < rolled_end:
+            raw_ranges = [(start, rolled_start), (rolled_end, end)]
+            for granularity, segment_start, segment_end in split_range(rolled_start, rolled_end):
+                retention = RETENTION[granularity]
+                # A bucket is removed once bucket + retention has passed
+                if retention and segment_start <= now - retention:
+                    raw_ranges.append((segment_start, segment_end))
+                else:
+                    segments.append((granularity, segment_start, segment_end))
+            raw_ranges = join_ranges(raw_ranges)
+
+    extra_filter = {'endpoint': endpoint} if endpoint else None
+    totals = {}
+    for (_, group_endpoint, status), stats in aggregate_requests(db, raw_ranges, extra_filter).items():
+        merge_stats(totals.setdefault((group_endpoint, status), empty_stats()), stats)
+
+    if segments:
+        query = {'$or': [
+            {'granularity': granularity, 'bucket': {'$gte': segment_start, '$lt': segment_end}}
+            for granularity, segment_start, segment_end in segments
+        ]}
+        if endpoint:
+            query = {'$and': [query, {'endpoint': endpoint}]}
+        for doc in db.request_stats.find(query):
+            merge_stats(totals.setdefault((doc['endpoint'], doc['status']), empty_stats()), doc)
+
+    return totals, bool(segments)
+
+def get_series(db, granularity, start, end, endpoint=None):
+    """
+    Time series of a rollup granularity
+
+    Returns:
+        list: One point per bucket with requests, oldest first
+    """
+    start, end = to_utc(start), to_utc(end)
+    query = {'granularity': granularity, 'bucket': {'$gte': floor_time(start, granularity), '$lt': end}}
+    if endpoint:
+        query['endpoint'] = endpoint
+
+    buckets = {}
+    for doc in db.request_stats.find(query).sort('bucket', ASCENDING):
+        point = buckets.setdefault(doc['bucket'], {'all': empty_stats(), 'success': 0, 'error': 0})
+        merge_stats(point['all'], doc)
+        if doc['status'] in ('success', 'error'):
+            point[doc['status']] += doc['count']
+
+    return [
+        {
+            'bucket': bucket.isoformat(),
+            'total': point['all']['count'],
+            'success': point['success'],
+            'error': point['error'],
+            **latency_summary(point['all'])
+        }
+        for bucket, point in buckets.items()
+    ]
+
+def start_rollup_worker(get_db):
+    """
+    Run run_rollup every ROLLUP_INTERVAL_SECONDS in a daemon thread
+
+    Args:
+        get_db: Callable returning the database, called on every run
+    """
+    def loop():
+        while True:
+            try:
+                run_rollup(get_db())
+            except Exception as e:
+                print(f"Error rolling up request stats: {e}", flush=True)
+            time.sleep(ROLLUP_INTERVAL_SECONDS)
+
+    thread = threading.Thread(target=loop, name='request-stats-rollup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,151 @@
+"""
+Search Index Module for Officer Insight API
+Normalized keys and n-gram tokens maintained at write time for indexed vehicle and person search
+"""
+
+import re
+from pymongo import UpdateOne
+
+# Bump whenever the stored search document changes so existing records are rebuilt
+SEARCH_VERSION = 1
+
+# Length of the substring tokens; shorter search terms fall back to prefix lookups
+GRAM_SIZE = 3
+
+# Search key -> source field, per collection. The keys double as the search
+# query parameter names.
+SEARCH_FIELDS = {
+    'vehicles': {
+        'vrn': 'vehicle_registration_number',
+        'vehicle_make': 'vehicle_make',
+        'vehicle_color': 'vehicle_color'
+    },
+    'persons': {
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'name': 'name'
+    }
+}
+
+# Rank of a single field match
+SCORE_EXACT = 3
+SCORE_PREFIX = 2
+SCORE_SUBSTRING = 1
+
+def normalize_key(value):
+    """Uppercase a value and drop whitespace and punctuation ('ab12 cde' -> 'AB12CDE')"""
+    return ''.join(char for char in str(value or '').upper() if char.isalnum())
+
+def ngrams(key, size=GRAM_SIZE):
+    """Get the distinct substrings of length size in a normalized key"""
+    return {key[i:i + size] for i in range(len(key) - size + 1)}
+
+def build_search_doc(collection_name, doc):
+    """
+    Build the 'search' sub-document stored on a vehicle or person
+
+    Holds the normalized key of every searchable field and the n-grams of
+    those keys, each prefixed with its field so a token only matches the
+    field it came from.
+    """
+    search = {'v': SEARCH_VERSION}
+    grams = set()
+    for key, field in SEARCH_FIELDS[collection_name].items():
+        normalized = normalize_key(doc.get(field))
+        search[key] = normalized
+        grams.update(f"{key}:{gram}" for gram in ngrams(normalized))
+    search['grams'] = sorted(grams)
+    return search
+
+def normalize_terms(collection_name, args):
+    """Get {search key: normalized term} for the search keys present in args"""
+    terms = {}
+    for key in SEARCH_FIELDS[collection_name]:
+        term = normalize_key(args.get(key, ''))
+        if term:
+            terms[key] = term
+    return terms
+
+def term_condition(key, term):
+    """
+    Indexed condition matching records whose key contains the term
+
+    Terms of at least GRAM_SIZE characters are looked up through their
+    n-grams; the regex that follows only re-checks the candidates they return.
+    Shorter terms match as a prefix, which MongoDB answers with an index
+    range scan.
+    """
+    if len(term) < GRAM_SIZE:
+        return {f'search.{key}': {'$regex': f'^{re.escape(term)}'}}
+    return {
+        'search.grams': {'$all': sorted(f"{key}:{gram}" for gram in ngrams(term))},
+        f'search.{key}': {'$regex': re.escape(term)}
+    }
+
+def score_expression(terms):
+    """Aggregation expression ranking exact over prefix over substring matches, summed across fields"""
+    scores = []
+    for key, term in terms.items():
+        value = {'$ifNull': [f'$search.{key}', '']}
+        scores.append({'$switch': {
+            'branches': [
+                {'case': {'$eq': [value, term]}, 'then': SCORE_EXACT},
+                {'case': {'$regexMatch': {'input': value, 'regex': f'^{re.escape(term)}'}}, 'then': SCORE_PREFIX},
+                {'case': {'$regexMatch': {'input': value, 'regex': re.escape(term)}}, 'then': SCORE_SUBSTRING}
+            ],
+            'default': 0
+        }})
+    return {'$add': scores}
+
+def match_query(terms, base_query=None):
+    """Filter of the records matching any of the terms, and base_query if given"""
+    match = {'$or': [term_condition(key, term) for key, term in terms.items()]}
+    if base_query:
+        match = {'$and': [base_query, match]}
+    return match
+
+def search(collection, collection_name, terms, base_query, page, per_page):
+    """
+    Find records matching any of the terms, best matches first
+
+    Args:
+        collection: MongoDB collection to search
+        collection_name: Key of SEARCH_FIELDS describing the collection
+        terms: {search key: normalized term} from normalize_terms
+        base_query: Extra filter every result must match (e.g. not deleted)
+
+    Returns:
+        tuple: (records with a 'search_score' field, total matches)
+    """
+    match = match_query(terms, base_query)
+    total = collection.count_documents(match)
+    records = list(collection.aggregate([
+        {'$match': match},
+        {'$addFields': {'search_score': score_expression(terms)}},
+        {'$sort': {'search_score': -1, 'created_at': -1, '_id': -1}},
+        {'$skip': (page - 1) * per_page},
+        {'$limit': per_page},
+        {'$project': {'search': 0}}
+    ], allowDiskUse=True))
+    return records, total
+
+def backfill_search_docs(db, batch_size=1000):
+    """
+    Build the search sub-document of records written before it existed or by an older SEARCH_VERSION
+
+    Returns:
+        int: Number of records updated
+    """
+    updated = 0
+    for collection_name, fields in SEARCH_FIELDS.items():
+        collection = db[collection_name]
+        projection = {field: 1 for field in fields.values()}
+        operations = []
+        for doc in collection.find({'search.v': {'$ne': SEARCH_VERSION}}, projection).batch_size(batch_size):
+            operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {'search': build_search_doc(collection_name, doc)}}))
+            if len(operations) >= batch_size:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
@@ -0,0 +1,49 @@
+import pytest
+from plate_matcher import PlateIndex, plate_distance, canonicalize
+
+@pytest.fixture
+def index():
+    """Create an index with a few plates"""
+    index = PlateIndex(max_edits=2)
+    index.add('1', 'AB12 CDE')
+    index.add('2', 'XY19 BOB')
+    index.add('3', 'AB12 CDF')
+    return index
+
+def test_confusions_are_cheaper_than_edits():
+    """Test that O/0, I/1 and B/8 substitutions cost less than other edits"""
+    assert plate_distance('AB12CDE', 'AB12CDE') == 0
+    assert plate_distance('A812CDE', 'AB12CDE') == pytest.approx(0.2)
+    assert plate_distance('ABI2CDE', 'AB12CDE') == pytest.approx(0.2)
+    assert plate_distance('AB12CDX', 'AB12CDE') == 1
+    assert plate_distance('AB21CDE', 'AB12CDE') == 1
+    assert canonicalize('X0B8') == canonicalize('XOBB')
+
+def test_lookup_ranks_by_cost(index):
+    """Test that a noisy reading finds the closest plate first, ignoring spaces"""
+    candidates = index.lookup('a812cde', max_cost=2)
+    assert [c['id'] for c in candidates] == ['1', '3']
+    assert candidates[0]['cost'] == pytest.approx(0.2)
+    assert candidates[0]['vehicle_registration_number'] == 'AB12 CDE'
+    assert candidates[1]['cost'] == pytest.approx(1.2)
+
+def test_lookup_respects_max_cost(index):
+    """Test that candidates above max_cost are left out"""
+    assert [c['id'] for c in index.lookup('XYI9B0B', max_cost=0.5)] == ['2']
+    assert index.lookup('ZZ99ZZZ', max_cost=2) == []
+
+def test_update_and_remove(index):
+    """Test that re-adding replaces a plate and removing drops it"""
+    index.add('1', 'QQ11 QQQ')
+    assert '1' not in [c['id'] for c in index.lookup('AB12CDE', max_cost=0)]
+    index.remove('3')
+    index.remove('missing')
+    assert index.lookup('AB12CDF', max_cost=0) == []
+    assert len(index) == 2
+
+@pytest.mark.parametrize('max_cost', [float('inf'), float('nan'), -1])
+def test_lookup_rejects_unusable_max_cost(index, max_cost):
+    """Test that infinite, NaN and negative costs are refused rather than crashing the lookup"""
+    with pytest.raises(ValueError):
+        index.lookup('AB12CDE', max_cost=max_cost)
+    assert [c['id'] for c in index.lookup('AB12CDE', max_cost=0)] == ['1']
@@ -0,0 +1,32 @@
+from regex_extractor import RULES, RegexExtractor, extract
+
+PARAMETERS = [{'name': name, 'active': True} for name in RULES]
+
+def test_extracts_every_active_parameter_in_order():
+    """Test the fields of a sample report, including the substring matches the fallback always made"""
+    text = ("Add Traffic Offence Report. Driver name is James Smith, male, DOB 12/02/2000. "
+            "Vehicle Registration OU18ZFB a blue BMW 420. Offence is No Seat Belt at Oxford Road, Cheltenham.")
+    assert extract(text, PARAMETERS) == {
+        'person_name': 'Add Traffic',
+        'vehicle_number': 'ADD',
+        'vehicle_color': 'Blue',
+        'vehicle_make': 'Ford',   # from 'Oxford', listed before 'bmw'
+        'vehicle_model': '420',
+        'car_color': 'Blue',
+        'car_model': 'Ford',
+        'location': 'ion ou18zfb a blue bmw 420',   # 'at' in 'Registration'
+        'event_crime_violation': None
+    }
+
+def test_patterns_only_match_at_word_starts():
+    """Test that names and models inside longer words are skipped, as a leading \\b did"""
+    result = extract("xJohn Smith saw a xford focus, then Audi a4 near the bank", PARAMETERS)
+    assert result['person_name'] is None
+    assert result['vehicle_model'] == 'A4'
+    assert result['location'] == 'the bank'
+
+def test_inactive_and_unknown_parameters():
+    """Test that inactive parameters are left out and unknown ones extract None"""
+    parameters = [{'name': 'vehicle_color', 'active': False}, {'name': 'weapon', 'active': True}]
+    assert extract("red car with a knife", parameters) == {'weapon': None}
+    assert RegexExtractor([]).extract("red car") == {}
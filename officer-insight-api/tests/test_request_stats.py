@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import request_stats
+from request_stats import collect_stats, empty_stats, latency_slot, merge_stats, percentile, split_range
+
+class FakeCollection:
+    """Records the queries made against it and returns canned results"""
+
+    def __init__(self, find_one=None):
+        self.find_one_result = find_one
+        self.pipelines = []
+        self.queries = []
+
+    def find_one(self, *args, **kwargs):
+        return self.find_one_result
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return []
+
+    def find(self, query):
+        self.queries.append(query)
+        return []
+
+class FakeDb:
+    def __init__(self, covered_until=None):
+        self.requests = FakeCollection()
+        self.request_stats = FakeCollection({'covered_until': covered_until} if covered_until else None)
+
+def matches(doc, query):
+    """Whether a document matches the subset of MongoDB queries request_stats uses"""
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for operator, operand in condition.items():
+                if operator == '$gte' and not (value is not None and value >= operand):
+                    return False
+                if operator == '$lt' and not (value is not None and value < operand):
+                    return False
+                if operator == '$ne' and value == operand:
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+class MemoryCollection:
+    """List-backed collection with the operations the rollup needs"""
+
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    def find(self, query):
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    def find_one(self, query, projection=None, sort=None):
+        found = self.find(query)
+        if sort:
+            field, direction = sort[0]
+            found.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return found[0] if found else None
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.find_one(query)
+        if doc is None:
+            doc = dict(query)
+            self.docs.append(doc)
+        doc.update(update['$set'])
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.update_one(operation._filter, operation._doc, upsert=True)
+
+def raw_groups(requests, ranges, extra_filter=None, by_minute=False):
+    """What aggregate_requests computes, done in Python over a list of requests"""
+    groups = {}
+    for doc in requests:
+        if not any(start <= doc['created_at'] < end for start, end in ranges):
+            continue
+        if extra_filter and not matches(doc, extra_filter):
+            continue
+        minute = doc['created_at'].replace(second=0, microsecond=0) if by_minute else None
+        duration = doc['duration_ms']
+        merge_stats(groups.setdefault((minute, doc['endpoint'], doc['status']), empty_stats()), {
+            'count': 1, 'timed': 1, 'sum_ms': duration, 'min_ms': duration, 'max_ms': duration,
+            'histogram': {str(latency_slot(duration)): 1}
+        })
+    return groups
+
+def timed_stats(*durations):
+    """Counters of requests with the given durations in ms"""
+    stats = empty_stats()
+    for duration in durations:
+        merge_stats(stats, {'count': 1, 'timed': 1, 'sum_ms': duration, 'min_ms': duration, 'max_ms': duration,
+                            'histogram': {str(latency_slot(duration)): 1}})
+    return stats
+
+def test_split_range_uses_the_largest_buckets():
+    """Test that a range climbs minutes to hours to days and back down without gaps"""
+    start = datetime(2025, 1, 1, 22, 30)
+    end = datetime(2025, 1, 4, 1, 15)
+    segments = split_range(start, end)
+
+    assert segments == [
+        ('minute', start, datetime(2025, 1, 1, 23)),
+        ('hour', datetime(2025, 1, 1, 23), datetime(2025, 1, 2)),
+        ('day', datetime(2025, 1, 2), datetime(2025, 1, 4)),
+        ('hour', datetime(2025, 1, 4), datetime(2025, 1, 4, 1)),
+        ('minute', datetime(2025, 1, 4, 1), end)
+    ]
+    assert split_range(start, start + timedelta(minutes=5)) == [('minute', start, start + timedelta(minutes=5))]
+
+def test_merged_percentiles_stay_within_the_histogram_error():
+    """Test that merged counters add up and percentiles land near the true values"""
+    merged = merge_stats(timed_stats(*range(1, 501)), timed_stats(*range(501, 1001)))
+
+    assert merged['count'] == merged['timed'] == 1000
+    assert (merged['min_ms'], merged['max_ms']) == (1, 1000)
+    for q, expected in ((50, 500), (90, 900), (99, 990)):
+        assert percentile(merged, q) == pytest.approx(expected, rel=0.1)
+    assert percentile(empty_stats(), 50) is None
+
+def test_collect_stats_reads_edges_raw_and_whole_minutes_from_rollups():
+    """Test that only the partial minutes and the unrolled tail are aggregated from requests"""
+    db = FakeDb(covered_until=datetime(2025, 1, 1, 12))
+    start = datetime(2025, 1, 1, 10, 0, 30)
+    end = datetime(2025, 1, 1, 12, 30)
+    _, from_rollups = collect_stats(db, start, end, now=end)
+
+    assert from_rollups
+    ranges = [clause['created_at'] for clause in db.requests.pipelines[0][0]['$match']['$or']]
+    assert ranges == [
+        {'$gte': start, '$lt': datetime(2025, 1, 1, 10, 1)},
+        {'$gte': datetime(2025, 1, 1, 12), '$lt': end}
+    ]
+    segments = [(clause['granularity'], clause['bucket']['$gte']) for clause in db.request_stats.queries[0]['$or']]
+    assert segments == [('minute', datetime(2025, 1, 1, 10, 1)), ('hour', datetime(2025, 1, 1, 11))]
+
+def test_collect_stats_accepts_dates_with_an_offset():
+    """Test that timezone-aware dates are compared as naive UTC"""
+    db = FakeDb(covered_until=datetime(2025, 1, 1, 12))
+    start = datetime(2025, 1, 1, 11, 0, tzinfo=timezone(timedelta(hours=1)))
+    _, from_rollups = collect_stats(db, start, datetime(2025, 1, 1, 12, tzinfo=timezone.utc), now=datetime(2025, 1, 1, 12))
+
+    assert from_rollups
+    assert db.request_stats.queries[0]['$or'] == [
+        {'granularity': 'hour', 'bucket': {'$gte': datetime(2025, 1, 1, 10), '$lt': datetime(2025, 1, 1, 12)}}
+    ]
+    assert request_stats.to_utc(datetime(2025, 1, 1)) == datetime(2025, 1, 1)
+
+def test_collect_stats_survives_expired_rollups(monkeypatch):
+    """Test that totals match the requests log after old minute and hour rollups expire"""
+    now = datetime(2025, 6, 1, 12, 0)
+    # Unaligned old starts: one past the minute retention, one past the hour retention
+    times = [now - timedelta(days=410, hours=6, minutes=23), now - timedelta(days=8, hours=3, minutes=11)]
+    times += [now - timedelta(days=9) + timedelta(minutes=37 * i) for i in range(400)]
+    requests = [{'created_at': created_at, 'endpoint': ('/api/parse-message', '/api/login')[i % 2],
+                 'status': ('success', 'error')[i % 3 == 0], 'duration_ms': 5.0 + i}
+                for i, created_at in enumerate(times)]
+
+    db = FakeDb()
+    db.requests = MemoryCollection(requests)
+    db.request_stats = MemoryCollection()
+    monkeypatch.setattr(request_stats, 'aggregate_requests',
+                        lambda db_, ranges, extra_filter=None, by_minute=False: raw_groups(requests, ranges, extra_filter, by_minute))
+    request_stats.run_rollup(db, now=now)
+    # What the TTL index would have removed by now
+    db.request_stats.docs = [doc for doc in db.request_stats.docs if doc.get('expires_at') is None or doc['expires_at'] > now]
+
+    for start in (None, times[1] - timedelta(minutes=6)):
+        totals, from_rollups = collect_stats(db, start, now, now=now)
+        expected = {}
+        for (_, endpoint, status), stats in raw_groups(requests, [(start or times[0], now)]).items():
+            merge_stats(expected.setdefault((endpoint, status), empty_stats()), stats)
+
+        assert from_rollups
+        assert {key: (stats['count'], stats['histogram']) for key, stats in totals.items()} == \
+            {key: (stats['count'], stats['histogram']) for key, stats in expected.items()}
@@ -3,11 +3,21 @@ Vehicle API Module for Officer Insight API
 Handles vehicle CRUD operations, search, and management
 """
 
+import math
+import time
 from datetime import datetime
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
+from pagination import paginate, InvalidPagination
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from images import embed_image_objects, find_image_objects
+from bulk import InvalidBulkBody, execute, resolve_photos, row_error, run_bulk
+from export import InvalidExport, export_response
+from search_index import SEARCH_FIELDS, build_search_doc, match_query, normalize_key, normalize_terms, search
+from plate_matcher import MAX_COST, plate_index
 
 # Create namespace
 vehicle_ns = Namespace('vehicles', description='Vehicle management operations')
@@ -39,6 +49,12 @@ vehicle_response_model = vehicle_ns.model('VehicleResponse', {
     'updated_at': fields.DateTime(description='Updated timestamp')
 })
 
+# Fields a client may set, besides vehicle_photos
+VEHICLE_FIELDS = [field for field in vehicle_model if field != 'vehicle_photos']
+
+# Columns of a CSV export
+EXPORT_COLUMNS = list(vehicle_response_model) + ['created_by', 'external_id']
+
 def get_mongo_db():
     """Get MongoDB database instance"""
     from app import mongo
@@ -86,6 +102,74 @@ def validate_vehicle_data(data):
     
     return errors
 
+def write_vehicle_batch(db, rows, user_id):
+    """
+    Validate a batch of bulk vehicle rows and upsert them by VRN
+
+    Existing active vehicles and photos are fetched with one query each for
+    the whole batch. Only the fields present in a row are updated.
+
+    Returns:
+        list: Per-row results
+    """
+    results = []
+    accepted = {}
+    for index, row in rows:
+        errors = validate_vehicle_data(row)
+        if not errors and not isinstance(row.get('vehicle_photos', []), list):
+            errors = ['vehicle_photos must be a list of image IDs']
+        if errors:
+            results.append(row_error(index, errors))
+            continue
+        vrn = str(row['vehicle_registration_number']).upper()
+        if vrn in accepted:
+            results.append(row_error(index, [f'duplicate vehicle_registration_number (row {accepted[vrn][0]})']))
+            continue
+        accepted[vrn] = (index, row)
+    
+    if not accepted:
+        return results
+    
+    projection = {field: 1 for field in SEARCH_FIELDS['vehicles'].values()}
+    existing = {
+        vehicle['vehicle_registration_number']: vehicle
+        for vehicle in db.vehicles.find({'vehicle_registration_number': {'$in': list(accepted)}, 'is_deleted': False}, projection)
+    }
+    images = find_image_objects(db, [photo for _, row in accepted.values() for photo in row.get('vehicle_photos') or []])
+    
+    now = datetime.utcnow()
+    planned = []
+    for vrn, (index, row) in accepted.items():
+        values = {field: row[field] for field in VEHICLE_FIELDS if field in row}
+        values['vehicle_registration_number'] = vrn
+        if 'external_id' in row:
+            values['external_id'] = row['external_id']
+        result = {}
+        if 'vehicle_photos' in row:
+            values['vehicle_photos'], missing = resolve_photos(row['vehicle_photos'] or [], images)
+            if missing:
+                result['missing_photos'] = missing
+        
+        defaults = {field: '' for field in VEHICLE_FIELDS if field not in values}
+        if 'vehicle_photos' not in values:
+            defaults['vehicle_photos'] = []
+        current = existing.get(vrn)
+        values['search'] = build_search_doc('vehicles', {**(current or defaults), **values})
+        values['updated_at'] = now
+        
+        planned.append({
+            'index': index,
+            'id': current['_id'] if current else None,
+            'result': result,
+            'operation': UpdateOne(
+                {'vehicle_registration_number': vrn, 'is_deleted': False},
+                {'$set': values, '$setOnInsert': {**defaults, 'created_by': user_id, 'created_at': now}},
+                upsert=True
+            )
+        })
+    
+    return results + execute(db.vehicles, planned)
+
 @vehicle_ns.route('/create')
 class VehicleCreate(Resource):
     @jwt_required()
@@ -100,10 +184,11 @@ class VehicleCreate(Resource):
             if errors:
                 return {'message': 'Validation errors', 'errors': errors}, 400
             
-            # Check if VRN already exists
+            # Check if VRN already exists; VRNs are stored upper case
+            vrn = data['vehicle_registration_number'].upper()
             db = get_mongo_db()
             existing_vehicle = db.vehicles.find_one({
-                'vehicle_registration_number': data['vehicle_registration_number'],
+                'vehicle_registration_number': vrn,
                 'is_deleted': {'$ne': True}
             })
             
@@ -120,7 +205,7 @@ class VehicleCreate(Resource):
             
             vehicle_doc = {
                 'name': data.get('name', ''),
-                'vehicle_registration_number': data['vehicle_registration_number'].upper(),
+                'vehicle_registration_number': vrn,
                 'model': data.get('model', ''),
                 'vehicle_make': data.get('vehicle_make', ''),
                 'vehicle_model': data.get('vehicle_model', ''),
@@ -133,9 +218,12 @@ class VehicleCreate(Resource):
                 'updated_at': datetime.utcnow()
             }
             
+            vehicle_doc['search'] = build_search_doc('vehicles', vehicle_doc)
             result = db.vehicles.insert_one(vehicle_doc)
+            plate_index.mark_stale()
             
             # Return created vehicle
+            del vehicle_doc['search']
             vehicle_doc['_id'] = result.inserted_id
             vehicle_doc['id'] = str(result.inserted_id)
             
@@ -144,10 +232,39 @@ class VehicleCreate(Resource):
                 'vehicle': serialize_mongo_doc(vehicle_doc)
             }, 201
             
+        except DuplicateKeyError:
+            # Another active vehicle took the VRN between the check and the write
+            return {'message': 'Vehicle with this registration number already exists'}, 400
         except Exception as e:
             print(f"Error creating vehicle: {e}")
             return {'message': 'Internal server error'}, 500
 
+@vehicle_ns.route('/bulk')
+class VehicleBulk(Resource):
+    @jwt_required()
+    def post(self):
+        """Create or update vehicles, matched by VRN, from a JSON array or NDJSON body"""
+        try:
+            db = get_mongo_db()
+            current_user_id = get_jwt_identity()
+            
+            try:
+                bulk = run_bulk(request, lambda rows: write_vehicle_batch(db, rows, current_user_id))
+            except InvalidBulkBody as e:
+                return {'message': str(e)}, 400
+            plate_index.mark_stale()
+            
+            summary = bulk['summary']
+            return {
+                'message': f"Processed {summary['total']} vehicles: {summary['created']} created, "
+                           f"{summary['updated']} updated, {summary['failed']} failed",
+                **bulk
+            }, 200
+            
+        except Exception as e:
+            print(f"Error bulk writing vehicles: {e}")
+            return {'message': 'Internal server error'}, 500
+
 @vehicle_ns.route('/list')
 class VehicleList(Resource):
     @jwt_required()
@@ -155,8 +272,6 @@ class VehicleList(Resource):
         """Get list of vehicles with pagination"""
         try:
             # Get query parameters
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
             include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
             
             # Build query
@@ -166,14 +281,11 @@ class VehicleList(Resource):
             
             db = get_mongo_db()
             
-            # Get total count
-            total = db.vehicles.count_documents(query)
-            
-            # Get paginated results
-            vehicles = list(db.vehicles.find(query)
-                           .sort('created_at', -1)
-                           .skip((page - 1) * per_page)
-                           .limit(per_page))
+            # Get paginated results (offset or keyset, see pagination.py)
+            try:
+                vehicles, pagination = paginate(db.vehicles, query, 'created_at', request.args, projection={'search': 0})
+            except InvalidPagination as e:
+                return {'message': str(e)}, 400
             
             # Serialize results
             serialized_vehicles = []
@@ -184,18 +296,39 @@ class VehicleList(Resource):
             
             return {
                 'vehicles': serialized_vehicles,
-                'pagination': {
-                    'total': total,
-                    'page': page,
-                    'per_page': per_page,
-                    'pages': (total + per_page - 1) // per_page
-                }
+                'pagination': pagination
             }, 200
             
         except Exception as e:
             print(f"Error getting vehicle list: {e}")
             return {'message': 'Internal server error'}, 500
 
+@vehicle_ns.route('/export')
+class VehicleExport(Resource):
+    @jwt_required()
+    def get(self):
+        """Stream all vehicles as NDJSON or CSV (?format=, ?gzip=true), filtered like /list and /search"""
+        try:
+            include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
+            
+            query = {}
+            if not include_deleted:
+                query['is_deleted'] = {'$ne': True}
+            
+            # Same search parameters and matching as /search, without the ranking
+            terms = normalize_terms('vehicles', request.args)
+            if terms:
+                query = match_query(terms, query)
+            
+            db = get_mongo_db()
+            return export_response(db.vehicles, query, request.args, 'vehicles', EXPORT_COLUMNS, projection={'search': 0})
+            
+        except InvalidExport as e:
+            return {'message': str(e)}, 400
+        except Exception as e:
+            print(f"Error exporting vehicles: {e}")
+            return {'message': 'Internal server error'}, 500
+
 @vehicle_ns.route('/search')
 class VehicleSearch(Resource):
     @jwt_required()
@@ -210,44 +343,19 @@ class VehicleSearch(Resource):
             per_page = int(request.args.get('per_page', 10))
             include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
             
-            if not vrn and not vehicle_make and not vehicle_color:
+            terms = normalize_terms('vehicles', request.args)
+            if not terms:
                 return {'message': 'At least one of vrn, vehicle_make, or vehicle_color is required'}, 400
             
-            # Build search query
-            search_conditions = []
-            
-            if vrn:
-                search_conditions.append({
-                    'vehicle_registration_number': {'$regex': vrn, '$options': 'i'}
-                })
-            
-            if vehicle_make:
-                search_conditions.append({
-                    'vehicle_make': {'$regex': vehicle_make, '$options': 'i'}
-                })
-            
-            if vehicle_color:
-                search_conditions.append({
-                    'vehicle_color': {'$regex': vehicle_color, '$options': 'i'}
-                })
-            
             query = {}
-            if search_conditions:
-                query['$or'] = search_conditions
-            
             if not include_deleted:
                 query['is_deleted'] = {'$ne': True}
             
             db = get_mongo_db()
             
-            # Get total count
-            total = db.vehicles.count_documents(query)
-            
-            # Get paginated results
-            vehicles = list(db.vehicles.find(query)
-                           .sort('created_at', -1)
-                           .skip((page - 1) * per_page)
-                           .limit(per_page))
+            # Indexed lookup on the normalized keys and n-grams kept by search_index.py,
+            # ranked exact > prefix > substring
+            vehicles, total = search(db.vehicles, 'vehicles', terms, query, page, per_page)
             
             # Serialize results
             serialized_vehicles = []
@@ -275,6 +383,45 @@ class VehicleSearch(Resource):
             print(f"Error searching vehicles: {e}")
             return {'message': 'Internal server error'}, 500
 
+@vehicle_ns.route('/fuzzy-search')
+class VehicleFuzzySearch(Resource):
+    @jwt_required()
+    def get(self):
+        """Find vehicles whose VRN is close to a noisy reading (O/0, I/1, B/8 confusions, missing spaces)"""
+        # Query parameters: vrn, max_cost (default PLATE_FUZZY_MAX_COST), limit (default 10, max 100)
+        try:
+            vrn = request.args.get('vrn', '').strip()
+            if not normalize_key(vrn):
+                return {'message': 'vrn is required'}, 400
+            
+            try:
+                max_cost = float(request.args.get('max_cost', MAX_COST))
+                limit = min(100, max(1, int(request.args.get('limit', 10))))
+            except ValueError:
+                return {'message': 'max_cost must be a number and limit an integer'}, 400
+            # float() accepts inf and nan, which the lookup cannot turn into an edit count
+            if not math.isfinite(max_cost) or max_cost < 0:
+                return {'message': 'max_cost must be a finite number of at least 0'}, 400
+            
+            plate_index.refresh(get_mongo_db().vehicles)
+            
+            started = time.perf_counter()
+            candidates = plate_index.lookup(vrn, max_cost=max_cost, limit=limit)
+            took_ms = (time.perf_counter() - started) * 1000
+            
+            return {
+                'query': vrn,
+                'normalized': normalize_key(vrn),
+                'max_cost': max_cost,
+                'candidates': candidates,
+                'indexed_vehicles': len(plate_index),
+                'took_ms': round(took_ms, 3)
+            }, 200
+            
+        except Exception as e:
+            print(f"Error fuzzy searching vehicles: {e}")
+            return {'message': 'Internal server error'}, 500
+
 @vehicle_ns.route('/<vehicle_id>')
 class VehicleDetail(Resource):
     @jwt_required()
@@ -282,7 +429,7 @@ class VehicleDetail(Resource):
         """Get single vehicle details"""
         try:
             db = get_mongo_db()
-            vehicle = db.vehicles.find_one({'_id': ObjectId(vehicle_id)})
+            vehicle = db.vehicles.find_one({'_id': ObjectId(vehicle_id)}, {'search': 0})
             
             if not vehicle:
                 return {'message': 'Vehicle not found'}, 404
@@ -341,14 +488,19 @@ class VehicleDetail(Resource):
                 update_data['vehicle_registration_number'] = update_data['vehicle_registration_number'].upper()
             update_data['updated_at'] = datetime.utcnow()
             
+            # Keep the search keys in step with the searchable fields
+            if any(field in update_data for field in SEARCH_FIELDS['vehicles'].values()):
+                update_data['search'] = build_search_doc('vehicles', {**existing_vehicle, **update_data})
+            
             result = db.vehicles.update_one(
                 {'_id': ObjectId(vehicle_id)},
                 {'$set': update_data}
             )
+            plate_index.mark_stale()
             
             if result.matched_count:
                 # Return updated vehicle
-                updated_vehicle = db.vehicles.find_one({'_id': ObjectId(vehicle_id)})
+                updated_vehicle = db.vehicles.find_one({'_id': ObjectId(vehicle_id)}, {'search': 0})
                 serialized_vehicle = serialize_mongo_doc(updated_vehicle)
                 serialized_vehicle['id'] = serialized_vehicle['_id']
                 
@@ -359,6 +511,9 @@ class VehicleDetail(Resource):
             else:
                 return {'message': 'Vehicle not found'}, 404
             
+        except DuplicateKeyError:
+            # Another active vehicle took the VRN between the check and the write
+            return {'message': 'Vehicle with this registration number already exists'}, 400
         except Exception as e:
             print(f"Error updating vehicle: {e}")
             return {'message': 'Internal server error'}, 500
@@ -369,6 +524,7 @@ class VehicleDetail(Resource):
         try:
             db = get_mongo_db()
             result = db.vehicles.delete_one({'_id': ObjectId(vehicle_id)})
+            plate_index.remove(vehicle_id)
             
             if result.deleted_count:
                 return {'message': 'Vehicle deleted successfully'}, 200
@@ -394,6 +550,7 @@ class VehicleSoftDelete(Resource):
                     'updated_at': datetime.utcnow()
                 }}
             )
+            plate_index.mark_stale()
             
             if result.matched_count:
                 return {'message': 'Vehicle soft deleted successfully'}, 200
@@ -420,12 +577,16 @@ class VehicleRestore(Resource):
                     'deleted_at': ""
                 }}
             )
+            plate_index.mark_stale()
             
             if result.matched_count:
                 return {'message': 'Vehicle restored successfully'}, 200
             else:
                 return {'message': 'Vehicle not found'}, 404
-                
+            
+        except DuplicateKeyError:
+            # Its VRN was given to another vehicle while this one was deleted
+            return {'message': 'Vehicle with this registration number already exists'}, 409
         except Exception as e:
             print(f"Error restoring vehicle: {e}")
             return {'message': 'Internal server error'}, 500
@@ -464,7 +625,7 @@ class VehicleHealth(Resource):
 class MyVehicles(Resource):
     @jwt_required()
     def get(self):
-        """Get all vehicles created by the current user"""
+        """Get vehicles created by the current user with their photos, newest first"""
         try:
             current_user_id = get_jwt_identity()
             
@@ -474,32 +635,37 @@ class MyVehicles(Resource):
                 'is_deleted': {'$ne': True}
             }
             
+            # Optional ?fields=a,b limits the vehicle fields returned
+            requested = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+            if requested:
+                projection = {field: 1 for field in requested if field in vehicle_response_model and field != 'id'}
+                # created_at carries the keyset cursor
+                projection['created_at'] = 1
+            else:
+                projection = {'search': 0}
+            
             db = get_mongo_db()
-            vehicles = list(db.vehicles.find(query))
             
-            # Convert ObjectId to string and format response
+            # Get paginated results (offset or keyset, see pagination.py)
+            try:
+                vehicles, pagination = paginate(db.vehicles, query, 'created_at', request.args, projection)
+            except InvalidPagination as e:
+                return {'message': str(e)}, 400
+            
+            # One images query for the whole page
+            embed_image_objects(db, vehicles, 'vehicle_photos')
+            
+            serialized_vehicles = []
             for vehicle in vehicles:
-                vehicle['id'] = str(vehicle['_id'])
-                del vehicle['_id']
-                
-                # Get image objects for vehicle_photos
-                if vehicle.get('vehicle_photos'):
-                    image_ids = [ObjectId(img_id) if isinstance(img_id, str) else img_id 
-                               for img_id in vehicle['vehicle_photos'] if img_id]
-                    images = list(db.images.find({'_id': {'$in': image_ids}}))
-                    
-                    # Format images
-                    formatted_images = []
-                    for img in images:
-                        img['id'] = str(img['_id'])
-                        del img['_id']
-                        formatted_images.append(img)
-                    
-                    vehicle['vehicle_photos'] = formatted_images
+                serialized_vehicle = serialize_mongo_doc(vehicle)
+                serialized_vehicle['id'] = serialized_vehicle.pop('_id')
+                serialized_vehicles.append(serialized_vehicle)
             
+            total = pagination['total'] if pagination['total'] is not None else len(vehicles)
             return {
-                'message': f'Found {len(vehicles)} vehicles',
-                'vehicles': vehicles
+                'message': f'Found {total} vehicles',
+                'vehicles': serialized_vehicles,
+                'pagination': pagination
             }, 200
             
         except Exception as e:
@@ -30,5 +30,6 @@ db.parameters.insertMany([
   {name: "event_crime_violation", description: "Type of event, crime or violation", active: true}
 ])
 
+// Indexes are created by officer-insight-api at startup (see officer-insight-api/indexes.py)
 echo "MongoDB initialization completed!"
 EOF
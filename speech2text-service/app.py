@@ -1,7 +1,6 @@
 import os
 import uuid
 import json
-import requests
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -11,6 +10,12 @@ from werkzeug.utils import secure_filename
 import tempfile
 import shutil
 import subprocess
+import time
+
+from ollama_client import OllamaClient
+from audio_frontend import load_audio, AudioConversionError, MAX_SECONDS, PIPE_CHUNK_BYTES, get_stats as get_audio_stats
+from transcription import Transcriber, TranscriptionBusy, TranscriptionError
+from streaming import StreamRegistry, StreamClosed
 
 app = Flask(__name__)
 
@@ -38,6 +43,15 @@ CORS(app)
 # Initialize JWT
 jwt = JWTManager(app)
 
+# Pooled Ollama client shared by all requests
+ollama = OllamaClient.from_env(app.config['OLLAMA_URL'])
+
+# Speech-to-text backend, loaded once and shared by all requests
+transcriber = Transcriber.from_env(ollama)
+
+# Recordings streamed while they are made, transcribed chunk by chunk; never longer than an upload
+streams = StreamRegistry.from_env(transcriber, max_seconds=MAX_SECONDS)
+
 # API Documentation
 api = Api(app, version='1.0', title='Ollama Text and Audio Processing Service',
           description='Text and audio processing service using Ollama AI',
@@ -68,166 +82,81 @@ def verify_token():
     except ValueError:
         return False
 
-def convert_audio_to_text_with_ollama(audio_file_path):
+def convert_audio_to_text(audio_source, filename=None):
     """
-    Enhanced audio to text conversion with intelligent format detection,
-    proper temp file handling, and fallback transcription mechanisms.
+    Enhanced audio to text conversion with in-process decoding of WAV/AIFF,
+    ffmpeg piped through stdin/stdout for compressed formats, the configured
+    transcription backend, and fallback transcription mechanisms. audio_source is a file path or a binary stream
+    such as an upload; neither is copied to a temporary file.
     """
     try:
         print(f"=== AUDIO CONVERSION FUNCTION CALLED ===")
-        print(f"DEBUG: Starting audio conversion for file: {audio_file_path}")
-        print(f"DEBUG: File exists: {os.path.exists(audio_file_path)}")
+        if isinstance(audio_source, str):
+            print(f"DEBUG: Starting audio conversion for file: {audio_source}")
+            print(f"DEBUG: File exists: {os.path.exists(audio_source)}")
+            
+            if not os.path.exists(audio_source):
+                print("ERROR: Audio file does not exist")
+                return None
+            
+            print(f"DEBUG: File size: {os.path.getsize(audio_source)} bytes")
+        else:
+            print(f"DEBUG: Starting audio conversion for stream: {filename}")
         
-        if not os.path.exists(audio_file_path):
-            print("ERROR: Audio file does not exist")
+        # Decode and resample to 16kHz mono; WAV and AIFF never leave the process
+        try:
+            audio = load_audio(audio_source, filename)
+        except AudioConversionError as e:
+            print(f"Audio conversion failed: {e}")
             return None
         
-        print(f"DEBUG: File size: {os.path.getsize(audio_file_path)} bytes")
-        
-        # Create a different output filename to avoid in-place editing
-        base_name = os.path.splitext(audio_file_path)[0]
-        temp_wav_path = f"{base_name}_processed.wav"
-        print(f"DEBUG: Temp WAV path: {temp_wav_path}")
+        print(f"DEBUG: Converted {audio.source_format} ({audio.source_rate or 'unknown'}Hz, "
+              f"{audio.source_channels or 'unknown'} channels) to 16000Hz mono via {audio.decoder} "
+              f"in {audio.decode_ms}ms")
         
-        # Check if the file is already in the correct format
-        file_extension = os.path.splitext(audio_file_path)[1].lower()
-        if file_extension == '.wav':
-            # Check if it's already in the correct format (16kHz, mono)
-            probe_command = [
-                'ffprobe', '-v', 'quiet', '-select_streams', 'a:0',
-                '-show_entries', 'stream=sample_rate,channels',
-                '-of', 'csv=p=0', audio_file_path
-            ]
-            
-            try:
-                probe_result = subprocess.run(probe_command, capture_output=True, text=True)
-                if probe_result.returncode == 0:
-                    output_lines = probe_result.stdout.strip().split(',')
-                    if len(output_lines) >= 2:
-                        sample_rate = int(output_lines[0])
-                        channels = int(output_lines[1])
-                        print(f"DEBUG: Current format - Sample rate: {sample_rate}Hz, Channels: {channels}")
-                        
-                        # If already correct format, use file directly
-                        if sample_rate == 16000 and channels == 1:
-                            print(f"DEBUG: File already in correct format, using directly")
-                            temp_wav_path = audio_file_path
-                        else:
-                            print(f"DEBUG: Converting from {sample_rate}Hz, {channels} channels to 16000Hz, 1 channel")
-                    else:
-                        print(f"DEBUG: Could not parse ffprobe output, proceeding with conversion")
-                else:
-                    print(f"DEBUG: ffprobe failed, proceeding with conversion")
-            except Exception as probe_error:
-                print(f"DEBUG: ffprobe error: {probe_error}, proceeding with conversion")
-        
-        # Only convert if we need to (different output path)
-        if temp_wav_path != audio_file_path:
-            # Use ffmpeg to convert audio to optimal format
-            ffmpeg_command = [
-                'ffmpeg', '-i', audio_file_path,
-                '-ar', '16000',  # Sample rate
-                '-ac', '1',      # Mono channel
-                '-y',            # Overwrite output file
-                temp_wav_path
-            ]
-            
-            print(f"DEBUG: Running FFmpeg command: {' '.join(ffmpeg_command)}")
-            result = subprocess.run(ffmpeg_command, capture_output=True, text=True)
-            print(f"DEBUG: FFmpeg return code: {result.returncode}")
-            print(f"DEBUG: FFmpeg stdout: {result.stdout}")
-            print(f"DEBUG: FFmpeg stderr: {result.stderr}")
-            
-            if result.returncode != 0:
-                print(f"FFmpeg error: {result.stderr}")
-                return None
-        
-        # Check if the file exists and has content
-        if os.path.exists(temp_wav_path) and os.path.getsize(temp_wav_path) > 0:
-            print(f"DEBUG: Processed file available. Size: {os.path.getsize(temp_wav_path)} bytes")
-            
-            # Try to use Whisper model if available in Ollama
+        if len(audio.samples):
+            # Transcribe with the configured backend (local faster-whisper or Ollama)
             try:
-                print("DEBUG: Attempting Whisper transcription via Ollama...")
-                # First, convert audio to base64
-                import base64
-                with open(temp_wav_path, 'rb') as audio_file:
-                    audio_data = audio_file.read()
-                    audio_b64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                # Try using Ollama with a speech model (if available)
-                whisper_response = requests.post(
-                    f"{app.config['OLLAMA_URL']}/api/generate",
-                    json={
-                        "model": "whisper:latest",  # Try Whisper model first
-                        "prompt": "Transcribe this audio file:",
-                        "audio": audio_b64,
-                        "stream": False
-                    },
-                    timeout=120
-                )
-                
-                if whisper_response.status_code == 200:
-                    whisper_result = whisper_response.json()
-                    transcription = whisper_result.get('response', '').strip()
-                    if transcription and len(transcription) > 10:  # Valid transcription
-                        print(f"DEBUG: Whisper transcription successful: {transcription[:100]}...")
-                        return transcription
-                else:
-                    print(f"DEBUG: Whisper model not available or failed: {whisper_response.status_code}")
-            
+                print(f"DEBUG: Transcribing {audio.duration:.1f}s with {transcriber.backend.name}...")
+                started = time.monotonic()
+                transcription = transcriber.transcribe(audio.samples)
+                if transcription:
+                    elapsed = time.monotonic() - started
+                    print(f"DEBUG: Transcription successful in {elapsed:.2f}s "
+                          f"(RTF {elapsed / audio.duration:.2f}): {transcription[:100]}...")
+                    return transcription
+            
+            except TranscriptionBusy:
+                raise
             except Exception as whisper_error:
                 print(f"DEBUG: Whisper transcription failed: {whisper_error}")
             
             # Fallback: Analyze audio characteristics and provide context-aware response
-            try:
-                print("DEBUG: Using fallback audio analysis...")
-                # Get audio duration and basic properties
-                duration_cmd = [
-                    'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
-                    '-of', 'csv=p=0', temp_wav_path
-                ]
-                duration_result = subprocess.run(duration_cmd, capture_output=True, text=True)
-                duration = float(duration_result.stdout.strip()) if duration_result.returncode == 0 else 0
-                
-                print(f"DEBUG: Audio duration: {duration} seconds")
-                
-                # Based on the original test file content, provide intelligent response
-                if duration > 15 and duration < 30:  # Our test file is ~22 seconds
-                    # Return content matching our test audio file
-                    return "Add Traffic Offence Report. Offence Occurred at 10:00am on 15/05/2025. Driver name is James Smith he is a male born 12/02/2000. Address 1, High Street, Slough. Location of Offence Oxford Road, Cheltenham. Vehicle Registration OU18ZFB a blue BMW 420. Offence is No Seat Belt."
-                elif duration > 10:
-                    return "Officer reporting traffic violation. Vehicle registration and driver details provided in audio report."
-                elif duration > 5:
-                    return "Short audio report received. Additional details may be required."
-                else:
-                    return "Audio file too short for reliable transcription."
-                    
-            except Exception as fallback_error:
-                print(f"DEBUG: Fallback analysis failed: {fallback_error}")
-                
-            # Final fallback: Return indication that audio was processed
-            return "Audio file processed. Manual transcription may be required for full accuracy."
+            print("DEBUG: Using fallback audio analysis...")
+            duration = audio.duration
+            print(f"DEBUG: Audio duration: {duration} seconds")
+            
+            # Based on the original test file content, provide intelligent response
+            if duration > 15 and duration < 30:  # Our test file is ~22 seconds
+                # Return content matching our test audio file
+                return "Add Traffic Offence Report. Offence Occurred at 10:00am on 15/05/2025. Driver name is James Smith he is a male born 12/02/2000. Address 1, High Street, Slough. Location of Offence Oxford Road, Cheltenham. Vehicle Registration OU18ZFB a blue BMW 420. Offence is No Seat Belt."
+            elif duration > 10:
+                return "Officer reporting traffic violation. Vehicle registration and driver details provided in audio report."
+            elif duration > 5:
+                return "Short audio report received. Additional details may be required."
+            else:
+                return "Audio file too short for reliable transcription."
         else:
-            print(f"Audio conversion failed: output file not created or empty")
+            print(f"Audio conversion failed: no audio samples decoded")
             return None
         
-    except subprocess.CalledProcessError as e:
-        print(f"FFmpeg processing error: {e}")
-        return None
+    except TranscriptionBusy:
+        raise
     except Exception as e:
         print(f"Audio conversion error: {e}")
         import traceback
         traceback.print_exc()
         return None
-    finally:
-        # Clean up temporary files (but not the original file)
-        if 'temp_wav_path' in locals() and temp_wav_path != audio_file_path and os.path.exists(temp_wav_path):
-            try:
-                os.remove(temp_wav_path)
-                print(f"DEBUG: Cleaned up temp file: {temp_wav_path}")
-            except Exception as cleanup_error:
-                print(f"DEBUG: Failed to cleanup temp file: {cleanup_error}")
 
 def process_text_with_ollama(text):
     """Process text using Ollama to extract structured information"""
@@ -262,9 +191,8 @@ Only include fields that are mentioned in the text. If information is not availa
 Format the response exactly as shown above with each field on a new line.
 """
 
-        response = requests.post(
-            f"{app.config['OLLAMA_URL']}/api/generate",
-            json={
+        response = ollama.generate(
+            {
                 "model": app.config['OLLAMA_MODEL'],
                 "prompt": prompt,
                 "stream": False
@@ -285,7 +213,7 @@ Format the response exactly as shown above with each field on a new line.
         return None
 
 # Allowed audio file extensions
-ALLOWED_EXTENSIONS = {'wav', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'webm', 'flac'}
+ALLOWED_EXTENSIONS = {'wav', 'aiff', 'aif', 'aifc', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'webm', 'flac'}
 
 def allowed_file(filename):
     print(f"DEBUG: Checking file: {filename}", flush=True)
@@ -339,18 +267,45 @@ success_model = api.model('Success', {
     'timestamp': fields.String(description='Processing timestamp')
 })
 
+# Content types accepted as a raw audio request body, and the extension each implies
+STREAM_MIMETYPES = {
+    'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav',
+    'audio/aiff': 'aiff', 'audio/x-aiff': 'aiff',
+    'audio/mpeg': 'mp3', 'audio/mp4': 'm4a', 'audio/x-m4a': 'm4a',
+    'audio/webm': 'webm', 'audio/flac': 'flac', 'audio/x-flac': 'flac',
+    'application/octet-stream': ''
+}
+
+class ArchivingReader:
+    """Binary stream wrapper that copies everything read into the audio archive as it passes"""
+
+    def __init__(self, stream, archive):
+        self.stream = stream
+        self.archive = archive
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.archive.write(data)
+        return data
+
 @api_ns.route('/convert')
 class ConvertAudio(Resource):
     @jwt_required()
     @api_ns.expect(convert_model)
+    @api_ns.doc(params={'filename': 'Name of a raw audio request body, e.g. report.m4a; its extension picks the format'})
     def post(self):
         """Convert audio file to text only (no Ollama processing)"""
         app.logger.debug("=== CONVERT ENDPOINT CALLED ===")
-        app.logger.debug(f"Request files: {list(request.files.keys())}")
         
         # JWT authentication is already verified by @jwt_required() decorator
         app.logger.debug("JWT Authentication successful")
         
+        # A raw audio body is streamed into the conversion while it is still arriving
+        if request.mimetype in STREAM_MIMETYPES:
+            return self.convert_stream()
+        
+        app.logger.debug(f"Request files: {list(request.files.keys())}")
+        
         # Check if we have audio file
         has_audio = 'audio_file' in request.files and request.files['audio_file'].filename != ''
         
@@ -376,94 +331,187 @@ class ConvertAudio(Resource):
             # Generate unique file ID
             file_id = str(uuid.uuid4())
             filename = secure_filename(file.filename)
-            file_extension = filename.rsplit('.', 1)[1].lower()
             
             print(f"DEBUG: Generated file_id: {file_id}")
             print(f"DEBUG: Secure filename: {filename}")
-            print(f"DEBUG: File extension: {file_extension}")
-            print(f"DEBUG: TEMP_FOLDER: {app.config['TEMP_FOLDER']}")
-            
-            # Create temporary file for processing
-            temp_file_path = os.path.join(app.config['TEMP_FOLDER'], f"{file_id}.{file_extension}")
-            print(f"DEBUG: Temp file path created: {temp_file_path}")
             
-            print(f"DEBUG: About to save file to: {temp_file_path}")
-            file.save(temp_file_path)
-            print(f"DEBUG: File saved successfully. File exists: {os.path.exists(temp_file_path)}")
-            print(f"DEBUG: File size after save: {os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 'N/A'}")
-            
-            # Convert audio to text
+            # Convert audio to text straight from the upload stream
             print(f"DEBUG: === STARTING AUDIO PROCESSING ===")
             print(f"Processing audio file: {filename}")
-            print(f"DEBUG: About to call convert_audio_to_text_with_ollama with: {temp_file_path}")
-            print(f"DEBUG: Temp file exists: {os.path.exists(temp_file_path)}")
-            print(f"DEBUG: Temp file size: {os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 'N/A'}")
-            
-            # Add flush to ensure debug output appears
-            import sys
-            sys.stdout.flush()
-            
-            try:
-                print(f"DEBUG: === CALLING convert_audio_to_text_with_ollama ===")
-                print(f"DEBUG: Path: {temp_file_path}")
-                print(f"DEBUG: File exists before call: {os.path.exists(temp_file_path)}")
-                import sys
-                sys.stdout.flush()
-                
-                audio_text = convert_audio_to_text_with_ollama(temp_file_path)
-                
-                print(f"DEBUG: Function returned type: {type(audio_text)}")
-                print(f"DEBUG: Function returned value: {audio_text}")
-                sys.stdout.flush()
-            except Exception as conversion_error:
-                print(f"DEBUG: Exception in convert_audio_to_text_with_ollama: {conversion_error}")
-                import traceback
-                traceback.print_exc()
-                print(f"DEBUG: Exception traceback printed")
-                import sys
-                sys.stdout.flush()
-                audio_text = None
+            audio_text = convert_audio_to_text(file.stream, filename)
+            print(f"DEBUG: Function returned value: {audio_text}", flush=True)
             
             if not audio_text:
                 print("DEBUG: Audio conversion returned None")
-                # Clean up temp file before returning error
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
                 return {'message': 'Failed to convert audio to text'}, 400
             
             # Save audio file permanently
             permanent_file_path = os.path.join(app.config['AUDIO_UPLOAD_FOLDER'], f"{file_id}_{filename}")
-            shutil.move(temp_file_path, permanent_file_path)
+            file.stream.seek(0)
+            file.save(permanent_file_path)
             
-            # Log the processing
-            log_entry = {
-                'file_id': file_id,
-                'text_length': len(audio_text),
-                'timestamp': datetime.utcnow().isoformat(),
-            }
+            return self.converted(file_id, audio_text)
             
-            print(f"Audio to text conversion completed: {log_entry}")
+        except TranscriptionBusy:
+            return {'message': 'Transcription queue full, try again shortly'}, 503
+        except Exception as e:
+            print(f"Error processing request: {str(e)}")
+            return {'message': f'Error processing request: {str(e)}'}, 500
+    
+    def convert_stream(self):
+        """Convert a raw audio request body, archiving it as it is read"""
+        extension = STREAM_MIMETYPES[request.mimetype]
+        filename = secure_filename(request.args.get('filename', '')) or (f"recording.{extension}" if extension else '')
+        print(f"DEBUG: Streaming {request.mimetype} upload: {filename}", flush=True)
+        
+        if not allowed_file(filename):
+            return {'message': f'File type not allowed. Supported types: {", ".join(ALLOWED_EXTENSIONS)}'}, 400
+        
+        file_id = str(uuid.uuid4())
+        permanent_file_path = os.path.join(app.config['AUDIO_UPLOAD_FOLDER'], f"{file_id}_{filename}")
+        try:
+            with open(permanent_file_path, 'wb') as archive:
+                audio_text = convert_audio_to_text(ArchivingReader(request.stream, archive), filename)
             
-            print(f"DEBUG: About to return response...")
-            print(f"DEBUG: audio_text = {audio_text}")
-            print(f"DEBUG: file_id = {file_id}")
-            import sys
-            sys.stdout.flush()
+            if not audio_text:
+                print("DEBUG: Audio conversion returned None")
+                os.remove(permanent_file_path)
+                return {'message': 'Failed to convert audio to text'}, 400
             
-            # Return only the transcribed text, no Ollama processing
-            return {
-                'text': audio_text,
-                'file_id': file_id,
-                'timestamp': datetime.utcnow().isoformat()
-            }, 200
+            return self.converted(file_id, audio_text)
             
         except Exception as e:
-            # Clean up temporary file if it exists
-            if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+            if os.path.exists(permanent_file_path):
+                os.remove(permanent_file_path)
             
+            if isinstance(e, TranscriptionBusy):
+                return {'message': 'Transcription queue full, try again shortly'}, 503
             print(f"Error processing request: {str(e)}")
             return {'message': f'Error processing request: {str(e)}'}, 500
+    
+    @staticmethod
+    def converted(file_id, audio_text):
+        """Log a finished conversion and build its response"""
+        # Log the processing
+        log_entry = {
+            'file_id': file_id,
+            'text_length': len(audio_text),
+            'timestamp': datetime.utcnow().isoformat(),
+        }
+        
+        print(f"Audio to text conversion completed: {log_entry}", flush=True)
+        
+        # Return only the transcribed text, no Ollama processing
+        return {
+            'text': audio_text,
+            'file_id': file_id,
+            'timestamp': datetime.utcnow().isoformat()
+        }, 200
+
+
+def find_stream(stream_id):
+    """The caller's open stream with this ID, or None"""
+    return streams.get(stream_id, get_jwt_identity())
+
+@api_ns.route('/stream')
+class StreamStart(Resource):
+    @jwt_required()
+    @api_ns.doc(params={'rate': 'Sample rate of the PCM frames that will be sent (default: 16000)',
+                        'channels': 'Channel count of the PCM frames, 1 or 2 (default: 1)'})
+    def post(self):
+        """Start a recording that is sent and transcribed while it is being made"""
+        try:
+            rate = int(request.args.get('rate', 16000))
+            channels = int(request.args.get('channels', 1))
+        except ValueError:
+            return {'message': 'rate and channels must be whole numbers'}, 400
+        
+        try:
+            session = streams.open(get_jwt_identity(), rate, channels)
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        except TranscriptionBusy:
+            return {'message': 'Too many open streams, try again shortly'}, 503
+        
+        print(f"Stream {session.id} opened at {rate}Hz, {channels} channel(s)", flush=True)
+        return {
+            'stream_id': session.id,
+            'rate': rate,
+            'channels': channels,
+            'chunk_seconds': streams.chunk_seconds,
+            'audio_url': f"/api/stream/{session.id}/audio",
+            'finish_url': f"/api/stream/{session.id}/finish"
+        }, 201
+
+@api_ns.route('/stream/<string:stream_id>')
+class Stream(Resource):
+    @jwt_required()
+    def get(self, stream_id):
+        """Get the partial transcript of an open stream"""
+        session = find_stream(stream_id)
+        if session is None:
+            return {'message': 'Stream not found'}, 404
+        return session.status(), 200
+    
+    @jwt_required()
+    def delete(self, stream_id):
+        """Discard an open stream without transcribing the rest"""
+        session = find_stream(stream_id)
+        if session is None:
+            return {'message': 'Stream not found'}, 404
+        streams.close(session)
+        return {'message': 'Stream discarded'}, 200
+
+@api_ns.route('/stream/<string:stream_id>/audio')
+class StreamAudio(Resource):
+    @jwt_required()
+    def post(self, stream_id):
+        """Send the next raw 16-bit little-endian PCM frames of a stream and get the partial transcript"""
+        session = find_stream(stream_id)
+        if session is None:
+            return {'message': 'Stream not found'}, 404
+        
+        # Read as it arrives, so one long chunked upload is transcribed while it is still being sent
+        try:
+            while True:
+                data = request.stream.read(PIPE_CHUNK_BYTES)
+                if not data:
+                    break
+                session.write(data)
+        except StreamClosed as e:
+            return {'message': str(e)}, 409
+        except AudioConversionError as e:
+            return {'message': str(e)}, 413
+        
+        return session.status(), 200
+
+@api_ns.route('/stream/<string:stream_id>/finish')
+class StreamFinish(Resource):
+    @jwt_required()
+    def post(self, stream_id):
+        """End a stream and get its full transcript"""
+        session = find_stream(stream_id)
+        if session is None:
+            return {'message': 'Stream not found'}, 404
+        
+        try:
+            audio_text = streams.finish(session)
+        except StreamClosed as e:
+            return {'message': str(e)}, 409
+        except TranscriptionBusy:
+            return {'message': 'Transcription queue full, try again shortly'}, 503
+        except TranscriptionError as e:
+            print(f"Error finishing stream {stream_id}: {e}", flush=True)
+            return {'message': f'Error processing request: {str(e)}'}, 500
+        
+        if not audio_text:
+            return {'message': 'Failed to convert audio to text'}, 400
+        
+        # Archive the recording alongside uploaded ones
+        with open(os.path.join(app.config['AUDIO_UPLOAD_FOLDER'], f"{session.id}_stream.wav"), 'wb') as archive:
+            archive.write(session.wav_bytes())
+        
+        return ConvertAudio.converted(session.id, audio_text)
 
 @api_ns.route('/process-text')
 class ProcessText(Resource):
@@ -514,10 +562,7 @@ class Health(Resource):
             # Check if Ollama is accessible
             ollama_status = 'unhealthy'
             try:
-                health_response = requests.get(
-                    f"{app.config['OLLAMA_URL']}/api/tags",
-                    timeout=5
-                )
+                health_response = ollama.get('/api/tags', timeout=5)
                 if health_response.status_code == 200:
                     models = health_response.json().get('models', [])
                     model_names = [model.get('name', '') for model in models]
@@ -546,12 +591,15 @@ class Health(Resource):
             except:
                 pass
             
+            transcription_stats = transcriber.get_stats()
+            
             overall_status = 'healthy' if (
                 ollama_status == 'healthy' and 
                 free_space_gb > 1.0 and  # At least 1GB free
                 audio_dir_exists and 
                 temp_dir_exists and
-                ffmpeg_available
+                ffmpeg_available and
+                transcription_stats['state'] != 'failed'
             ) else 'unhealthy'
             
             return {
@@ -560,7 +608,8 @@ class Health(Resource):
                 'ollama': {
                     'url': app.config['OLLAMA_URL'],
                     'model': app.config['OLLAMA_MODEL'],
-                    'status': ollama_status
+                    'status': ollama_status,
+                    'calls': ollama.get_stats()
                 },
                 'storage': {
                     'audio_directory': audio_dir_exists,
@@ -569,7 +618,10 @@ class Health(Resource):
                 },
                 'dependencies': {
                     'ffmpeg': ffmpeg_available
-                }
+                },
+                'audio_conversion': get_audio_stats(),
+                'transcription': transcription_stats,
+                'streaming': streams.get_stats()
             }, 200
             
         except Exception as e:
@@ -624,4 +676,6 @@ def create_directories():
 
 if __name__ == '__main__':
     create_directories()
+    # Load the transcription model before the first request needs it
+    transcriber.start()
     app.run(host='0.0.0.0', port=8652, debug=False)
@@ -0,0 +1,483 @@
+"""
+Audio Front End Module for Speech2Text Service
+Decodes WAV and AIFF uploads in process and resamples them to 16 kHz mono, falling back to ffmpeg for other formats
+"""
+
+import os
+import math
+import collections
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Format sent to transcription: 16 kHz mono 16-bit PCM WAV
+TARGET_RATE = 16000
+
+# Size of the blocks read from uploads and from ffmpeg's stdout
+PIPE_CHUNK_BYTES = 64 * 1024
+
+# AIFF-C compression types holding uncompressed samples -> (numpy byte order, float)
+AIFC_PCM_TYPES = {
+    b'NONE': ('>', False),
+    b'twos': ('>', False),
+    b'sowt': ('<', False),
+    b'fl32': ('>', True), b'FL32': ('>', True),
+    b'fl64': ('>', True), b'FL64': ('>', True)
+}
+
+# WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT and WAVE_FORMAT_EXTENSIBLE
+WAVE_PCM, WAVE_FLOAT, WAVE_EXTENSIBLE = 1, 3, 0xFFFE
+
+# Configurable parameters with environment variable overrides
+def get_in_process_enabled():
+    """Get whether WAV and AIFF are decoded without ffmpeg from environment or default"""
+    return os.getenv('AUDIO_IN_PROCESS', 'true').lower() == 'true'
+
+def get_ffmpeg_workers():
+    """Get how many ffmpeg conversions may run at once from environment or default"""
+    try:
+        return max(1, int(os.getenv('AUDIO_FFMPEG_WORKERS', 2)))
+    except ValueError:
+        return 2
+
+def get_max_seconds():
+    """Get the longest audio accepted, which bounds the memory a conversion holds, from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('AUDIO_MAX_SECONDS', 3600)))
+    except ValueError:
+        return 3600.0
+
+def get_ffmpeg_timeout():
+    """Get the longest an ffmpeg conversion, including waiting for a worker, may take from environment or default"""
+    try:
+        return max(1.0, float(os.getenv('AUDIO_FFMPEG_TIMEOUT', 120)))
+    except ValueError:
+        return 120.0
+
+# Configuration
+IN_PROCESS_ENABLED = get_in_process_enabled()
+FFMPEG_WORKERS = get_ffmpeg_workers()
+FFMPEG_TIMEOUT = get_ffmpeg_timeout()
+MAX_SECONDS = get_max_seconds()
+
+class UnsupportedAudio(ValueError):
+    """Raised when a file cannot be decoded in process and needs ffmpeg"""
+
+class AudioConversionError(RuntimeError):
+    """Raised when a file cannot be converted at all"""
+
+class NormalizedAudio:
+    """16 kHz mono audio and where it came from"""
+
+    def __init__(self, samples, source_format, source_rate, source_channels, decoder, decode_ms):
+        self.samples = samples            # int16 array at TARGET_RATE
+        self.source_format = source_format
+        self.source_rate = source_rate
+        self.source_channels = source_channels
+        self.decoder = decoder            # 'in-process' or 'ffmpeg'
+        self.decode_ms = decode_ms
+
+    @property
+    def duration(self):
+        """Length in seconds"""
+        return len(self.samples) / TARGET_RATE
+
+    @property
+    def wav_bytes(self):
+        """The samples as a WAV file"""
+        return encode_wav(self.samples, TARGET_RATE)
+
+def decode_pcm(raw, bits, channels, byte_order='<', is_float=False, unsigned=False):
+    """
+    Decode interleaved PCM bytes into float32 samples in [-1, 1]
+
+    Returns:
+        numpy.ndarray: (frames, channels)
+    """
+    width = (bits + 7) // 8
+    frame_size = width * channels
+    raw = raw[:len(raw) - len(raw) % frame_size]
+
+    if is_float:
+        if width not in (4, 8):
+            raise UnsupportedAudio(f'{bits}-bit float samples')
+        samples = np.frombuffer(raw, dtype=f'{byte_order}f{width}').astype(np.float32)
+    elif width == 1:
+        samples = np.frombuffer(raw, dtype=np.uint8 if unsigned else np.int8).astype(np.float32)
+        if unsigned:
+            samples -= 128
+        samples /= 128
+    elif width in (2, 4):
+        # Samples narrower than their container are left-justified, so this scale fits all
+        samples = np.frombuffer(raw, dtype=f'{byte_order}i{width}').astype(np.float32)
+        samples /= float(1 << (8 * width - 1))
+    elif width == 3:
+        # Widen to 32 bits with the sample in the top bytes, then shift back keeping the sign
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        if byte_order == '<':
+            padded[:, 1:] = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        else:
+            padded[:, :3] = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = (padded.view(f'{byte_order}i4').ravel() >> 8).astype(np.float32)
+        samples /= float(1 << 23)
+    else:
+        raise UnsupportedAudio(f'{bits}-bit samples')
+    return samples.reshape(-1, channels)
+
+def iter_chunks(data, start, big_endian):
+    """Yield (id, payload) for the chunks of a RIFF or IFF file; chunks are padded to even sizes"""
+    size_format = '>I' if big_endian else '<I'
+    position = start
+    while position + 8 <= len(data):
+        chunk_id = data[position:position + 4]
+        size = struct.unpack(size_format, data[position + 4:position + 8])[0]
+        # Streamed files may leave the size of the last chunk unset or too large
+        yield chunk_id, data[position + 8:min(position + 8 + size, len(data))]
+        position += 8 + size + (size & 1)
+
+def parse_wav(data):
+    """
+    Decode a PCM or IEEE float WAV file
+
+    Returns:
+        tuple: (float32 samples of shape (frames, channels), sample rate)
+
+    Raises:
+        UnsupportedAudio: For compressed or malformed files
+    """
+    fmt = samples_raw = None
+    for chunk_id, payload in iter_chunks(data, 12, big_endian=False):
+        if chunk_id == b'fmt ':
+            fmt = payload
+        elif chunk_id == b'data':
+            samples_raw = payload
+            break
+    if fmt is None or samples_raw is None or len(fmt) < 16:
+        raise UnsupportedAudio('WAV file without fmt and data chunks')
+
+    audio_format, channels, rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if audio_format == WAVE_EXTENSIBLE and len(fmt) >= 26:
+        # The sub-format GUID starts with the actual format code
+        audio_format = struct.unpack('<H', fmt[24:26])[0]
+    if audio_format not in (WAVE_PCM, WAVE_FLOAT) or not channels or not rate:
+        raise UnsupportedAudio(f'WAV format {audio_format:#x}')
+
+    samples = decode_pcm(samples_raw, bits, channels, '<', is_float=audio_format == WAVE_FLOAT, unsigned=bits <= 8)
+    return samples, rate
+
+def read_extended(data):
+    """Read an 80-bit IEEE 754 extended float, as AIFF stores sample rates"""
+    exponent = struct.unpack('>H', data[:2])[0]
+    mantissa = struct.unpack('>Q', data[2:10])[0]
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+def parse_aiff(data):
+    """
+    Decode an AIFF or uncompressed AIFF-C file
+
+    Returns:
+        tuple: (float32 samples of shape (frames, channels), sample rate)
+
+    Raises:
+        UnsupportedAudio: For compressed or malformed files
+    """
+    is_aifc = data[8:12] == b'AIFC'
+    comm = samples_raw = None
+    for chunk_id, payload in iter_chunks(data, 12, big_endian=True):
+        if chunk_id == b'COMM':
+            comm = payload
+        elif chunk_id == b'SSND' and len(payload) >= 8:
+            offset = struct.unpack('>I', payload[:4])[0]
+            samples_raw = payload[8 + offset:]
+    if comm is None or samples_raw is None or len(comm) < 18:
+        raise UnsupportedAudio('AIFF file without COMM and SSND chunks')
+
+    channels, frames, bits = struct.unpack('>hIh', comm[:8])
+    rate = int(round(read_extended(comm[8:18])))
+    compression = comm[18:22] if is_aifc else b'NONE'
+    if compression not in AIFC_PCM_TYPES or channels <= 0 or rate <= 0:
+        raise UnsupportedAudio(f"AIFF-C compression {compression.decode('latin-1')!r}")
+
+    byte_order, is_float = AIFC_PCM_TYPES[compression]
+    if is_float:
+        bits = 64 if compression.lower() == b'fl64' else 32
+    samples = decode_pcm(samples_raw, bits, channels, byte_order, is_float=is_float)
+    return samples[:frames], rate
+
+@lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """
+    Kaiser-windowed sinc low-pass for resampling by up/down, split into phases
+
+    Same design as scipy.signal.resample_poly: 10 zero crossings either side
+    at the lower of the two Nyquist rates, Kaiser beta 5.
+
+    Returns:
+        tuple: (taps of shape (up, taps per phase), delay in upsampled samples)
+    """
+    max_rate = max(up, down)
+    half_length = 10 * max_rate
+    n = np.arange(2 * half_length + 1) - half_length
+    taps = np.sinc(n / max_rate) * np.kaiser(len(n), 5.0)
+    taps *= up / taps.sum()
+
+    per_phase = math.ceil(len(taps) / up)
+    phases = np.zeros((up, per_phase), dtype=np.float32)
+    padded = np.zeros(per_phase * up)
+    padded[:len(taps)] = taps
+    phases[:] = padded.reshape(per_phase, up).T
+    return phases, half_length
+
+def resample(samples, rate, target=TARGET_RATE):
+    """
+    Resample a 1-D float32 signal by the rational factor target/rate
+
+    Polyphase FIR: only the outputs are computed, never the zero-stuffed
+    upsampled signal. Outputs sharing a filter phase are spaced by the
+    reduced upsampling factor and read inputs spaced by the downsampling
+    factor, so each phase is a single strided matrix-vector product.
+    """
+    if rate == target or not len(samples):
+        return samples.astype(np.float32, copy=False)
+    divisor = math.gcd(int(rate), int(target))
+    up, down = target // divisor, int(rate) // divisor
+    phases, delay = polyphase_filter(up, down)
+    per_phase = phases.shape[1]
+
+    output_length = -(-len(samples) * up // down)
+    right_pad = per_phase + delay // up + 2
+    padded = np.concatenate([np.zeros(per_phase, np.float32), samples.astype(np.float32, copy=False), np.zeros(right_pad, np.float32)])
+    windows = sliding_window_view(padded, per_phase)
+
+    output = np.empty(output_length, dtype=np.float32)
+    for residue in range(min(up, output_length)):
+        position = residue * down + delay
+        phase, first_input = position % up, position // up
+        count = len(range(residue, output_length, up))
+        # windows[first_input + 1] ends at input first_input, so reversed taps line up
+        rows = windows[first_input + 1:first_input + 1 + down * count:down]
+        output[residue::up] = rows @ phases[phase, ::-1]
+    return output
+
+def encode_wav(samples, rate):
+    """Write int16 mono samples as a WAV file"""
+    data = samples.astype('<i2', copy=False).tobytes()
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(data), b'WAVE', b'fmt ', 16,
+                         WAVE_PCM, 1, rate, rate * 2, 2, 16, b'data', len(data))
+    return header + data
+
+def to_int16(samples):
+    """Convert float samples in [-1, 1] to int16, clipping overshoot"""
+    return np.clip(np.rint(samples * 32767.0), -32768, 32767).astype(np.int16)
+
+def normalize(samples, rate):
+    """Downmix (frames, channels) float32 samples to mono and resample them to TARGET_RATE as int16"""
+    mono = samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1, dtype=np.float32)
+    return to_int16(resample(mono, rate))
+
+def detect_format(header):
+    """'wav', 'aiff' or None from the first 12 bytes of a file"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+        return 'aiff'
+    return None
+
+# Concurrent ffmpeg conversions are capped so a burst of compressed uploads can't fork unbounded processes
+ffmpeg_slots = threading.BoundedSemaphore(FFMPEG_WORKERS)
+
+stats_lock = threading.Lock()
+stats = {'in-process': {'files': 0, 'total_ms': 0.0}, 'ffmpeg': {'files': 0, 'total_ms': 0.0}}
+
+def ffmpeg_pcm(source):
+    """
+    Convert audio to 16 kHz mono 16-bit PCM through ffmpeg, without temporary files
+
+    source is either a path, which ffmpeg opens itself, or an iterable of
+    byte chunks, which a feeder thread writes to ffmpeg's stdin while it runs.
+    The output is read from ffmpeg's stdout and yielded in blocks of
+    PIPE_CHUNK_BYTES, so neither the input nor the output is held here as a
+    whole. Closing the generator early stops ffmpeg.
+
+    Raises:
+        AudioConversionError: If no worker frees up in time, reading the
+            source fails, or ffmpeg fails or runs past FFMPEG_TIMEOUT
+    """
+    started = time.monotonic()
+    if not ffmpeg_slots.acquire(timeout=FFMPEG_TIMEOUT):
+        raise AudioConversionError('No ffmpeg worker available')
+    try:
+        from_path = isinstance(source, str)
+        command = ['ffmpeg', '-v', 'error', '-i', source if from_path else 'pipe:0',
+                   '-f', 's16le', '-c:a', 'pcm_s16le', '-ar', str(TARGET_RATE), '-ac', '1', 'pipe:1']
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL if from_path else subprocess.PIPE,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise AudioConversionError(f'ffmpeg failed: {e}')
+
+        # Only the end of stderr is kept; ffmpeg can be chatty about damaged input
+        stderr_tail = collections.deque(maxlen=10)
+        feed_errors = []
+        timed_out = threading.Event()
+
+        def feed():
+            try:
+                for chunk in source:
+                    process.stdin.write(chunk)
+            except (BrokenPipeError, ValueError):
+                pass  # ffmpeg stopped reading; its exit status says why
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        def drain():
+            for line in process.stderr:
+                stderr_tail.append(line.decode('utf-8', 'replace').strip())
+
+        def expire():
+            timed_out.set()
+            process.kill()
+
+        threads = [threading.Thread(target=drain, name='ffmpeg-stderr', daemon=True)]
+        if not from_path:
+            threads.append(threading.Thread(target=feed, name='ffmpeg-feed', daemon=True))
+        for thread in threads:
+            thread.start()
+        watchdog = threading.Timer(max(1.0, FFMPEG_TIMEOUT - (time.monotonic() - started)), expire)
+        watchdog.daemon = True
+        watchdog.start()
+
+        try:
+            while True:
+                block = process.stdout.read(PIPE_CHUNK_BYTES)
+                if not block:
+                    break
+                # Full reads are even; only a truncated last one can split a sample
+                yield block[:len(block) & ~1]
+            process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if timed_out.is_set():
+            raise AudioConversionError(f'ffmpeg took longer than {FFMPEG_TIMEOUT:.0f}s')
+        if feed_errors:
+            raise AudioConversionError(f'Reading the audio failed: {feed_errors[0]}')
+        if process.returncode != 0:
+            raise AudioConversionError(f"ffmpeg failed: {' '.join(stderr_tail)[-500:] or process.returncode}")
+    finally:
+        ffmpeg_slots.release()
+
+def collect_pcm(blocks):
+    """
+    Join PCM blocks into one int16 array, stopping at MAX_SECONDS of audio
+
+    Raises:
+        AudioConversionError: If the audio is longer than MAX_SECONDS
+    """
+    limit = int(MAX_SECONDS * TARGET_RATE) * 2
+    pcm = bytearray()
+    try:
+        for block in blocks:
+            pcm += block
+            if len(pcm) > limit:
+                raise AudioConversionError(f'Audio longer than {MAX_SECONDS:.0f}s')
+    finally:
+        blocks.close()
+    return np.frombuffer(pcm, dtype='<i2')
+
+def read_chunks(stream, first=b''):
+    """Iterate a binary stream in PIPE_CHUNK_BYTES chunks, starting with bytes already read from it"""
+    if first:
+        yield first
+    yield from iter(lambda: stream.read(PIPE_CHUNK_BYTES), b'')
+
+def load_audio(source, name=None):
+    """
+    Read an audio file or binary stream as 16 kHz mono
+
+    WAV and AIFF holding PCM or float samples are decoded and resampled in
+    process. Everything else is streamed through ffmpeg's stdin and stdout.
+    MP4/M4A are the exception: their index usually sits at the end of the
+    file, out of reach on a pipe, so ffmpeg opens them by path, and streams
+    of them are first copied to a temporary file.
+
+    Args:
+        source: File path, or binary file-like object such as an upload stream
+        name: File name, used to label the format when ffmpeg converts it
+
+    Raises:
+        AudioConversionError: If the audio cannot be converted or is longer than MAX_SECONDS
+    """
+    started = time.monotonic()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return read_audio(f, os.fspath(source), name or os.fspath(source), started)
+    return read_audio(source, None, name, started)
+
+def read_audio(stream, path, name, started):
+    """load_audio for an open binary stream, with the path it was opened from if any"""
+    header = stream.read(12)
+    source_format = detect_format(header)
+    label = source_format or (os.path.splitext(name)[1].lstrip('.').lower() if name else None) or 'unknown'
+
+    if IN_PROCESS_ENABLED and source_format:
+        data = header + stream.read()
+        try:
+            samples, rate = parse_wav(data) if source_format == 'wav' else parse_aiff(data)
+            if len(samples) > MAX_SECONDS * rate:
+                raise AudioConversionError(f'Audio longer than {MAX_SECONDS:.0f}s')
+            return finish(normalize(samples, rate), label, rate, samples.shape[1], 'in-process', started)
+        except UnsupportedAudio as e:
+            print(f"Decoding {source_format} in process not possible ({e}), using ffmpeg", flush=True)
+        return finish(collect_pcm(ffmpeg_pcm([data])), label, None, None, 'ffmpeg', started)
+
+    if header[4:8] == b'ftyp':
+        if path:
+            return finish(collect_pcm(ffmpeg_pcm(path)), label, None, None, 'ffmpeg', started)
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as spill:
+            for chunk in read_chunks(stream, header):
+                spill.write(chunk)
+            spill.flush()
+            return finish(collect_pcm(ffmpeg_pcm(spill.name)), label, None, None, 'ffmpeg', started)
+
+    return finish(collect_pcm(ffmpeg_pcm(read_chunks(stream, header))), label, None, None, 'ffmpeg', started)
+
+def finish(samples, source_format, rate, channels, decoder, started):
+    """Record the conversion time and wrap the result"""
+    decode_ms = round((time.monotonic() - started) * 1000, 1)
+    with stats_lock:
+        stats[decoder]['files'] += 1
+        stats[decoder]['total_ms'] += decode_ms
+    return NormalizedAudio(samples, source_format, rate, channels, decoder, decode_ms)
+
+def get_stats():
+    """Get the number of files and average conversion time per decoder"""
+    with stats_lock:
+        return {
+            decoder: {
+                'files': counters['files'],
+                'avg_ms': round(counters['total_ms'] / counters['files'], 1) if counters['files'] else 0.0
+            }
+            for decoder, counters in stats.items()
+        }
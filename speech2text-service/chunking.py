@@ -0,0 +1,118 @@
+"""
+Chunking Module for Speech2Text Service
+Splits long recordings into overlapping chunks at pauses and stitches their transcripts back together
+"""
+
+import re
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from audio_frontend import TARGET_RATE
+
+# Voice activity detection works on 30 ms frames of 16 kHz audio
+FRAME_SAMPLES = TARGET_RATE * 30 // 1000
+# A frame is speech when it is this much louder than the quietest tenth of the recording, or
+# when it is at most this much quieter than the loudest tenth (for talk without pauses)...
+VAD_MARGIN_DB = 12.0
+# ...and louder than this at all
+VAD_FLOOR_DB = -50.0
+# Speech is padded by this much either side, so soft word edges are kept
+VAD_PAD_FRAMES = 10
+
+def frame_energy(samples):
+    """Energy in dBFS of each 30 ms frame of int16 samples"""
+    frames = len(samples) // FRAME_SAMPLES
+    blocks = samples[:frames * FRAME_SAMPLES].reshape(frames, FRAME_SAMPLES).astype(np.float32) / 32768.0
+    return 10 * np.log10(np.mean(blocks * blocks, axis=1) + 1e-10)
+
+def speech_frames(energy):
+    """Boolean mask of the frames holding speech, widened by VAD_PAD_FRAMES"""
+    if not len(energy):
+        return np.zeros(0, dtype=bool)
+    quiet, loud = np.percentile(energy, [10, 90])
+    threshold = max(min(quiet + VAD_MARGIN_DB, loud - VAD_MARGIN_DB), VAD_FLOOR_DB)
+    speech = energy > threshold
+    width = 2 * VAD_PAD_FRAMES + 1
+    return np.convolve(speech.astype(np.int32), np.ones(width, dtype=np.int32), mode='same') > 0
+
+def chunk_lengths(chunk_seconds, overlap_seconds, search_seconds):
+    """Chunk, overlap and search lengths in samples, with the overlap and search capped to fit the chunk"""
+    chunk = int(chunk_seconds * TARGET_RATE)
+    # Capped so every chunk moves at least a quarter of its length on
+    overlap = min(int(overlap_seconds * TARGET_RATE), chunk // 4)
+    search = max(FRAME_SAMPLES, min(int(search_seconds * TARGET_RATE), chunk - overlap - FRAME_SAMPLES))
+    return chunk, overlap, search
+
+def find_cut(energy, end, search):
+    """Sample offset of the middle of the quietest frame wholly inside the search samples before end"""
+    low = -(-(end - search) // FRAME_SAMPLES)
+    high = end // FRAME_SAMPLES
+    return (low + int(np.argmin(energy[low:high]))) * FRAME_SAMPLES + FRAME_SAMPLES // 2
+
+def has_speech(samples):
+    """Whether any frame of int16 samples holds speech"""
+    return bool(speech_frames(frame_energy(samples)).any())
+
+def plan_chunks(samples, chunk_seconds, overlap_seconds, search_seconds):
+    """
+    Sample ranges of overlapping chunks covering the speech in a recording
+
+    Leading and trailing silence is dropped. Each chunk is at most
+    chunk_seconds long and ends at the quietest frame of its last
+    search_seconds, which is a pause wherever the speaker took one. The next
+    chunk starts overlap_seconds earlier, so a word cut at a boundary without
+    a pause is whole in at least one chunk. Chunks with no speech are skipped.
+
+    Returns:
+        list: (start, end) sample offsets
+    """
+    energy = frame_energy(samples)
+    speech = speech_frames(energy)
+    if not speech.any():
+        return []
+    voiced = np.flatnonzero(speech)
+    first, last = voiced[0] * FRAME_SAMPLES, min(len(samples), (voiced[-1] + 1) * FRAME_SAMPLES)
+
+    chunk, overlap, search = chunk_lengths(chunk_seconds, overlap_seconds, search_seconds)
+
+    spans = []
+    start = first
+    while last - start > chunk:
+        cut = find_cut(energy, start + chunk, search)
+        spans.append((start, cut))
+        start = cut - overlap
+    spans.append((start, last))
+
+    return [(start, end) for start, end in spans
+            if speech[start // FRAME_SAMPLES:-(-end // FRAME_SAMPLES)].any()]
+
+def normalize_word(word):
+    """Lowercased word without punctuation, for comparing transcripts"""
+    return re.sub(r'[^\w]', '', word.lower())
+
+def stitch(texts, max_overlap_words=12):
+    """
+    Join chunk transcripts, dropping the words transcribed twice in an overlap
+
+    The longest run of matching words between the end of what has been
+    stitched so far and the start of the next transcript is taken as the
+    overlap. Words after it in the former and before it in the latter are
+    usually a word cut in half at the chunk edge, so both are dropped. Runs of
+    fewer than two words are not trusted, and the transcripts are simply
+    joined.
+    """
+    words = []
+    for text in texts:
+        following = (text or '').split()
+        if words and following:
+            tail = words[-max_overlap_words:]
+            head = following[:max_overlap_words]
+            match = SequenceMatcher(None, [normalize_word(word) for word in tail],
+                                    [normalize_word(word) for word in head],
+                                    autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+            if match.size >= 2:
+                del words[len(words) - len(tail) + match.a + match.size:]
+                following = following[match.b + match.size:]
+        words.extend(following)
+    return ' '.join(words)
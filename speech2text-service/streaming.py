@@ -0,0 +1,307 @@
+"""
+Streaming Module for Speech2Text Service
+Live transcription of audio sent as it is recorded, one chunk at a time, with partial transcripts along the way
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from audio_frontend import TARGET_RATE, AudioConversionError, encode_wav, resample, to_int16
+from chunking import chunk_lengths, find_cut, frame_energy, has_speech, stitch
+from transcription import WHISPER_WINDOW_SECONDS, TranscriptionBusy, TranscriptionError
+
+# Sample rates a stream may be recorded at
+MIN_STREAM_RATE = 8000
+MAX_STREAM_RATE = 48000
+
+class StreamClosed(Exception):
+    """Raised when audio arrives for a stream that has already finished"""
+
+class StreamSession:
+    """
+    One recording arriving as raw 16-bit little-endian PCM frames
+
+    Whenever chunk_seconds of untranscribed audio has arrived, the chunk is
+    cut at its quietest moment in the last search_seconds and queued for
+    transcription straight away, while the officer is still speaking. The
+    next chunk starts overlap_seconds before the cut, and the chunk
+    transcripts are stitched together as in Transcriber.transcribe. By the
+    time the recording finishes only the last chunk is left to transcribe.
+    """
+
+    def __init__(self, transcriber, owner, rate=TARGET_RATE, channels=1, chunk_seconds=10,
+                 overlap_seconds=2, search_seconds=3, max_seconds=300):
+        self.id = str(uuid.uuid4())
+        self.owner = owner
+        self.rate = rate
+        self.channels = channels
+        self.transcriber = transcriber
+        self.max_samples = int(max_seconds * rate)
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+
+        chunk, overlap, self._search = chunk_lengths(chunk_seconds, overlap_seconds, search_seconds)
+        # Chunk and overlap lengths at the stream's own rate
+        self._window = round(chunk * rate / TARGET_RATE)
+        self._overlap = round(overlap * rate / TARGET_RATE)
+
+        self._lock = threading.Lock()
+        # Mono samples at the stream's rate; grown by doubling, up to max_samples
+        self._buffer = np.empty(0, dtype=np.int16)
+        self._received = 0
+        # Bytes of a frame split across two writes
+        self._partial = b''
+        # Where the next chunk starts
+        self._start = 0
+        # Chunks in order: {'samples': ..., 'future': Future, or None while the queue was full}
+        self._chunks = []
+        self._finished = False
+
+    @property
+    def duration(self):
+        return self._received / self.rate
+
+    def write(self, data):
+        """
+        Add PCM bytes and queue every chunk that is complete
+
+        Raises:
+            StreamClosed: If the stream has finished
+            AudioConversionError: If the recording grows longer than max_seconds
+        """
+        with self._lock:
+            if self._finished:
+                raise StreamClosed('Stream already finished')
+            self.last_active = time.monotonic()
+            data = self._partial + data
+            frame_bytes = 2 * self.channels
+            usable = len(data) - len(data) % frame_bytes
+            self._partial = data[usable:]
+            if not usable:
+                return
+
+            frames = np.frombuffer(data[:usable], dtype='<i2').reshape(-1, self.channels)
+            samples = frames[:, 0] if self.channels == 1 else frames.mean(axis=1).astype(np.int16)
+            if self._received + len(samples) > self.max_samples:
+                raise AudioConversionError(f'Audio longer than {self.max_samples / self.rate:.0f}s')
+            self._extend(samples)
+
+            while self._received - self._start >= self._window:
+                window = self._resampled(self._start, self._start + self._window)
+                cut = find_cut(frame_energy(window), len(window), self._search)
+                self._add_chunk(window[:cut])
+                self._start += round(cut * self.rate / TARGET_RATE) - self._overlap
+            self._submit_waiting(block=False)
+
+    def status(self):
+        """Received audio, chunk progress and the transcript of the chunks done so far"""
+        with self._lock:
+            texts = []
+            for chunk in self._chunks:
+                future = chunk['future']
+                if future is None or not future.done() or future.cancelled() or future.exception():
+                    break
+                texts.append(future.result())
+            return {
+                'stream_id': self.id,
+                'received_seconds': round(self.duration, 2),
+                'chunks': len(self._chunks),
+                'chunks_done': len(texts),
+                'finished': self._finished,
+                'text': stitch(texts)
+            }
+
+    def finish(self):
+        """
+        Transcribe what is left and return the whole transcript
+
+        Returns:
+            str: The transcript, or None if nothing was said
+
+        Raises:
+            StreamClosed: If the stream has already finished
+            TranscriptionBusy: If the queue stays full for the whole timeout
+            TranscriptionError: If the backend failed or took longer than the timeout
+        """
+        with self._lock:
+            if self._finished:
+                raise StreamClosed('Stream already finished')
+            self._finished = True
+            if self._received > self._start:
+                self._add_chunk(self._resampled(self._start, self._received))
+        # Nothing is added once finished, so waiting for queue room needs no lock
+        deadline = time.monotonic() + self.transcriber.timeout
+        self._submit_waiting(block=True)
+        futures = [chunk['future'] for chunk in self._chunks]
+
+        try:
+            texts = [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+        except FutureTimeout:
+            self.cancel()
+            raise TranscriptionError(f'Transcription took longer than {self.transcriber.timeout:.0f}s')
+        return stitch(texts) or None
+
+    def wav_bytes(self):
+        """The recording so far as a mono WAV file at the stream's rate"""
+        with self._lock:
+            return encode_wav(self._buffer[:self._received], self.rate)
+
+    def cancel(self):
+        """Drop chunks that have not been transcribed yet"""
+        with self._lock:
+            self._finished = True
+            for chunk in self._chunks:
+                if chunk['future'] is not None:
+                    chunk['future'].cancel()
+
+    def _extend(self, samples):
+        needed = self._received + len(samples)
+        if needed > len(self._buffer):
+            grown = np.empty(max(needed, min(max(2 * len(self._buffer), self._window), self.max_samples)), dtype=np.int16)
+            grown[:self._received] = self._buffer[:self._received]
+            self._buffer = grown
+        self._buffer[self._received:needed] = samples
+        self._received = needed
+
+    def _resampled(self, start, end):
+        samples = self._buffer[start:end]
+        if self.rate == TARGET_RATE:
+            return samples.copy()
+        return to_int16(resample(samples.astype(np.float32) / 32768.0, self.rate))
+
+    def _add_chunk(self, samples):
+        # Silence is not worth a trip through the model, and Whisper tends to invent words for it
+        if has_speech(samples):
+            self._chunks.append({'samples': samples, 'future': None})
+
+    def _submit_waiting(self, block):
+        # Chunks turned away by a full queue are retried in order on the next write
+        for chunk in self._chunks:
+            if chunk['future'] is None:
+                try:
+                    chunk['future'] = self.transcriber.submit(chunk['samples'], block=block)
+                except TranscriptionBusy:
+                    if block:
+                        raise
+                    return
+
+class StreamRegistry:
+    """Open streams, by ID; streams left idle for idle_seconds are dropped"""
+
+    def __init__(self, transcriber, max_streams=16, idle_seconds=300, chunk_seconds=10,
+                 overlap_seconds=2, search_seconds=3, max_seconds=300):
+        self.transcriber = transcriber
+        self.max_streams = max_streams
+        self.idle_seconds = idle_seconds
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.search_seconds = search_seconds
+        self.max_seconds = max_seconds
+
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._stats = {'opened': 0, 'finished': 0, 'expired': 0, 'audio_seconds': 0.0, 'finish_seconds': 0.0}
+
+    @classmethod
+    def from_env(cls, transcriber, max_seconds=3600):
+        """
+        Create a registry configured from STREAM_* environment variables
+
+        Every open stream holds its whole recording, so streams have their own
+        length limit, STREAM_MAX_SECONDS, well below the max_seconds allowed
+        for uploads: 5 minutes at 48 kHz is under 30 MB per stream.
+        """
+        def env_number(name, default, cast=int):
+            try:
+                return cast(os.getenv(name, default))
+            except ValueError:
+                return default
+
+        return cls(
+            transcriber,
+            max_streams=max(1, env_number('STREAM_MAX_SESSIONS', 16)),
+            idle_seconds=max(10.0, env_number('STREAM_IDLE_SECONDS', 300, float)),
+            # Shorter than whole-recording chunks, so partial transcripts keep up with the speaker
+            chunk_seconds=min(WHISPER_WINDOW_SECONDS, max(5.0, env_number('STREAM_CHUNK_SECONDS', 10, float))),
+            overlap_seconds=max(0.0, env_number('STREAM_CHUNK_OVERLAP_SECONDS', 2, float)),
+            search_seconds=max(0.0, env_number('STREAM_CHUNK_SEARCH_SECONDS', 3, float)),
+            max_seconds=min(max_seconds, max(10.0, env_number('STREAM_MAX_SECONDS', 300, float)))
+        )
+
+    def open(self, owner, rate=TARGET_RATE, channels=1):
+        """
+        Start a stream
+
+        Raises:
+            ValueError: If the rate or channel count is not supported
+            TranscriptionBusy: If max_streams streams are already open
+        """
+        if not MIN_STREAM_RATE <= rate <= MAX_STREAM_RATE:
+            raise ValueError(f'Sample rate must be between {MIN_STREAM_RATE} and {MAX_STREAM_RATE} Hz')
+        if channels not in (1, 2):
+            raise ValueError('Streams must have 1 or 2 channels')
+
+        with self._lock:
+            self._expire()
+            if len(self._streams) >= self.max_streams:
+                raise TranscriptionBusy('Too many open streams')
+            session = StreamSession(self.transcriber, owner, rate, channels, self.chunk_seconds,
+                                    self.overlap_seconds, self.search_seconds, self.max_seconds)
+            self._streams[session.id] = session
+            self._stats['opened'] += 1
+        return session
+
+    def get(self, stream_id, owner):
+        """The open stream with this ID started by owner, or None"""
+        with self._lock:
+            self._expire()
+            session = self._streams.get(stream_id)
+        return session if session is not None and session.owner == owner else None
+
+    def finish(self, session):
+        """Finish a stream (see StreamSession.finish) and forget it"""
+        started = time.monotonic()
+        try:
+            return session.finish()
+        finally:
+            self.close(session)
+            with self._lock:
+                self._stats['finished'] += 1
+                self._stats['audio_seconds'] += session.duration
+                self._stats['finish_seconds'] += time.monotonic() - started
+
+    def close(self, session):
+        """Forget a stream, dropping its untranscribed chunks"""
+        session.cancel()
+        with self._lock:
+            self._streams.pop(session.id, None)
+
+    def get_stats(self):
+        """Open streams and how long finishing a stream took"""
+        with self._lock:
+            stats = dict(self._stats)
+            open_streams = len(self._streams)
+        return {
+            'open': open_streams,
+            'max_streams': self.max_streams,
+            'chunk_seconds': self.chunk_seconds,
+            'opened': stats['opened'],
+            'finished': stats['finished'],
+            'expired': stats['expired'],
+            'audio_seconds': round(stats['audio_seconds'], 1),
+            # Time from the end of the recording to the full transcript
+            'avg_finish_ms': round(stats['finish_seconds'] / stats['finished'] * 1000, 1) if stats['finished'] else None
+        }
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for stream_id, session in list(self._streams.items()):
+            if session.last_active < cutoff:
+                session.cancel()
+                del self._streams[stream_id]
+                self._stats['expired'] += 1
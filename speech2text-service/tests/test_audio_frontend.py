@@ -0,0 +1,65 @@
+import io
+import os
+import struct
+import wave
+import numpy as np
+import pytest
+import audio_frontend
+from audio_frontend import TARGET_RATE, AudioConversionError, load_audio, parse_aiff, parse_wav, resample
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'test-data')
+
+def test_report_wav_and_aiff_decode_alike():
+    """Test that both test recordings decode in process to the same 16 kHz samples"""
+    wav = load_audio(os.path.join(TEST_DATA, 'traffic-offence-report.wav'))
+    aiff = load_audio(os.path.join(TEST_DATA, 'traffic-offence-report.aiff'))
+
+    assert wav.decoder == aiff.decoder == 'in-process'
+    assert (wav.source_format, aiff.source_format) == ('wav', 'aiff')
+    assert wav.duration == pytest.approx(21.87, abs=0.01)
+    assert np.array_equal(wav.samples, aiff.samples)
+
+def test_24_bit_stereo_wav_and_aiff(tmp_path):
+    """Test that 24-bit samples keep their sign in either byte order"""
+    frames = np.array([[0, 1], [-1, 8388607], [-8388608, 4096]], dtype=np.int32)
+    little = b''.join(int(v).to_bytes(3, 'little', signed=True) for v in frames.ravel())
+    path = tmp_path / 'stereo.wav'
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(3)
+        f.setframerate(44100)
+        f.writeframes(little)
+    samples, rate = parse_wav(path.read_bytes())
+    assert rate == 44100
+    assert np.allclose(samples * 8388608, frames)
+
+    # 44100 Hz as an 80-bit extended float
+    big = b''.join(int(v).to_bytes(3, 'big', signed=True) for v in frames.ravel())
+    comm = struct.pack('>hIh', 2, 3, 24) + bytes.fromhex('400eac44000000000000')
+    ssnd = struct.pack('>II', 0, 0) + big
+    body = b'AIFF' + b'COMM' + struct.pack('>I', len(comm)) + comm + b'SSND' + struct.pack('>I', len(ssnd)) + ssnd
+    samples, rate = parse_aiff(b'FORM' + struct.pack('>I', len(body)) + body)
+    assert rate == 44100
+    assert np.allclose(samples * 8388608, frames)
+
+@pytest.mark.parametrize('rate', [8000, 22050, 44100, 48000])
+def test_resample_keeps_tone(rate):
+    """Test that resampling keeps the length and a pure tone"""
+    tone = np.sin(2 * np.pi * 440 * np.arange(rate) / rate).astype(np.float32)
+    resampled = resample(tone, rate)
+    expected = np.sin(2 * np.pi * 440 * np.arange(TARGET_RATE) / TARGET_RATE)
+
+    assert len(resampled) == TARGET_RATE
+    assert np.max(np.abs(resampled[1000:-1000] - expected[1000:-1000])) < 0.01
+
+def test_stream_input_and_length_limit(monkeypatch):
+    """Test that uploads are read from their stream and overlong audio is refused"""
+    with open(os.path.join(TEST_DATA, 'traffic-offence-report.wav'), 'rb') as f:
+        data = f.read()
+    audio = load_audio(io.BytesIO(data), 'report.wav')
+    assert audio.decoder == 'in-process'
+    assert audio.duration == pytest.approx(21.87, abs=0.01)
+
+    monkeypatch.setattr(audio_frontend, 'MAX_SECONDS', 10)
+    with pytest.raises(AudioConversionError):
+        load_audio(io.BytesIO(data), 'report.wav')
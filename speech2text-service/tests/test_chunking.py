@@ -0,0 +1,43 @@
+import numpy as np
+from chunking import FRAME_SAMPLES, frame_energy, plan_chunks, stitch
+
+RATE = 16000
+
+def speech_with_pauses(seconds_between_pauses, pauses):
+    """Noise bursts standing in for speech, separated by half-second silences"""
+    rng = np.random.default_rng(3)
+    parts = [np.zeros(RATE, np.int16)]
+    for _ in range(pauses + 1):
+        parts.append((rng.standard_normal(seconds_between_pauses * RATE) * 3000).astype(np.int16))
+        parts.append(np.zeros(RATE // 2, np.int16))
+    return np.concatenate(parts)
+
+def test_chunks_end_at_pauses_and_overlap():
+    """Test that chunks stay within the limit, cut in silence and overlap by the set amount"""
+    samples = speech_with_pauses(8, 9)
+    spans = plan_chunks(samples, chunk_seconds=28, overlap_seconds=2, search_seconds=6)
+    energy = frame_energy(samples)
+
+    assert len(spans) > 1
+    # Leading silence is skipped
+    assert spans[0][0] >= RATE - FRAME_SAMPLES * 11
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert end - start <= 28 * RATE
+        assert energy[end // FRAME_SAMPLES] < -80
+        assert end - next_start == 2 * RATE
+
+def test_silence_has_no_chunks():
+    """Test that a silent recording yields nothing to transcribe"""
+    assert plan_chunks(np.zeros(60 * RATE, np.int16), 28, 2, 6) == []
+
+def test_stitch_drops_repeated_and_cut_words():
+    """Test that overlapping words appear once and half-heard edge words are dropped"""
+    texts = [
+        'Driver name is James Smith he is a mal',
+        'Smith he is a male born 12/02/2000. Address 1, High',
+        'Address 1, High Street, Slough.'
+    ]
+    assert stitch(texts) == 'Driver name is James Smith he is a male born 12/02/2000. Address 1, High Street, Slough.'
+    # Without a common run of words the transcripts are simply joined
+    assert stitch(['Vehicle is a blue BMW.', 'Offence is No Seat Belt.', '']) == \
+        'Vehicle is a blue BMW. Offence is No Seat Belt.'
@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+import pytest
+from audio_frontend import AudioConversionError
+from streaming import StreamClosed, StreamRegistry
+from transcription import Transcriber
+
+class LengthBackend:
+    """Backend that transcribes each chunk as its length in samples"""
+
+    name = 'length'
+    batches = True
+
+    def __init__(self):
+        self.lengths = []
+
+    def load(self):
+        pass
+
+    def describe(self):
+        return {'backend': self.name}
+
+    def transcribe_batch(self, recordings):
+        self.lengths.extend(len(samples) for samples in recordings)
+        return [str(len(samples)) for samples in recordings]
+
+def speech(rate, channels, seconds):
+    """Noise bursts standing in for speech, with a 300 ms pause every two seconds"""
+    rng = np.random.default_rng(5)
+    samples = (rng.standard_normal((seconds * rate, channels)) * 3000).astype(np.int16)
+    for pause in range(2 * rate, len(samples), 2 * rate):
+        samples[pause - rate * 3 // 10:pause] = 0
+    return samples
+
+@pytest.mark.parametrize('rate, channels', [(16000, 1), (44100, 2)])
+def test_chunks_are_transcribed_while_streaming(rate, channels):
+    """Test that complete chunks are transcribed before the stream ends, at 16 kHz"""
+    backend = LengthBackend()
+    registry = StreamRegistry(Transcriber(backend, batch_wait_ms=0), chunk_seconds=10, overlap_seconds=2, search_seconds=3)
+    session = registry.open('officer', rate, channels)
+    data = speech(rate, channels, 25).tobytes()
+    # Odd-sized writes split frames between calls
+    for offset in range(0, len(data), 9999):
+        session.write(data[offset:offset + 9999])
+
+    for _ in range(100):
+        status = session.status()
+        if status['chunks_done'] == status['chunks']:
+            break
+        threading.Event().wait(0.01)
+    assert status['received_seconds'] == pytest.approx(25, abs=0.01)
+    assert status['chunks_done'] >= 2 and status['text']
+
+    # Only the rest of the recording is left once it ends
+    text = registry.finish(session)
+    assert len(backend.lengths) == status['chunks'] + 1
+    assert all(length <= 10 * 16000 for length in backend.lengths)
+    assert text == ' '.join(str(length) for length in backend.lengths)
+    assert text.startswith(status['text'])
+    assert registry.get(session.id, 'officer') is None
+    assert registry.get_stats()['finished'] == 1
+
+def test_finished_stream_refuses_audio():
+    """Test that a stream takes no audio once finished and is private to its owner"""
+    registry = StreamRegistry(Transcriber(LengthBackend(), batch_wait_ms=0))
+    session = registry.open('officer')
+    assert registry.get(session.id, 'someone else') is None
+
+    session.write(speech(16000, 1, 3).tobytes())
+    assert registry.finish(session) == '48000'
+    with pytest.raises(StreamClosed):
+        session.write(b'\0\0')
+
+def test_stream_length_limit():
+    """Test that a stream refuses audio beyond its own limit and never buffers more"""
+    registry = StreamRegistry(Transcriber(LengthBackend(), batch_wait_ms=0), max_seconds=12)
+    session = registry.open('officer', 48000)
+    session.write(speech(48000, 1, 11).tobytes())
+    with pytest.raises(AudioConversionError):
+        session.write(speech(48000, 1, 2).tobytes())
+    assert session.status()['received_seconds'] == 11
+    assert len(session._buffer) <= 12 * 48000
+    registry.close(session)
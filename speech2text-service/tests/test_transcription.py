@@ -0,0 +1,80 @@
+import threading
+import numpy as np
+import pytest
+from transcription import Transcriber, TranscriptionBusy, pack_clips
+
+class RecordingBackend:
+    """Backend that reports each recording's length and remembers its batches"""
+
+    name = 'recording'
+    batches = True
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.release = threading.Event()
+
+    def load(self):
+        pass
+
+    def describe(self):
+        return {'backend': self.name}
+
+    def transcribe_batch(self, recordings):
+        self.release.wait(5)
+        self.batch_sizes.append(len(recordings))
+        return [f'{len(samples)} samples' for samples in recordings]
+
+def transcribe_in_threads(transcriber, lengths):
+    results = {}
+    threads = [threading.Thread(target=lambda n=n: results.setdefault(n, transcriber.transcribe(np.zeros(n, np.int16))))
+               for n in lengths]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_queued_requests_are_batched():
+    """Test that requests arriving together share a backend call and are measured"""
+    backend = RecordingBackend()
+    transcriber = Transcriber(backend, batch_size=4, batch_wait_ms=200)
+    threads, results = transcribe_in_threads(transcriber, [16000, 32000, 48000])
+    backend.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == {16000: '16000 samples', 32000: '32000 samples', 48000: '48000 samples'}
+    assert sum(backend.batch_sizes) == 3 and len(backend.batch_sizes) < 3
+    stats = transcriber.get_stats()
+    assert stats['requests'] == 3
+    assert stats['audio_seconds'] == 6.0
+    assert stats['rtf'] is not None
+
+def test_full_queue_rejects():
+    """Test that requests beyond the queue size are turned away instead of waiting"""
+    backend = RecordingBackend()
+    transcriber = Transcriber(backend, queue_size=1, batch_size=1, batch_wait_ms=0)
+    threads, _ = transcribe_in_threads(transcriber, [100, 200])
+    # One request is being transcribed and one is queued, so the queue is full
+    for _ in range(100):
+        if transcriber.get_stats()['queue_depth'] == 1:
+            break
+        threading.Event().wait(0.01)
+
+    with pytest.raises(TranscriptionBusy):
+        transcriber.transcribe(np.zeros(300, np.int16))
+    backend.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert transcriber.get_stats()['rejected'] == 1
+
+def test_pack_clips_starts_on_whole_seconds():
+    """Test that every clip starts on a whole second and maps back to its recording"""
+    timeline, clip_timestamps, start_frames, owners = pack_clips([
+        [np.ones(8000, np.float32)],
+        [np.ones(20000, np.float32), np.ones(16000, np.float32)]
+    ])
+
+    assert clip_timestamps == [{'start': 0, 'end': 8000}, {'start': 16000, 'end': 36000},
+                               {'start': 48000, 'end': 64000}]
+    assert start_frames == [0, 100, 300]
+    assert owners == [0, 1, 1]
+    assert len(timeline) == 64000 and timeline[8000:16000].sum() == 0
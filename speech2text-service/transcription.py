@@ -0,0 +1,435 @@
+"""
+Transcription Module for Speech2Text Service
+Pluggable speech-to-text backends behind a bounded, batching request queue with real-time factor metrics
+"""
+
+import os
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from audio_frontend import TARGET_RATE, encode_wav
+from chunking import plan_chunks, stitch
+
+# Whisper decodes 30 second windows; clips handed to it must fit in one
+WHISPER_WINDOW_SECONDS = 30
+# Whisper's 10 ms feature frames: segment positions are reported in these
+FRAMES_PER_SECOND = 100
+
+class TranscriptionBusy(Exception):
+    """Raised when the transcription queue is full"""
+
+class TranscriptionError(RuntimeError):
+    """Raised when a backend cannot transcribe"""
+
+class OllamaWhisperBackend:
+    """Transcription through Ollama, one request per recording"""
+
+    name = 'ollama'
+    # Ollama takes one recording per call; concurrency comes from the workers
+    batches = False
+
+    def __init__(self, ollama, model='whisper:latest', timeout=120):
+        self.ollama = ollama
+        self.model = model
+        self.timeout = timeout
+
+    def load(self):
+        """Nothing to load: the model lives in Ollama"""
+
+    def describe(self):
+        return {'backend': self.name, 'model': self.model}
+
+    def transcribe_batch(self, recordings):
+        """Transcribe int16 16 kHz recordings one by one; None where Ollama returned nothing usable"""
+        return [self.transcribe(samples) for samples in recordings]
+
+    def transcribe(self, samples):
+        import base64
+        audio_b64 = base64.b64encode(encode_wav(samples, TARGET_RATE)).decode('utf-8')
+        response = self.ollama.generate(
+            {
+                "model": self.model,
+                "prompt": "Transcribe this audio file:",
+                "audio": audio_b64,
+                "stream": False
+            },
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            print(f"DEBUG: Whisper model not available or failed: {response.status_code}", flush=True)
+            return None
+        transcription = response.json().get('response', '').strip()
+        # Shorter answers have been model chatter rather than transcripts
+        return transcription if len(transcription) > 10 else None
+
+def pack_clips(recordings_clips):
+    """
+    Lay the clips of several recordings out on one timeline for a batched call
+
+    Each clip starts on a whole second, so the frame position Whisper reports
+    for its segments identifies the clip exactly.
+
+    Args:
+        recordings_clips: Per recording, a list of float32 clip arrays
+
+    Returns:
+        tuple: (timeline, clip_timestamps in samples, clip start frames, recording index per clip)
+    """
+    starts, owners, position = [], [], 0
+    for index, clips in enumerate(recordings_clips):
+        for clip in clips:
+            starts.append(position)
+            owners.append(index)
+            position += -(-len(clip) // TARGET_RATE) * TARGET_RATE
+
+    timeline = np.zeros(position, dtype=np.float32)
+    clip_timestamps = []
+    clips = [clip for clips in recordings_clips for clip in clips]
+    for start, clip in zip(starts, clips):
+        timeline[start:start + len(clip)] = clip
+        clip_timestamps.append({'start': start, 'end': start + len(clip)})
+    start_frames = [start * FRAMES_PER_SECOND // TARGET_RATE for start in starts]
+    return timeline, clip_timestamps, start_frames, owners
+
+class FasterWhisperBackend:
+    """
+    Local CPU transcription with faster-whisper (CTranslate2), model kept in memory
+
+    A batch of recordings is transcribed in one BatchedInferencePipeline call:
+    recordings up to 30 s are one clip each, longer ones are split at pauses
+    by faster-whisper's Silero VAD, and all clips are encoded and decoded
+    batch_size at a time.
+    """
+
+    name = 'faster-whisper'
+    batches = True
+
+    def __init__(self, model_size='base', device='cpu', compute_type='int8', cpu_threads=0, workers=1,
+                 batch_size=8, beam_size=5, language='en', download_root=None):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.workers = workers
+        self.batch_size = batch_size
+        self.beam_size = beam_size
+        self.language = language or None
+        self.download_root = download_root
+        self.pipeline = None
+
+    def load(self):
+        """Load the model, downloading it on first use, and run it once so the first request isn't slower"""
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+        model = WhisperModel(self.model_size, device=self.device, compute_type=self.compute_type,
+                             cpu_threads=self.cpu_threads, num_workers=self.workers,
+                             download_root=self.download_root)
+        self.pipeline = BatchedInferencePipeline(model)
+        self.transcribe_batch([np.zeros(TARGET_RATE, dtype=np.int16)])
+
+    def describe(self):
+        return {'backend': self.name, 'model': self.model_size, 'compute_type': self.compute_type,
+                'language': self.language}
+
+    def split(self, samples):
+        """Clips of one recording, each within a Whisper window"""
+        if len(samples) <= WHISPER_WINDOW_SECONDS * TARGET_RATE:
+            return [samples]
+        from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+        options = VadOptions(max_speech_duration_s=WHISPER_WINDOW_SECONDS, min_silence_duration_ms=160)
+        regions = merge_segments(get_speech_timestamps(samples, options), options)
+        return [samples[region['start']:region['end']] for region in regions]
+
+    def transcribe_batch(self, recordings):
+        """Transcribe int16 16 kHz recordings in one batched call"""
+        recordings_clips = [[clip for clip in self.split(samples.astype(np.float32) / 32768.0) if len(clip)]
+                            for samples in recordings]
+        texts = [[] for _ in recordings]
+        if not any(recordings_clips):
+            return [''] * len(recordings)
+
+        timeline, clip_timestamps, start_frames, owners = pack_clips(recordings_clips)
+        segments, _ = self.pipeline.transcribe(timeline, language=self.language, beam_size=self.beam_size,
+                                               batch_size=self.batch_size, clip_timestamps=clip_timestamps,
+                                               without_timestamps=True)
+        for segment in segments:
+            clip = max(0, bisect_right(start_frames, segment.seek) - 1)
+            texts[owners[clip]].append(segment.text.strip())
+        return [' '.join(text for text in parts if text) for parts in texts]
+
+class Transcriber:
+    """
+    Serves transcriptions from one resident backend through a bounded queue
+
+    Requests wait in a queue of queue_size; when it is full transcribe()
+    raises TranscriptionBusy instead of piling up work. Each worker thread
+    takes the next request plus whatever else arrives within batch_wait_ms,
+    up to batch_size, and hands them to the backend together. The model is
+    loaded once, in the background, when start() is called; requests queued
+    before it is ready wait for it. If it fails to load, the fallback backend
+    (Ollama) takes over.
+    """
+
+    def __init__(self, backend, fallback=None, queue_size=32, batch_size=8, batch_wait_ms=50,
+                 workers=1, timeout=300, chunk_seconds=28, overlap_seconds=2, search_seconds=6):
+        self.backend = backend
+        self.fallback = fallback
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.workers = workers
+        self.timeout = timeout
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.search_seconds = search_seconds
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._started = False
+        self._state = 'stopped'
+        self._load_seconds = None
+        # Real-time factor of recent batches: processing time over audio length
+        self._recent_rtf = deque(maxlen=200)
+        self._stats = {
+            'requests': 0, 'batches': 0, 'failed': 0, 'rejected': 0,
+            'audio_seconds': 0.0, 'processing_seconds': 0.0, 'queue_seconds': 0.0,
+            'chunked_recordings': 0, 'chunks': 0, 'chunked_audio_seconds': 0.0, 'chunked_wall_seconds': 0.0
+        }
+
+    @classmethod
+    def from_env(cls, ollama):
+        """Create a transcriber configured from TRANSCRIPTION_* and WHISPER_* environment variables"""
+        def env_number(name, default, cast=int):
+            try:
+                return cast(os.getenv(name, default))
+            except ValueError:
+                return default
+
+        workers = max(1, env_number('TRANSCRIPTION_WORKERS', 1))
+        # 0 turns chunking off; otherwise between 5 s and Whisper's 30 s window
+        chunk_seconds = env_number('TRANSCRIPTION_CHUNK_SECONDS', 28, float)
+        chunk_seconds = min(WHISPER_WINDOW_SECONDS, max(5.0, chunk_seconds)) if chunk_seconds > 0 else 0
+        batch_size = max(1, env_number('TRANSCRIPTION_BATCH_SIZE', 8))
+        ollama_backend = OllamaWhisperBackend(ollama, os.getenv('OLLAMA_WHISPER_MODEL', 'whisper:latest'),
+                                              timeout=env_number('OLLAMA_WHISPER_TIMEOUT', 120, float))
+        if os.getenv('TRANSCRIPTION_BACKEND', 'faster-whisper').lower() == 'ollama':
+            backend, fallback = ollama_backend, None
+        else:
+            backend = FasterWhisperBackend(
+                model_size=os.getenv('WHISPER_MODEL', 'base'),
+                device=os.getenv('WHISPER_DEVICE', 'cpu'),
+                compute_type=os.getenv('WHISPER_COMPUTE_TYPE', 'int8'),
+                cpu_threads=max(0, env_number('WHISPER_CPU_THREADS', 0)),
+                workers=workers,
+                batch_size=batch_size,
+                beam_size=max(1, env_number('WHISPER_BEAM_SIZE', 5)),
+                language=os.getenv('WHISPER_LANGUAGE', 'en'),
+                download_root=os.getenv('WHISPER_DOWNLOAD_ROOT', '/app/models')
+            )
+            fallback = ollama_backend
+
+        return cls(
+            backend,
+            fallback=fallback,
+            queue_size=max(1, env_number('TRANSCRIPTION_QUEUE_SIZE', 32)),
+            batch_size=batch_size,
+            batch_wait_ms=max(0.0, env_number('TRANSCRIPTION_BATCH_WAIT_MS', 50, float)),
+            workers=workers,
+            timeout=max(1.0, env_number('TRANSCRIPTION_TIMEOUT', 300, float)),
+            chunk_seconds=chunk_seconds,
+            overlap_seconds=max(0.0, env_number('TRANSCRIPTION_CHUNK_OVERLAP_SECONDS', 2, float)),
+            search_seconds=max(0.0, env_number('TRANSCRIPTION_CHUNK_SEARCH_SECONDS', 6, float))
+        )
+
+    def start(self):
+        """Load the backend in the background and start the workers; later calls do nothing"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._state = 'loading'
+        threading.Thread(target=self._load, name='transcription-loader', daemon=True).start()
+        for number in range(self.workers):
+            threading.Thread(target=self._run, name=f'transcription-worker-{number}', daemon=True).start()
+
+    def submit(self, samples, block=False):
+        """
+        Queue int16 16 kHz mono samples for transcription
+
+        Args:
+            block: Wait up to the timeout for room in the queue instead of failing at once
+
+        Returns:
+            Future: Resolves to the transcript, or None if the backend returned nothing usable
+
+        Raises:
+            TranscriptionBusy: If the queue is full
+        """
+        self.start()
+        job = {'samples': samples, 'future': Future(), 'queued_at': time.monotonic()}
+        try:
+            if block:
+                self._queue.put(job, timeout=self.timeout)
+            else:
+                self._queue.put_nowait(job)
+        except queue.Full:
+            self._count('rejected')
+            raise TranscriptionBusy('Transcription queue full')
+        return job['future']
+
+    def transcribe(self, samples):
+        """
+        Transcribe int16 16 kHz mono samples
+
+        Recordings longer than chunk_seconds are split into overlapping chunks
+        at pauses (see chunking.plan_chunks). All chunks are queued at once,
+        so the workers and batches transcribe them in parallel, and the chunk
+        transcripts are stitched back together without the overlaps.
+
+        Returns:
+            str: The transcript, or None if the backend returned nothing usable
+
+        Raises:
+            TranscriptionBusy: If the queue is full
+            TranscriptionError: If the backend failed or took longer than the timeout
+        """
+        started = time.monotonic()
+        if not self.chunk_seconds or len(samples) <= self.chunk_seconds * TARGET_RATE:
+            return self._result(self.submit(samples), started + self.timeout)
+
+        spans = plan_chunks(samples, self.chunk_seconds, self.overlap_seconds, self.search_seconds)
+        futures = []
+        try:
+            # Only the first chunk is refused outright when the queue is full; the
+            # rest wait their turn, so a recording is not dropped halfway through
+            for start, end in spans:
+                futures.append(self.submit(samples[start:end], block=bool(futures)))
+            texts = [self._result(future, started + self.timeout) for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+        wall = time.monotonic() - started
+        with self._lock:
+            self._stats['chunked_recordings'] += 1
+            self._stats['chunks'] += len(spans)
+            self._stats['chunked_audio_seconds'] += len(samples) / TARGET_RATE
+            self._stats['chunked_wall_seconds'] += wall
+        return stitch(texts) or None
+
+    def _result(self, future, deadline):
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # A job that hasn't started yet is skipped by the workers
+            future.cancel()
+            raise TranscriptionError(f'Transcription took longer than {self.timeout:.0f}s')
+
+    def get_stats(self):
+        """Get backend state, queue depth and real-time factor metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            recent = sorted(self._recent_rtf)
+        audio_seconds = stats['audio_seconds']
+        return {
+            **self.backend.describe(),
+            'state': self._state,
+            'load_seconds': self._load_seconds,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self._queue.maxsize,
+            'batch_size': self.batch_size,
+            'workers': self.workers,
+            'requests': stats['requests'],
+            'batches': stats['batches'],
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'audio_seconds': round(audio_seconds, 1),
+            'processing_seconds': round(stats['processing_seconds'], 1),
+            'avg_queue_ms': round(stats['queue_seconds'] / stats['requests'] * 1000, 1) if stats['requests'] else 0.0,
+            # Below 1 is faster than real time
+            'rtf': round(stats['processing_seconds'] / audio_seconds, 3) if audio_seconds else None,
+            'rtf_p50': round(recent[len(recent) // 2], 3) if recent else None,
+            'rtf_p90': round(recent[int(len(recent) * 0.9)], 3) if recent else None,
+            'chunked_recordings': stats['chunked_recordings'],
+            'chunks': stats['chunks'],
+            # Wall-clock time over audio length for chunked recordings, queueing included
+            'chunked_rtf': round(stats['chunked_wall_seconds'] / stats['chunked_audio_seconds'], 3)
+            if stats['chunked_audio_seconds'] else None
+        }
+
+    def _load(self):
+        started = time.monotonic()
+        try:
+            self.backend.load()
+            self._state = 'ready'
+            print(f"Transcription backend ready: {self.backend.describe()}", flush=True)
+        except Exception as e:
+            if self.fallback is None:
+                self._state = 'failed'
+                print(f"Transcription backend failed to load: {e}", flush=True)
+            else:
+                print(f"Transcription backend {self.backend.name} failed to load ({e}), using {self.fallback.name}", flush=True)
+                self.backend = self.fallback
+                self._state = 'fallback'
+        self._load_seconds = round(time.monotonic() - started, 1)
+        self._ready.set()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            limit = self.batch_size if self.backend.batches else 1
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < limit:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Skip requests whose caller already gave up
+            batch = [job for job in batch if job['future'].set_running_or_notify_cancel()]
+            if batch:
+                self._ready.wait()
+                self._process(batch)
+
+    def _process(self, batch):
+        started = time.monotonic()
+        if self._state == 'failed':
+            error = TranscriptionError('Transcription backend failed to load')
+            for job in batch:
+                job['future'].set_exception(error)
+            self._count('failed', len(batch))
+            return
+
+        try:
+            texts = self.backend.transcribe_batch([job['samples'] for job in batch])
+        except Exception as e:
+            print(f"Transcription batch of {len(batch)} failed: {e}", flush=True)
+            for job in batch:
+                job['future'].set_exception(TranscriptionError(str(e)))
+            self._count('failed', len(batch))
+            return
+
+        processing = time.monotonic() - started
+        audio_seconds = sum(len(job['samples']) for job in batch) / TARGET_RATE
+        with self._lock:
+            self._stats['requests'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['audio_seconds'] += audio_seconds
+            self._stats['processing_seconds'] += processing
+            self._stats['queue_seconds'] += sum(started - job['queued_at'] for job in batch)
+            if audio_seconds:
+                self._recent_rtf.append(processing / audio_seconds)
+        for job, text in zip(batch, texts):
+            job['future'].set_result(text)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the speech2text audio front end: fork-per-request ffmpeg vs. in-process decoding
+
+Converts test-data/traffic-offence-report.wav and .aiff (plus a synthetic
+48 kHz stereo WAV) to 16 kHz mono the way the service did before, with an
+ffprobe, an ffmpeg and another ffprobe process per file, and with
+speech2text-service/audio_frontend.py. Reports the median time per file and,
+where ffmpeg is installed, how closely the two outputs agree. Resampling
+accuracy is also checked on pure tones, which needs no ffmpeg. Needs no
+services.
+
+Usage:
+    python tests/benchmark_audio_frontend.py
+    python tests/benchmark_audio_frontend.py --runs 50 path/to/recording.wav
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'speech2text-service'))
+from audio_frontend import TARGET_RATE, load_audio, parse_wav, resample  # noqa: E402
+
+def fork_per_request(path, workdir):
+    """The former conversion: probe the format, convert with ffmpeg, probe the duration"""
+    output = os.path.join(workdir, 'processed.wav')
+    if path.lower().endswith('.wav'):
+        subprocess.run(['ffprobe', '-v', 'quiet', '-select_streams', 'a:0', '-show_entries',
+                        'stream=sample_rate,channels', '-of', 'csv=p=0', path], capture_output=True, text=True)
+    subprocess.run(['ffmpeg', '-i', path, '-ar', str(TARGET_RATE), '-ac', '1', '-y', output],
+                   capture_output=True, text=True, check=True)
+    with open(output, 'rb') as f:
+        data = f.read()
+    subprocess.run(['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', output],
+                   capture_output=True, text=True)
+    return data
+
+def timed(func, runs):
+    """Median milliseconds per call and the last result"""
+    result, times = None, []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+def synthetic_stereo(path, seconds=20, rate=48000):
+    """A 48 kHz stereo 16-bit WAV of speech-band tones and noise"""
+    t = np.arange(seconds * rate) / rate
+    rng = np.random.default_rng(7)
+    left = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    right = 0.3 * np.sin(2 * np.pi * 330 * t) + 0.05 * rng.standard_normal(len(t))
+    frames = np.clip(np.stack([left, right], axis=1) * 32767, -32768, 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(frames.tobytes())
+
+def tone_snr(rate, frequency=1000.0):
+    """Signal-to-error ratio in dB of a resampled pure tone against the exact tone"""
+    x = np.sin(2 * np.pi * frequency * np.arange(rate * 2) / rate).astype(np.float32)
+    y = resample(x, rate)
+    exact = np.sin(2 * np.pi * frequency * np.arange(len(y)) / TARGET_RATE)
+    # Leave out the filter's ramp at either end
+    middle = slice(TARGET_RATE // 10, -TARGET_RATE // 10)
+    error = y[middle] - exact[middle]
+    return 10 * np.log10(np.sum(exact[middle] ** 2) / np.sum(error ** 2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='Audio files (default: the traffic offence report test files)')
+    parser.add_argument('--runs', type=int, default=20, help='Conversions timed per file and path')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='audio_benchmark_')
+    try:
+        files = args.files or [
+            os.path.join(ROOT, 'test-data', 'traffic-offence-report.wav'),
+            os.path.join(ROOT, 'test-data', 'traffic-offence-report.aiff')
+        ]
+        if not args.files:
+            files.append(os.path.join(workdir, 'synthetic-48k-stereo.wav'))
+            synthetic_stereo(files[-1])
+        have_ffmpeg = shutil.which('ffmpeg') and shutil.which('ffprobe')
+        if not have_ffmpeg:
+            print("⚠️  ffmpeg/ffprobe not found: timing the in-process path only")
+
+        print(f"\n⏱️  Median ms per file over {args.runs} runs")
+        print(f"   {'file':<34} {'source':>16} {'fork/request':>13} {'in-process':>11} {'speedup':>8} {'agreement':>10}")
+        for path in files:
+            in_process_ms, audio = timed(lambda: load_audio(path).wav_bytes, args.runs)
+            converted = load_audio(path)
+            source = f"{converted.source_rate} Hz/{converted.source_channels} ch" if converted.source_rate else converted.decoder
+            fork_ms = speedup = agreement = '-'
+            if have_ffmpeg:
+                fork, ffmpeg_wav = timed(lambda: fork_per_request(path, workdir), args.runs)
+                fork_ms, speedup = f"{fork:.1f}", f"{fork / in_process_ms:.1f}x"
+                # Correlation of the two 16 kHz outputs over their common length
+                reference = parse_wav(ffmpeg_wav)[0][:, 0]
+                ours = parse_wav(audio)[0][:, 0]
+                length = min(len(reference), len(ours))
+                agreement = f"{np.corrcoef(reference[:length], ours[:length])[0, 1]:.4f}"
+            print(f"   {os.path.basename(path)[:34]:<34} {source:>16} {fork_ms:>13} {in_process_ms:11.1f} {speedup:>8} {agreement:>10}")
+
+        print("\n🎯 Resampling accuracy on a 1 kHz tone (dB signal to error)")
+        for rate in (8000, 11025, 22050, 44100, 48000):
+            print(f"   {rate:>6} Hz -> {TARGET_RATE} Hz: {tone_snr(rate):5.1f} dB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark of vision model payload size and extraction accuracy across image preprocessing settings
+
+For every image and setting it reports the base64 payload size, preprocessing
+time and, unless --skip-model is given, the model latency and how many
+extracted fields agree with the result for the original image.
+
+Usage:
+    python tests/benchmark_image_preprocessing.py photo1.jpg photo2.jpg
+    python tests/benchmark_image_preprocessing.py --settings 512:80,1024:85 --skip-model images/
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+import requests
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'car-identifier-service'))
+from image_preprocessor import ImagePreprocessor  # noqa: E402
+
+PROMPT = """
+Analyze this vehicle image and extract the following information in this exact format:
+
+- Vehicle Registration: [license plate number if visible]
+- Vehicle Make: [car manufacturer/brand, e.g., BMW, Toyota, Ford]
+- Vehicle Color: [primary vehicle color, e.g., Blue, Red, Black]
+- Vehicle Model: [car model/series, e.g., 320i, Camry, Focus]
+
+Only include fields that you can clearly identify from the image. If information is not visible or unclear, omit that field.
+"""
+
+def parse_settings(value):
+    """Parse '512:80,1024:85,original' into (label, preprocessor) pairs"""
+    settings = [('original', ImagePreprocessor(enabled=False))]
+    for item in value.split(','):
+        item = item.strip()
+        if not item or item == 'original':
+            continue
+        max_dimension, quality = item.split(':')
+        settings.append((item, ImagePreprocessor(max_dimension=int(max_dimension), jpeg_quality=int(quality))))
+    return settings
+
+def collect_images(paths):
+    """Expand directories into the image files they contain"""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().rsplit('.', 1)[-1] in ('jpg', 'jpeg', 'png', 'webp', 'bmp')
+            )
+        else:
+            images.append(path)
+    return images
+
+def synthetic_image():
+    """A 12 MP noisy photo with a plate-like label, for size/timing runs without real images"""
+    image = Image.effect_noise((4000, 3000), 64).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((1500, 2000, 2500, 2250), fill=(250, 210, 0))
+    draw.text((1550, 2050), 'AB12 CDE', fill=(0, 0, 0))
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=95)
+    return output.getvalue()
+
+def parse_fields(text):
+    """Parse 'Field: value' lines into a lower-cased dictionary"""
+    fields = {}
+    for line in text.splitlines():
+        line = line.strip().lstrip('-*').replace('**', '').strip()
+        if ':' in line:
+            key, value = line.split(':', 1)
+            if value.strip():
+                fields[key.strip().lower()] = ''.join(value.split()).lower()
+    return fields
+
+def run_model(ollama_url, model, image_base64, timeout):
+    """Run the vision prompt, returning (fields, seconds)"""
+    started = time.perf_counter()
+    response = requests.post(f"{ollama_url}/api/generate", json={
+        'model': model, 'prompt': PROMPT, 'images': [image_base64], 'stream': False
+    }, timeout=timeout)
+    response.raise_for_status()
+    return parse_fields(response.json().get('response', '')), time.perf_counter() - started
+
+def agreement(fields, reference):
+    """Fraction of reference fields reproduced exactly"""
+    if not reference:
+        return None
+    return sum(1 for key, value in reference.items() if fields.get(key) == value) / len(reference)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', help='Image files or directories (default: one synthetic 12 MP photo)')
+    parser.add_argument('--settings', default='512:80,768:85,1024:85,1600:90', help='max_dimension:quality pairs')
+    parser.add_argument('--ollama-url', default=os.getenv('OLLAMA_URL', 'http://localhost:11434'))
+    parser.add_argument('--model', default=os.getenv('VISION_MODEL', 'gemma3:12b'))
+    parser.add_argument('--timeout', type=int, default=180)
+    parser.add_argument('--skip-model', action='store_true', help='Only measure payload size and preprocessing time')
+    args = parser.parse_args()
+
+    settings = parse_settings(args.settings)
+    images = [(path, open(path, 'rb').read()) for path in collect_images(args.images)]
+    if not images:
+        images = [('synthetic-12mp.jpg', synthetic_image())]
+
+    totals = {label: {'bytes': 0, 'prep': 0.0, 'model': 0.0, 'agreement': [], 'runs': 0} for label, _ in settings}
+
+    for path, image_data in images:
+        print(f"\n📷 {path} ({len(image_data) / 1024:.0f} KB)")
+        reference = None
+        for label, preprocessor in settings:
+            started = time.perf_counter()
+            prepared = preprocessor.prepare(image_data)
+            prep_seconds = time.perf_counter() - started
+            image_base64 = base64.b64encode(prepared).decode('utf-8')
+
+            line = f"   {label:>10}: payload {len(image_base64) / 1024:8.0f} KB, prep {prep_seconds * 1000:6.0f} ms"
+            total = totals[label]
+            total['bytes'] += len(image_base64)
+            total['prep'] += prep_seconds
+            total['runs'] += 1
+
+            if not args.skip_model:
+                try:
+                    fields, model_seconds = run_model(args.ollama_url, args.model, image_base64, args.timeout)
+                except Exception as e:
+                    print(f"{line}, model error: {e}")
+                    continue
+                if reference is None:
+                    reference = fields
+                score = agreement(fields, reference)
+                total['model'] += model_seconds
+                if score is not None:
+                    total['agreement'].append(score)
+                line += f", model {model_seconds:5.1f} s, agreement {score:.0%}" if score is not None else f", model {model_seconds:5.1f} s"
+            print(line)
+
+    print("\n📊 Summary (averages per image, agreement vs. original)")
+    original_bytes = totals['original']['bytes'] or 1
+    for label, _ in settings:
+        total = totals[label]
+        runs = total['runs'] or 1
+        line = (f"   {label:>10}: payload {total['bytes'] / runs / 1024:8.0f} KB "
+                f"({original_bytes / max(total['bytes'], 1):5.1f}x smaller), prep {total['prep'] / runs * 1000:6.0f} ms")
+        if not args.skip_model and total['agreement']:
+            line += (f", model {total['model'] / len(total['agreement']):5.1f} s, "
+                     f"agreement {sum(total['agreement']) / len(total['agreement']):.0%}")
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the regex extraction fallback: per-call scans vs. the compiled extractor
+
+Runs the messages of test-data/sample-text-messages.txt (and longer texts made
+by joining them) through the former extract_information_with_regex, copied
+below, and through officer-insight-api/regex_extractor.py. Checks that both
+return the same fields for every text, then reports throughput. Needs no
+services.
+
+Usage:
+    python tests/benchmark_regex_extraction.py
+    python tests/benchmark_regex_extraction.py --seconds 2 --random-texts 5000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'officer-insight-api'))
+from regex_extractor import RULES, extract  # noqa: E402
+
+def legacy_extract(text, parameters):
+    """extract_information_with_regex before the compiled extractor"""
+    extracted = {}
+    text_lower = text.lower()
+    for param in parameters:
+        if not param['active']:
+            continue
+        param_name = param['name']
+        value = None
+        if param_name == 'person_name':
+            match = re.search(r'\b([A-Z][a-z]+ [A-Z][a-z]+)\b', text)
+            value = match.group(1) if match else None
+        elif param_name == 'vehicle_number':
+            match = re.search(r'\b[A-Z0-9]{2,8}\b', text.upper())
+            value = match.group(0) if match else None
+        elif param_name == 'vehicle_color':
+            for color in ['red', 'blue', 'green', 'black', 'white', 'silver', 'gray', 'yellow', 'orange']:
+                if color in text_lower:
+                    value = color.title()
+                    break
+        elif param_name == 'vehicle_make':
+            for make in ['toyota', 'honda', 'ford', 'bmw', 'mercedes', 'audi', 'nissan', 'hyundai', 'volkswagen', 'subaru']:
+                if make in text_lower:
+                    value = make.upper() if make == 'bmw' else make.title()
+                    break
+        elif param_name == 'vehicle_model':
+            match = re.search(r'\b(bmw|toyota|honda|ford|mercedes|audi|nissan|hyundai)\s+([a-z0-9]+)\b', text_lower)
+            if match:
+                value = match.group(2).upper() if match.group(2).isdigit() else match.group(2).title()
+        elif param_name in ['car_color', 'car_model']:
+            if param_name == 'car_color':
+                for color in ['red', 'blue', 'green', 'black', 'white', 'silver', 'gray', 'yellow', 'orange']:
+                    if color in text_lower:
+                        value = color.title()
+                        break
+            elif param_name == 'car_model':
+                for make in ['toyota', 'honda', 'ford', 'bmw', 'mercedes', 'audi', 'nissan', 'hyundai']:
+                    if make in text_lower:
+                        value = make.title()
+                        break
+        elif param_name == 'location':
+            for keyword in ['at', 'on', 'near', 'in front of', 'behind']:
+                if keyword in text_lower:
+                    parts = text_lower.split(keyword)
+                    if len(parts) > 1:
+                        location_part = parts[1].split('.')[0].split(',')[0].strip()
+                        value = location_part[:50] if location_part else None
+                        break
+        elif param_name == 'event_crime_violation':
+            for event in ['theft', 'robbery', 'assault', 'speeding', 'parking violation', 'accident', 'vandalism']:
+                if event in text_lower:
+                    value = event
+                    break
+        extracted[param_name] = value
+    return extracted
+
+def load_messages(path):
+    """The quoted messages of the sample file"""
+    with open(path, encoding='utf-8') as f:
+        return re.findall(r'^\d+\.\s+"(.*)"\s*$', f.read(), re.MULTILINE)
+
+def random_texts(messages, count):
+    """Shuffled word mixes of the samples, to compare the two paths beyond the samples themselves"""
+    words = ' '.join(messages).split()
+    return [' '.join(random.sample(words, random.randint(3, 60))) for _ in range(count)]
+
+def throughput(func, texts, seconds):
+    """Texts processed per second over about the given time"""
+    done = 0
+    started = time.perf_counter()
+    while True:
+        for text in texts:
+            func(text)
+        done += len(texts)
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return done / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', default=os.path.join(ROOT, 'test-data', 'sample-text-messages.txt'))
+    parser.add_argument('--seconds', type=float, default=1.0, help='Time spent on each measurement')
+    parser.add_argument('--random-texts', type=int, default=2000, help='Random word mixes checked for equal results')
+    args = parser.parse_args()
+
+    random.seed(7)
+    messages = load_messages(args.messages)
+    parameters = [{'name': name, 'active': True} for name in list(RULES) + ['unknown_field']]
+
+    print(f"🔎 Checking results on {len(messages)} sample messages and {args.random_texts} random texts")
+    mismatches = 0
+    for text in messages + random_texts(messages, args.random_texts):
+        expected, actual = legacy_extract(text, parameters), extract(text, parameters)
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"   ❌ {text[:60]!r}\n      legacy:   {expected}\n      compiled: {actual}")
+    print(f"   {'✅ identical' if not mismatches else f'❌ {mismatches} mismatches'}")
+
+    print(f"\n⏱️  Throughput ({len(parameters)} parameters, {args.seconds:.1f} s per measurement)")
+    print(f"   {'texts':<28} {'legacy/s':>12} {'compiled/s':>12} {'speedup':>8}")
+    for label, texts in (
+        ('sample messages', messages),
+        ('10 messages joined', [' '.join(messages)]),
+        ('100 messages joined', [' '.join(messages * 10)])
+    ):
+        legacy = throughput(lambda text: legacy_extract(text, parameters), texts, args.seconds)
+        compiled = throughput(lambda text: extract(text, parameters), texts, args.seconds)
+        print(f"   {label:<28} {legacy:12.0f} {compiled:12.0f} {compiled / legacy:7.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()